@@ -0,0 +1,55 @@
+"""hot path indexes
+
+Revision ID: 3c9a1f6d2b87
+Revises: e50d64f294ad
+Create Date: 2026-10-19 09:12:44.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1f6d2b87'
+down_revision: Union[str, None] = 'e50d64f294ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so each
+    # index is built in autocommit mode without locking out writes.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_documents_folder_id'), 'documents', ['folder_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            op.f('ix_files_folder_id'), 'files', ['folder_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            op.f('ix_folders_owner_id'), 'folders', ['owner_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_folders_parent_id', 'folders', ['parent_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+            postgresql_where=sa.text('parent_id IS NOT NULL'),
+        )
+        op.create_index(
+            'ix_users_email_active', 'users', ['email'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+            postgresql_where=sa.text('is_active'),
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_email_active', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_folders_parent_id', table_name='folders', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_folders_owner_id'), table_name='folders', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_files_folder_id'), table_name='files', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_documents_folder_id'), table_name='documents', postgresql_concurrently=True, if_exists=True)
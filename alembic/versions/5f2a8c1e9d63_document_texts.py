@@ -0,0 +1,50 @@
+"""document texts
+
+Revision ID: 5f2a8c1e9d63
+Revises: c4d91e7b3a58
+Create Date: 2026-10-19 18:04:51.230917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2a8c1e9d63'
+down_revision: Union[str, None] = 'c4d91e7b3a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'compression_dictionaries',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('codec', sa.String(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'document_texts',
+        sa.Column('document_id', sa.UUID(), nullable=False),
+        sa.Column('extractor', sa.String(), nullable=False),
+        sa.Column('codec', sa.String(), nullable=False),
+        sa.Column('dictionary_id', sa.Integer(), nullable=True),
+        sa.Column('raw_size', sa.Integer(), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['dictionary_id'], ['compression_dictionaries.id']),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id'),
+    )
+    # The blobs are already compressed; keep Postgres from trying again and store them out of line as is.
+    op.execute("ALTER TABLE document_texts ALTER COLUMN content SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    op.drop_table('document_texts')
+    op.drop_table('compression_dictionaries')
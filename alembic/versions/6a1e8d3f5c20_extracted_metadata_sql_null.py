@@ -0,0 +1,28 @@
+"""extracted metadata sql null
+
+Revision ID: 6a1e8d3f5c20
+Revises: 2d7c5a9e0f14
+Create Date: 2026-10-19 22:14:37.509126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a1e8d3f5c20'
+down_revision: Union[str, None] = '2d7c5a9e0f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Batch uploads stored JSON null for documents without extracted metadata;
+    # the backfill and the SQL answers look for SQL NULL.
+    op.execute("UPDATE documents SET extracted_metadata = NULL WHERE extracted_metadata = 'null'::jsonb")
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,32 @@
+"""documents owner index
+
+Revision ID: 8e41d0c5a7f2
+Revises: 3c9a1f6d2b87
+Create Date: 2026-10-19 10:03:17.552090
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41d0c5a7f2'
+down_revision: Union[str, None] = '3c9a1f6d2b87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Metadata queries are now scoped to the caller's documents.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_documents_owner_id'), 'documents', ['owner_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_documents_owner_id'), table_name='documents', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,70 @@
+"""document versions
+
+Revision ID: 9b3e6d4f1a27
+Revises: 5f2a8c1e9d63
+Create Date: 2026-10-19 19:26:40.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e6d4f1a27'
+down_revision: Union[str, None] = '5f2a8c1e9d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('previous_version_id', sa.UUID(), nullable=True))
+    op.create_foreign_key(
+        'documents_previous_version_id_fkey', 'documents', 'documents', ['previous_version_id'], ['id'],
+    )
+    # Every existing document is the only (so the latest) version of its file.
+    op.add_column('documents', sa.Column('is_latest', sa.Boolean(), server_default='true', nullable=False))
+    # Files uploaded more than once under the same name were separate documents;
+    # only the newest stays the latest version, as the unique index below requires.
+    op.execute("""
+        UPDATE documents SET is_latest = false
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY folder_id, filename ORDER BY created_at DESC NULLS LAST, id DESC
+                ) AS position
+                FROM documents
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_table(
+        'document_chunks',
+        sa.Column('document_id', sa.UUID(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=True),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('occurrence', sa.Integer(), nullable=False),
+        sa.Column('es_id', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id', 'chunk_index'),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_folder_filename_latest', 'documents', ['folder_id', 'filename'],
+            unique=True, postgresql_where=sa.text('is_latest'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_documents_folder_filename_latest', table_name='documents',
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.drop_table('document_chunks')
+    op.drop_column('documents', 'is_latest')
+    op.drop_constraint('documents_previous_version_id_fkey', 'documents', type_='foreignkey')
+    op.drop_column('documents', 'previous_version_id')
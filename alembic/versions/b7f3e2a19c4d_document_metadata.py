@@ -0,0 +1,35 @@
+"""document metadata
+
+Revision ID: b7f3e2a19c4d
+Revises: 8e41d0c5a7f2
+Create Date: 2026-10-19 13:41:52.207815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3e2a19c4d'
+down_revision: Union[str, None] = '8e41d0c5a7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('document_date', sa.Date(), nullable=True))
+    op.add_column('documents', sa.Column('sender', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('receiver', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('project_name', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('extracted_metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('documents', 'extracted_metadata')
+    op.drop_column('documents', 'project_name')
+    op.drop_column('documents', 'receiver')
+    op.drop_column('documents', 'sender')
+    op.drop_column('documents', 'document_date')
@@ -0,0 +1,53 @@
+"""chat session context
+
+Revision ID: c4d91e7b3a58
+Revises: b7f3e2a19c4d
+Create Date: 2026-10-19 15:22:08.614307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d91e7b3a58'
+down_revision: Union[str, None] = 'b7f3e2a19c4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_sessions', sa.Column('folder_id', sa.UUID(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('title', sa.String(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary_through', sa.DateTime(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('context_cache', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.create_foreign_key('chat_sessions_folder_id_fkey', 'chat_sessions', 'folders', ['folder_id'], ['id'])
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_chat_sessions_user_id'), 'chat_sessions', ['user_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            op.f('ix_chat_messages_session_id'), 'chat_messages', ['session_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_chat_messages_session_id'), table_name='chat_messages', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_chat_sessions_user_id'), table_name='chat_sessions', postgresql_concurrently=True, if_exists=True)
+
+    op.drop_constraint('chat_sessions_folder_id_fkey', 'chat_sessions', type_='foreignkey')
+    op.drop_column('chat_sessions', 'context_cache')
+    op.drop_column('chat_sessions', 'summary_through')
+    op.drop_column('chat_sessions', 'summary')
+    op.drop_column('chat_sessions', 'updated_at')
+    op.drop_column('chat_sessions', 'title')
+    op.drop_column('chat_sessions', 'folder_id')
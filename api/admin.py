@@ -0,0 +1,39 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
+from core.profiling import profile_store, render_profile
+from settings import settings
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not settings.profiling_admin_token or x_admin_token != settings.profiling_admin_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Most recent request profiles, newest first."""
+    return profile_store.list()
+
+
+@router.get("/profiles/{request_id}")
+async def get_profile(request_id: str, part: str = "request", output: str = "html"):
+    """One part of a request's profile: "request" (event loop) or "threadpool-N" (sync endpoint)."""
+    profile = profile_store.get(request_id)
+    if not profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    rendered = render_profile(profile, part, output)
+    if rendered is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile has no part {part!r}")
+    if output == "html":
+        return HTMLResponse(rendered)
+    if output == "speedscope":
+        return Response(rendered, media_type="application/json")
+    return PlainTextResponse(rendered)
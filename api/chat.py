@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import List
+from uuid import UUID
+from services.chat import ChatService
+from models.chat import ChatSessionCreate, ChatSessionResponse, ChatMessageCreate, ChatMessageResponse, ChatReply
+from tables import User
+from core.security import get_current_user
+from database import get_session
+
+
+router = APIRouter(
+    prefix="/api/chat",
+    tags=["Chat"],
+)
+
+
+@router.post("/sessions", response_model=ChatSessionResponse)
+def create_chat_session(
+    session_data: ChatSessionCreate,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Start a conversation, optionally scoped to one folder subtree."""
+    return ChatService(db).create_session(current_user.id, session_data.title, session_data.folder_id)
+
+
+@router.get("/sessions", response_model=List[ChatSessionResponse])
+def list_chat_sessions(
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """List the caller's conversations, most recently active first."""
+    return ChatService(db).list_sessions(current_user.id)
+
+
+@router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
+def get_chat_messages(
+    session_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Full message history of a conversation."""
+    return ChatService(db).get_messages(session_id, current_user.id)
+
+
+@router.post("/sessions/{session_id}/messages", response_model=ChatReply)
+def post_chat_message(
+    session_id: UUID,
+    message: ChatMessageCreate,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Ask a question; follow-ups reuse the documents retrieved earlier in the session."""
+    return ChatService(db).post_message(session_id, current_user.id, message.content)
+
+
+@router.delete("/sessions/{session_id}")
+def delete_chat_session(
+    session_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Delete a conversation and its messages."""
+    ChatService(db).delete_session(session_id, current_user.id)
+    return {"message": "Chat session deleted"}
@@ -1,13 +1,112 @@
-from fastapi import APIRouter
+from contextlib import ExitStack
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+
+from core.security import get_current_user
+from database import get_session
+from services.access_tracker import access_tracker
+from services.bulk_indexing import BulkIndexer
 from services.document_service import DocumentService
+from services.document_versions import get_document_versions
+from services.folders import delete_document, get_document_for_download
+from tables import User
+from utils.cache import etag_matches
+from utils.storage import local_path
 
 router = APIRouter(prefix="/api/documents", tags=["Documents"])
 document_service = DocumentService()
 
+
+class BodyStreamingResponse(StreamingResponse):
+    """A StreamingResponse that keeps reading the request body while it is sent.
+
+    Under ASGI spec versions before 2.4 (as uvicorn reports) StreamingResponse
+    watches ``receive`` for a disconnect, which would swallow the body chunks
+    the response is still consuming. Here the body reader notices a
+    disconnect instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
 @router.post("/index")
-async def index_document(document_id: str, content: str, metadata: dict):
-    return document_service.index_document(document_id, content, metadata)
+async def index_documents(request: Request, current_user: User = Depends(get_current_user)):
+    """Bulk-index documents sent as NDJSON, one {"document_id", "content", "metadata"} object per line.
+
+    The body is read as it arrives and a result line is streamed back per
+    document, in input order: status "indexed" (with its chunk count),
+    "skipped" (no text) or "error". Indexing a document id again replaces its chunks.
+    The chunks are owned by the caller.
+    """
+    indexer = BulkIndexer(document_service, owner_id=str(current_user.id))
+    return BodyStreamingResponse(indexer.stream(request.stream()), media_type="application/x-ndjson")
 
 @router.get("/search")
 async def search_documents(query: str):
-    return document_service.search_documents(query)
\ No newline at end of file
+    return document_service.search_documents(query)
+
+@router.get("/{document_id}/versions")
+def list_document_versions(
+    document_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """A document and the versions before it, newest first."""
+    return [
+        {
+            "id": version.id,
+            "version": version.version,
+            "filename": version.filename,
+            "uploaded_at": version.created_at,
+            "checksum": version.checksum,
+            "is_latest": version.is_latest,
+        }
+        for version in get_document_versions(db, document_id, current_user.id)
+    ]
+
+@router.delete("/{document_id}")
+def delete_document_route(
+    document_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete a document and all its versions; search results drop it shortly after."""
+    return {"message": "Document deleted", "deleted": delete_document(document_id, db, current_user)}
+
+@router.get("/{document_id}/download")
+def download_document(
+    document_id: UUID,
+    request: Request,
+    inline: bool = False,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream a stored document, with Range support for viewers and a strong ETag from its checksum.
+
+    Pass inline=true to display it in the browser (e.g. a PDF preview) instead of downloading it.
+    """
+    document = get_document_for_download(document_id, db, current_user)
+    access_tracker.record(document.id)
+
+    etag = f'"{document.checksum}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Remote files are served from the local file cache, pinned until the response is sent.
+    pin = ExitStack()
+    file_path = pin.enter_context(local_path(document.storage_path))
+    return FileResponse(
+        file_path,
+        filename=document.filename,
+        headers=headers,
+        content_disposition_type="inline" if inline else "attachment",
+        background=BackgroundTask(pin.close),
+    )
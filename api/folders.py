@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import json
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 import uuid
 from uuid import UUID
-from services.folders import FoldersService, upload_file_to_folder, get_project_metadata, get_files_in_folder_service
-from models.folders import FolderCreate, FolderUpdate, FolderResponse
+from services.folders import FoldersService, upload_file_to_folder, upload_files_to_folder, get_project_metadata, get_files_in_folder_service
+from models.folders import FolderCreate, FolderUpdate, FolderResponse, FolderTreeNode
 from tables import Folder
 from database import get_session
 from models.auth import UserRegistation
@@ -12,6 +15,7 @@ from tables import User
 from fastapi import Depends
 from core.security import get_current_user
 from database import get_db
+from utils.listing_cache import listing_cache
 
 
 router = APIRouter(
@@ -19,6 +23,11 @@ router = APIRouter(
     tags=["Folders"],
 )
 
+
+def _serialise(payload) -> bytes:
+    """The JSON body FastAPI would have produced for ``payload``, for the listing cache."""
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
 @router.post("/", response_model=FolderResponse)
 def create_folder(
     folder_data: FolderCreate,
@@ -55,6 +64,7 @@ def create_folder(
         parent_folder.folder_count += 1
         db.commit()
         db.refresh(parent_folder)
+        listing_cache.invalidate(current_user.id)
     return new_folder
 
 
@@ -77,27 +87,55 @@ def update_folder(
 
 @router.get("/", response_model=List[FolderResponse])
 def list_folders(
+    request: Request,
     skip: int = 0,
     limit: int = 10,
     db: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     """List all folders for the current user."""
-    folders_service = FoldersService(db)
-    folders = folders_service.list_folders(skip=skip, limit=limit, owner_id=current_user.id)
-    return folders
+    def render():
+        folders = FoldersService(db).list_folders(skip=skip, limit=limit, owner_id=current_user.id)
+        return _serialise([FolderResponse.model_validate(folder) for folder in folders])
+
+    return listing_cache.response(request, current_user.id, "folders", f"{skip}:{limit}", render)
 
 
 @router.get("/{folder_id}", response_model=FolderResponse)
 def get_folder(
+    request: Request,
     folder_id: UUID,
     db: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
     """Get details of a specific folder."""
+    def render():
+        folder = FoldersService(db).get_folder(folder_id=folder_id, owner_id=current_user.id)
+        return _serialise(FolderResponse.model_validate(folder))
+
+    return listing_cache.response(request, current_user.id, "folder", str(folder_id), render)
+
+
+@router.get("/{folder_id}/tree", response_model=FolderTreeNode)
+def get_folder_tree(
+    folder_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a folder together with all of its subfolders, nested."""
     folders_service = FoldersService(db)
-    folder = folders_service.get_folder(folder_id=folder_id)
-    return folder
+    return folders_service.get_subtree(folder_id=folder_id, owner_id=current_user.id)
+
+
+@router.get("/{folder_id}/ancestors", response_model=List[FolderResponse])
+def get_folder_ancestors(
+    folder_id: UUID,
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the breadcrumb of a folder, from the root down to the folder itself."""
+    folders_service = FoldersService(db)
+    return folders_service.get_ancestors(folder_id=folder_id, owner_id=current_user.id)
 
 
 @router.post("/upload/{folder_id}")
@@ -110,16 +148,50 @@ def upload_file(
     """Upload a file to a specific subfolder by UUID."""
     return upload_file_to_folder(folder_id, file, db, current_user)
 
+@router.post("/upload/{folder_id}/batch")
+def upload_files(
+    folder_id: UUID,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload many files, or zip archives of files, to a folder in one request."""
+    return upload_files_to_folder(folder_id, files, db, current_user)
+
 @router.get("/{folder_id}/files", response_model=List[dict])
-def get_files_in_folder(folder_id: UUID, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_files_in_folder(request: Request, folder_id: UUID, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """API endpoint to retrieve files inside a folder by providing folder_id."""
-    return get_files_in_folder_service(folder_id, db, current_user)
+    return listing_cache.response(
+        request, current_user.id, "files", str(folder_id),
+        lambda: _serialise(get_files_in_folder_service(folder_id, db, current_user)),
+    )
 
 
 @router.post("/query-metadata")
-def query_metadata(query: str, db: Session = Depends(get_db)):
+def query_metadata(
+    query: str,
+    folder_id: Optional[UUID] = None,
+    file_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    tags: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Answer a question over the caller's documents, optionally scoped to a folder subtree."""
     try:
-        metadata = get_project_metadata(query, db)
+        metadata = get_project_metadata(
+            query,
+            db,
+            owner_id=current_user.id,
+            folder_id=folder_id,
+            file_type=file_type,
+            date_from=date_from,
+            date_to=date_to,
+            tags=tags,
+        )
         return {"response": metadata}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
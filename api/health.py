@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from core.warmup import warmup_state
+
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"],
+)
+
+
+@router.get("/live")
+def liveness():
+    """The process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+def readiness():
+    """200 once the database, Elasticsearch and NLP model are warm, 503 until then."""
+    report = warmup_state.report()
+    return JSONResponse(report, status_code=200 if warmup_state.ready else 503)
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from core.security import get_current_user
+from database import get_session
+from tables import User
+from utils.folders import extraction_cache
+from utils.summaries import summary_cache
+from services.folders import query_cache
+from utils.listing_cache import listing_cache
+from utils.storage import file_cache
+from services.outbox import outbox_dispatcher
+
+
+router = APIRouter(
+    prefix="/api/metrics",
+    tags=["Metrics"],
+)
+
+
+@router.get("/extraction-cache")
+def extraction_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate, size and eviction counters of the text extraction cache."""
+    return extraction_cache.stats()
+
+
+@router.get("/summary-cache")
+def summary_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate, size and eviction counters of the section/combine summary cache."""
+    return summary_cache.stats()
+
+
+@router.get("/query-cache")
+def query_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate, invalidations and latency saved by the semantic answer cache."""
+    return query_cache.stats()
+
+
+@router.get("/listing-cache")
+def listing_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate, 304 responses and invalidations of the folder/file listing cache."""
+    return listing_cache.stats()
+
+
+@router.get("/file-cache")
+def file_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate, size and eviction counters of the local cache of remotely stored files."""
+    return file_cache.stats()
+
+
+@router.get("/outbox")
+def outbox_stats(db: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+    """Backlog and lag of document changes not yet applied to the search indexes."""
+    return outbox_dispatcher.stats(db)
@@ -0,0 +1,54 @@
+"""Per-format benchmark of the registered text extractors.
+
+Generates synthetic documents of each supported format and reports the
+throughput of every extractor, both called in-process and through the
+subprocess sandbox used in production (the difference is the sandbox cost).
+
+    python -m benchmarks.extractors --sizes 10 100 1000 --repeat 5
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import utils.folders  # noqa: F401  registers the PDF/DOC/text extractors
+from benchmarks.fixtures import WRITERS, make_document
+from utils.extractors import get_extractor, run_extractor
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="paragraphs per document")
+    parser.add_argument("--formats", nargs="+", default=sorted(WRITERS), choices=sorted(WRITERS))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'format':<6} {'paras':>6} {'extractor':<10} {'KiB':>8} {'inproc ms':>10} {'sandbox ms':>11} {'MB/s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            for size in args.sizes:
+                path = make_document(Path(tmp), fmt, size)
+                extractor = get_extractor(path)
+                inproc, text = timed(lambda: extractor.extract(str(path)), args.repeat)
+                sandboxed, _ = timed(lambda: run_extractor(extractor, path), args.repeat)
+                kib = path.stat().st_size / 1024
+                print(
+                    f"{fmt:<6} {size:>6} {extractor.name:<10} {kib:>8.1f} {inproc * 1000:>10.2f} "
+                    f"{sandboxed * 1000:>11.2f} {kib / 1024 / inproc:>8.2f}"
+                )
+                if not text:
+                    print(f"  warning: {extractor.name} returned no text for {path.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Local stand-ins for Gemini, the OpenAI embeddings API and Elasticsearch.
+
+Each fake is a threaded HTTP server with a configurable per-request latency,
+so load benchmarks measure the app itself plus a known, fixed cost for every
+external call. Only the endpoints the app uses are implemented.
+"""
+import base64
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMS = 1536
+
+
+class FakeServer:
+    """Runs a handler class on an ephemeral localhost port in a background thread."""
+
+    def __init__(self, handler, latency: float = 0.0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.requests = 0
+        self.httpd.state = {}
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    extra_headers = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload=None, head: bool = False):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "0" if head else str(len(body)))
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _delay(self):
+        self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+
+class GeminiHandler(_Handler):
+    """generateContent plus the model lookup used at warm-up."""
+
+    def do_GET(self):
+        self._delay()
+        model = self.path.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        self._send(200, {"name": f"models/{model}", "displayName": model})
+
+    def do_POST(self):
+        self._delay()
+        request = json.loads(self._body() or b"{}")
+        prompt = request.get("contents", [{}])[0].get("parts", [{}])[0].get("text", "")
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": fake_completion(prompt)}]}}]})
+
+
+def fake_completion(prompt: str) -> str:
+    """A plausible answer shaped like what the app's prompt asks for."""
+    if "mapping each document id" in prompt:
+        ids = re.findall(r'<document id="(D\d+)">', prompt)
+        return json.dumps({doc_id: f"Summary of document {doc_id}." for doc_id in ids})
+    if "Respond with only a JSON object with exactly these keys" in prompt:
+        return json.dumps({
+            "project_name": "Benchmark Housing Scheme",
+            "client": "NHDC",
+            "project_manager": "A. Manager",
+            "sender": "SDL Construction",
+            "receiver": "NHDC",
+            "letter_date": "2024-03-12",
+        })
+    return "This is a synthetic answer from the fake Gemini server. " * 4
+
+
+class OpenAIHandler(_Handler):
+    """/v1/embeddings and /v1/models/{id}."""
+
+    def do_GET(self):
+        self._delay()
+        model = self.path.rstrip("/").rsplit("/", 1)[-1]
+        self._send(200, {"id": model, "object": "model", "created": 0, "owned_by": "benchmark"})
+
+    def do_POST(self):
+        self._delay()
+        request = json.loads(self._body() or b"{}")
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        as_base64 = request.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(str(text))
+            embedding = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode() if as_base64 else vector
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+
+def fake_embedding(text: str, dims: int = EMBEDDING_DIMS):
+    """Deterministic unit-ish vector derived from the text hash."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((seed[i % len(seed)] + i) % 256) / 255.0 - 0.5 for i in range(dims)]
+
+
+def _matches(source: dict, query: dict) -> bool:
+    """Evaluates the term/terms/range/bool queries the app sends to _delete_by_query."""
+    (kind, clause), = query.items()
+    if kind == "term":
+        (field, value), = clause.items()
+        return source.get(field) == value
+    if kind == "terms":
+        (field, values), = clause.items()
+        return source.get(field) in values
+    if kind == "range":
+        (field, bounds), = clause.items()
+        value = source.get(field)
+        return value is not None and all(
+            {"gte": value >= bound, "gt": value > bound, "lte": value <= bound, "lt": value < bound}[op]
+            for op, bound in bounds.items()
+        )
+    if kind == "bool":
+        return all(_matches(source, q) for q in clause.get("filter", [])) and (
+            not clause.get("should") or any(_matches(source, q) for q in clause["should"])
+        )
+    raise ValueError(f"unsupported query {kind}")
+
+
+class ElasticsearchHandler(_Handler):
+    """Ping, index exists/create, _bulk, _search and _delete_by_query, backed by an in-memory dict."""
+
+    extra_headers = {"X-Elastic-Product": "Elasticsearch"}
+
+    def _indices(self) -> dict:
+        return self.server.state.setdefault("indices", {})
+
+    def _index_name(self) -> str:
+        return self.path.split("?")[0].strip("/").split("/")[0]
+
+    def do_HEAD(self):
+        self._delay()
+        name = self._index_name()
+        self._send(200 if not name or name in self._indices() else 404, head=True)
+
+    def do_GET(self):
+        self._delay()
+        if self._index_name():
+            return self._search()
+        self._send(200, {
+            "name": "fake",
+            "cluster_name": "benchmark",
+            "version": {"number": "8.11.0", "build_flavor": "default"},
+            "tagline": "You Know, for Search",
+        })
+
+    def do_PUT(self):
+        self._delay()
+        self._body()
+        name = self._index_name()
+        self._indices().setdefault(name, {})
+        self._send(200, {"acknowledged": True, "shards_acknowledged": True, "index": name})
+
+    def do_POST(self):
+        self._delay()
+        path = self.path.split("?")[0]
+        body = self._body()
+        if path.endswith("/_bulk"):
+            return self._bulk(path, body)
+        if path.endswith("/_search"):
+            return self._search()
+        if path.endswith("/_delete_by_query"):
+            return self._delete_by_query(body)
+        self._send(404, {"error": f"unsupported path {path}"})
+
+    def _search(self):
+        documents = self._indices().get(self._index_name(), {})
+        hits = [{"_id": doc_id, "_score": 1.0, "_source": source} for doc_id, source in list(documents.items())[:10]]
+        self._send(200, {"took": 1, "hits": {"total": {"value": len(documents), "relation": "eq"}, "hits": hits}})
+
+    def _delete_by_query(self, body: bytes):
+        documents = self._indices().get(self._index_name(), {})
+        query = json.loads(body)["query"]
+        deleted = [doc_id for doc_id, source in documents.items() if _matches(source, query)]
+        for doc_id in deleted:
+            del documents[doc_id]
+        self._send(200, {"took": 1, "deleted": len(deleted), "failures": []})
+
+    def _bulk(self, path: str, body: bytes):
+        default_index = path.strip("/").split("/")[0] if not path.startswith("/_bulk") else None
+        lines = iter(line for line in body.decode("utf-8").splitlines() if line.strip())
+        items = []
+        for action_line in lines:
+            (op, meta), = json.loads(action_line).items()
+            documents = self._indices().setdefault(meta.get("_index", default_index), {})
+            if op == "delete":
+                found = documents.pop(meta.get("_id"), None) is not None
+                items.append({op: {"_id": meta.get("_id"), "status": 200 if found else 404}})
+                continue
+            source = json.loads(next(lines))
+            if op == "update":
+                source = {**documents.get(meta.get("_id"), {}), **source.get("doc", {})}
+            documents[meta.get("_id")] = source
+            items.append({op: {"_id": meta.get("_id"), "status": 201, "result": "created"}})
+        self._send(200, {"took": 1, "errors": False, "items": items})
@@ -0,0 +1,164 @@
+"""Synthetic document generators shared by the benchmark scripts."""
+import random
+import textwrap
+import zipfile
+from email.message import EmailMessage
+from pathlib import Path
+
+
+WORDS = (
+    "project letter contract delivery payment schedule amendment client manager site "
+    "works completion variation claim notice extension drawing approval programme "
+    "meeting council housing development agreement certificate dispute delay"
+).split()
+
+SENDERS = ["NHDC", "SDL Construction", "Hertfordshire Council", "Atkins Ltd", "Kier Group"]
+
+
+def paragraphs(n_paragraphs: int, seed: int = 0):
+    """Letter-like paragraphs with dates and parties sprinkled in."""
+    rng = random.Random(seed)
+    result = []
+    for i in range(n_paragraphs):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(40, 90))]
+        words.insert(rng.randint(0, len(words)), f"{rng.randint(1, 28)} March {rng.randint(2018, 2025)}")
+        words.insert(rng.randint(0, len(words)), rng.choice(SENDERS))
+        sentence = " ".join(words)
+        result.append(sentence[0].upper() + sentence[1:] + ".")
+    return result
+
+
+def write_txt(path: Path, paras):
+    path.write_text("\n\n".join(paras), encoding="utf-8")
+
+
+def write_html(path: Path, paras):
+    body = "".join(f"<p>{p}</p>" for p in paras)
+    path.write_text(
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><style>p{{}}</style></head><body>{body}</body></html>",
+        encoding="utf-8",
+    )
+
+
+def write_eml(path: Path, paras):
+    message = EmailMessage()
+    message["From"] = "site.manager@example.com"
+    message["To"] = "client@example.com"
+    message["Subject"] = "Amended date for FPC"
+    message["Date"] = "Mon, 12 Feb 2024 09:00:00 +0000"
+    message.set_content("\n\n".join(paras))
+    path.write_bytes(bytes(message))
+
+
+def write_rtf(path: Path, paras):
+    body = "".join(f"{p}\\par\n" for p in paras)
+    path.write_text("{\\rtf1\\ansi{\\fonttbl{\\f0 Arial;}}\\f0\\fs22 " + body + "}", encoding="latin-1")
+
+
+def write_docx(path: Path, paras):
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paras)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>')
+
+
+def write_xlsx(path: Path, paras):
+    ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    strings = "".join(f"<si><t>{p[:200]}</t></si>" for p in paras)
+    rows = "".join(
+        f'<row r="{i + 1}"><c r="A{i + 1}" t="s"><v>{i}</v></c><c r="B{i + 1}"><v>{i * 1.5}</v></c></row>'
+        for i in range(len(paras))
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("xl/workbook.xml", f'<workbook xmlns="{ns}"/>')
+        archive.writestr("xl/sharedStrings.xml", f'<sst xmlns="{ns}">{strings}</sst>')
+        archive.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{ns}"><sheetData>{rows}</sheetData></worksheet>')
+
+
+def write_odt(path: Path, paras):
+    ns = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+    office = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    body = "".join(f"<text:p>{p}</text:p>" for p in paras)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/vnd.oasis.opendocument.text", compress_type=zipfile.ZIP_STORED)
+        archive.writestr(
+            "content.xml",
+            f'<office:document-content xmlns:office="{office}" xmlns:text="{ns}">'
+            f"<office:body><office:text>{body}</office:text></office:body></office:document-content>",
+        )
+
+
+PDF_LINES_PER_PAGE = 50
+
+
+def _pdf_pages(paras):
+    lines = [line for p in paras for line in textwrap.wrap(p, 90) + [""]]
+    return [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+
+
+def _write_pdf_objects(path: Path, objects):
+    """Writes numbered PDF objects (1 = catalog) with a valid xref table."""
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def write_pdf(path: Path, paras):
+    """A PDF with a real text layer, 50 lines of Helvetica per page."""
+    pages = _pdf_pages(paras)
+    # 1 catalog, 2 pages, 3 font, then a (page, content) pair per page.
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        stream = "BT /F1 10 Tf 14 TL 50 770 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    _write_pdf_objects(path, objects)
+
+
+def write_scanned_pdf(path: Path, paras):
+    """An image-only PDF (no text layer), so every page goes through OCR. Needs Pillow."""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for lines in _pdf_pages(paras):
+        image = Image.new("L", (1275, 1650), 255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(lines):
+            draw.text((100, 100 + row * 28), line, fill=0)
+        images.append(image)
+    images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:])
+
+
+WRITERS = {
+    "txt": write_txt,
+    "html": write_html,
+    "eml": write_eml,
+    "rtf": write_rtf,
+    "docx": write_docx,
+    "xlsx": write_xlsx,
+    "odt": write_odt,
+}
+
+
+def make_document(directory: Path, fmt: str, n_paragraphs: int, seed: int = 0, name: str = None) -> Path:
+    path = Path(directory) / f"{name or f'synthetic_{n_paragraphs}'}.{fmt}"
+    WRITERS[fmt](path, paragraphs(n_paragraphs, seed))
+    return path
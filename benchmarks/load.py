@@ -0,0 +1,268 @@
+"""End-to-end load benchmark of the upload, list and query-metadata paths.
+
+Starts fake Gemini, OpenAI and Elasticsearch servers with fixed latencies,
+runs the app under uvicorn against the Postgres database configured in .env
+(migrated with ``alembic upgrade head``), generates a synthetic corpus of
+FOLDERS x DOCUMENTS files and drives the API with concurrent clients. Every
+run registers a fresh user, so runs do not see each other's data.
+
+Reports p50/p95/p99 latency and throughput per operation and writes them as
+JSON, so runs can be compared:
+
+    python -m benchmarks.load --folders 10 --documents 20 --concurrency 8
+    python -m benchmarks.load --compare benchmarks/results/load-20261019-101500.json
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from benchmarks.fakes import ElasticsearchHandler, FakeServer, GeminiHandler, OpenAIHandler
+from benchmarks.fixtures import WRITERS, make_document
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+QUERIES = [
+    "How many letters are in {folder}?",
+    "List the dates of letters from NHDC",
+    "Summarise the correspondence about the payment schedule in {folder}",
+    "What do the letters say about the completion delay?",
+]
+
+
+def percentile(sorted_samples, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_samples)), 1)
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples, errors: int, wall: float) -> dict:
+    ordered = sorted(samples)
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+    }
+
+
+def run_phase(name, calls, concurrency):
+    """Runs (callable) requests on ``concurrency`` threads; returns its summary and results."""
+    samples, results, errors = [], [], 0
+
+    def timed(call):
+        start = time.perf_counter()
+        try:
+            response = call()
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        return time.perf_counter() - start, ok, response
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok, response in pool.map(timed, calls):
+            if ok:
+                samples.append(elapsed)
+                results.append(response)
+            else:
+                errors += 1
+    summary = summarize(samples, errors, time.perf_counter() - start)
+    print(
+        f"{name:<15} {summary['requests']:>6} {summary['errors']:>6} {summary['p50_ms']:>9.1f} "
+        f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['throughput_rps']:>8.1f}"
+    )
+    return summary, results
+
+
+def start_app(workdir: Path, port: int, workers: int, env: dict) -> subprocess.Popen:
+    if (REPO_ROOT / ".env").exists():
+        shutil.copy(REPO_ROOT / ".env", workdir / ".env")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": str(REPO_ROOT), **env},
+    )
+
+
+def wait_ready(base_url: str, app: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if app.poll() is not None:
+            raise RuntimeError(f"app exited with status {app.returncode}")
+        try:
+            if requests.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"app not ready after {timeout}s")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\nvs {baseline_path.name} ({baseline.get('revision')}):")
+    print(f"{'operation':<15} {'p50':>14} {'p95':>14} {'rps':>14}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+
+        def delta(key):
+            if not before[key]:
+                return f"{result[key]:>8.1f}"
+            return f"{result[key]:>8.1f} {(result[key] / before[key] - 1) * 100:+5.0f}%"
+
+        print(f"{name:<15} {delta('p50_ms'):>14} {delta('p95_ms'):>14} {delta('throughput_rps'):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=5)
+    parser.add_argument("--documents", type=int, default=20, help="documents per folder")
+    parser.add_argument("--paragraphs", type=int, default=20, help="paragraphs per document")
+    parser.add_argument("--formats", nargs="+", default=["txt", "docx", "html"], choices=sorted(WRITERS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--list-rounds", type=int, default=5)
+    parser.add_argument("--query-rounds", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake Gemini call")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per fake embeddings call")
+    parser.add_argument("--es-latency", type=float, default=0.005, help="seconds per fake Elasticsearch call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeServer(GeminiHandler, args.llm_latency) as gemini, \
+            FakeServer(OpenAIHandler, args.embedding_latency) as openai, \
+            FakeServer(ElasticsearchHandler, args.es_latency) as elasticsearch:
+        workdir = Path(tmp)
+        env = {
+            "GEMINI_API_KEY": "benchmark",
+            "GEMINI_API_URL": f"http://127.0.0.1:{gemini.port}/v1beta/models",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{openai.port}/v1",
+            "ELASTICSEARCH_HOST": "127.0.0.1",
+            "ELASTICSEARCH_PORT": str(elasticsearch.port),
+            "EXTRACTION_CACHE_DIR": str(workdir / "cache" / "extraction"),
+            "SUMMARY_CACHE_DIR": str(workdir / "cache" / "summaries"),
+        }
+        app = start_app(workdir, args.port, args.workers, env)
+        try:
+            started = time.perf_counter()
+            wait_ready(base_url, app, args.ready_timeout)
+            ready_seconds = time.perf_counter() - started
+
+            session = requests.Session()
+            email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+            session.post(f"{base_url}/api/auth/register", json={"email": email, "password": "benchmark", "name": "Benchmark"}).raise_for_status()
+            token = session.post(f"{base_url}/api/auth/login", json={"email": email, "password": "benchmark"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            folders = []
+            for i in range(args.folders):
+                response = session.post(f"{base_url}/api/folders/", json={"name": f"Project {i:03d}"}, headers=headers)
+                response.raise_for_status()
+                folders.append(response.json())
+
+            corpus = workdir / "corpus"
+            corpus.mkdir()
+            documents = [
+                (folder["id"], make_document(
+                    corpus, args.formats[(f * args.documents + d) % len(args.formats)], args.paragraphs,
+                    seed=f * args.documents + d, name=f"letter_{f:03d}_{d:04d}",
+                ))
+                for f, folder in enumerate(folders)
+                for d in range(args.documents)
+            ]
+
+            def upload(folder_id, path):
+                with open(path, "rb") as f:
+                    return requests.post(
+                        f"{base_url}/api/folders/upload/{folder_id}", files={"file": (path.name, f)}, headers=headers,
+                    )
+
+            def list_files(folder_id):
+                return requests.get(f"{base_url}/api/folders/{folder_id}/files", headers=headers)
+
+            def query(text, folder_id):
+                return requests.post(
+                    f"{base_url}/api/folders/query-metadata", params={"query": text, "folder_id": folder_id}, headers=headers,
+                )
+
+            print(f"ready in {ready_seconds:.1f}s; corpus {args.folders} folders x {args.documents} documents\n")
+            print(f"{'operation':<15} {'reqs':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>8}")
+            results = {}
+            fake_calls_before = {"gemini": gemini.requests, "openai": openai.requests}
+            results["upload"], _ = run_phase(
+                "upload", [lambda f=f, p=p: upload(f, p) for f, p in documents], args.concurrency,
+            )
+            results["list"], _ = run_phase(
+                "list", [lambda f=folder["id"]: list_files(f) for _ in range(args.list_rounds) for folder in folders],
+                args.concurrency,
+            )
+            results["query_metadata"], _ = run_phase(
+                "query_metadata",
+                [
+                    lambda q=template.format(folder=folder["name"]), f=folder["id"]: query(q, f)
+                    for _ in range(args.query_rounds)
+                    for folder in folders
+                    for template in QUERIES
+                ],
+                args.concurrency,
+            )
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+
+        report = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+            "ready_seconds": round(ready_seconds, 2),
+            "external_calls": {
+                "gemini": gemini.requests - fake_calls_before["gemini"],
+                "openai": openai.requests - fake_calls_before["openai"],
+            },
+            "results": results,
+        }
+
+    output = args.output or RESULTS_DIR / f"load-{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nexternal calls: {report['external_calls']}\nresults written to {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Side-by-side throughput of the PDF extraction modes on a corpus of real PDFs.
+
+For every PDF under the corpus directory, runs the pdfplumber layout mode and
+the pypdfium2 fast mode in-process and reports pages/sec per mode, plus how
+many pages the fast mode routed to the text layer, layout analysis and OCR.
+
+    python -m benchmarks.pdf_modes path/to/letters --repeat 3
+"""
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+
+from utils.folders import iter_pdf_pages_fast, iter_pdf_pages_layout, pypdfium2
+
+
+MODES = {
+    "layout": iter_pdf_pages_layout,
+    "fast": iter_pdf_pages_fast,
+}
+
+
+def run_mode(iterate, paths, repeat):
+    pages, chars, elapsed, routes = 0, 0, 0.0, Counter()
+    for path in paths:
+        for attempt in range(repeat):
+            start = time.perf_counter()
+            counted = Counter() if attempt == 0 else None
+            doc_pages = list(iterate(str(path), routes=counted))
+            elapsed += time.perf_counter() - start
+            if attempt == 0:
+                pages += len(doc_pages)
+                chars += sum(len(text) for _, text in doc_pages)
+                routes += counted
+    return pages, chars, elapsed / repeat, routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default="uploads", help="directory searched recursively for *.pdf")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.corpus).rglob("*.pdf"))
+    if not paths:
+        raise SystemExit(f"No PDFs found under {args.corpus}")
+    if pypdfium2 is None and "fast" in args.modes:
+        raise SystemExit("pypdfium2 is not installed; the fast mode is unavailable")
+
+    print(f"{len(paths)} PDFs from {args.corpus}")
+    print(f"{'mode':<8} {'pages':>6} {'chars':>10} {'seconds':>9} {'pages/s':>9}  routes")
+    for mode in args.modes:
+        pages, chars, seconds, routes = run_mode(MODES[mode], paths, args.repeat)
+        rate = pages / seconds if seconds else float("inf")
+        routed = ", ".join(f"{route}={count}" for route, count in sorted(routes.items()))
+        print(f"{mode:<8} {pages:>6} {chars:>10} {seconds:>9.2f} {rate:>9.1f}  {routed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Baseline timings and peak memory of the ingest and query pipeline steps.
+
+Covers PDF extraction (text-layer pages and OCR pages), DOC extraction via
+antiword, encoding detection, keyword and date extraction, and the prompt
+assembly of get_project_metadata, on generated fixtures of several sizes.
+Each case reports the median wall time over ``--repeat`` runs and the peak
+Python heap of one extra run under tracemalloc (memory allocated by native
+libraries or subprocesses such as antiword and tesseract is not included).
+
+Results are written as JSON; compare against an earlier run, optionally
+failing when a case got slower by more than a percentage:
+
+    python -m benchmarks.pipeline --sizes 10 100 1000 --output before.json
+    python -m benchmarks.pipeline --compare before.json --fail-above 20
+"""
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.fixtures import make_document, paragraphs, write_pdf, write_scanned_pdf
+from services.folders import build_metadata_prompt
+from settings import settings
+from utils.folders import detect_encoding, extract_dates, extract_keywords, extract_text_from_doc, extract_text_from_pdf
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def measure(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def ocr_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which("tesseract") is not None
+
+
+def build_cases(tmp: Path, sizes, ocr_sizes, doc_samples: Path):
+    """Yields (case name, size label, callable)."""
+    for size in sizes:
+        text = "\n\n".join(paragraphs(size, seed=size))
+
+        pdf = tmp / f"text_{size}.pdf"
+        write_pdf(pdf, paragraphs(size, seed=size))
+        yield "pdf_text_layer", size, lambda pdf=pdf: extract_text_from_pdf(str(pdf))
+
+        txt = make_document(tmp, "txt", size, seed=size)
+        yield "detect_encoding", size, lambda txt=txt: detect_encoding(txt)
+        yield "extract_keywords", size, lambda text=text: extract_keywords(text)
+        yield "extract_dates", size, lambda text=text: extract_dates(text)
+
+        # Same inputs get_project_metadata hands to the prompt: every relevant document's head.
+        extracted_text = "".join(f"{paragraph}\n" for paragraph in paragraphs(size, seed=size))
+        folders = [f"Project {i}" for i in range(max(size // 10, 1))]
+        yield "metadata_prompt", size, lambda t=extracted_text, f=folders: (
+            build_metadata_prompt("summary of the project letters", True, t, size, f),
+            build_metadata_prompt("letters about the payment dispute", False, t, size, f),
+        )
+
+    if ocr_available():
+        for size in ocr_sizes:
+            scanned = tmp / f"scanned_{size}.pdf"
+            write_scanned_pdf(scanned, paragraphs(size, seed=size))
+            yield "pdf_ocr", size, lambda scanned=scanned: extract_text_from_pdf(str(scanned))
+    else:
+        print("skipping pdf_ocr: needs Pillow and tesseract", file=sys.stderr)
+
+    docs = sorted(doc_samples.rglob("*.doc")) if doc_samples.exists() else []
+    if docs and shutil.which(settings.antiword_path):
+        for doc in docs:
+            yield "extract_text_from_doc", doc.stat().st_size // 1024, lambda doc=doc: extract_text_from_doc(str(doc))
+    else:
+        print(f"skipping extract_text_from_doc: needs antiword and .doc samples under {doc_samples}", file=sys.stderr)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: Path, fail_above: float) -> bool:
+    """Prints per-case changes against a baseline; False if any case regressed past the limit."""
+    baseline = json.loads(baseline_path.read_text())["results"]
+    ok = True
+    print(f"\nvs {baseline_path.name}:")
+    for key, result in results.items():
+        before = baseline.get(key)
+        if not before or not before["median_ms"]:
+            continue
+        change = (result["median_ms"] / before["median_ms"] - 1) * 100
+        memory = (result["peak_kib"] / before["peak_kib"] - 1) * 100 if before["peak_kib"] else 0.0
+        flag = ""
+        if fail_above is not None and change > fail_above:
+            flag, ok = "  REGRESSION", False
+        print(f"{key:<32} time {change:+6.1f}%  memory {memory:+6.1f}%{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="paragraphs per fixture")
+    parser.add_argument("--ocr-sizes", type=int, nargs="+", default=[10, 50], help="paragraphs per scanned PDF")
+    parser.add_argument("--doc-samples", type=Path, default=Path("uploads"), help="directory searched for *.doc")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    parser.add_argument("--fail-above", type=float, help="exit non-zero if a case is this many percent slower")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<24} {'size':>6} {'median ms':>11} {'min ms':>10} {'peak KiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, size, func in build_cases(Path(tmp), args.sizes, args.ocr_sizes, args.doc_samples):
+            result = measure(func, args.repeat)
+            results[f"{name}[{size}]"] = result
+            print(f"{name:<24} {size:>6} {result['median_ms']:>11.2f} {result['min_ms']:>10.2f} {result['peak_kib']:>10.1f}")
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nresults written to {args.output}")
+    if args.compare and not compare(results, args.compare, args.fail_above):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Query-plan regression checks for the hot lookup paths.
+
+Seeds a synthetic dataset into a throw-away schema of the configured Postgres
+database, runs EXPLAIN on the queries the API issues on every request and
+fails if any of them stops using an index scan. Everything runs in a single
+transaction that is rolled back afterwards.
+
+Run from the repository root:
+
+    python -m benchmarks.query_plans --users 2000 --folders 50 --documents 20
+"""
+import argparse
+import sys
+import uuid
+
+from sqlalchemy import func, select, text
+
+from database import engine
+from tables import Base, Document, Files, Folder, User
+
+
+INDEX_NODES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+
+def seed(conn, users: int, folders_per_user: int, documents_per_folder: int):
+    """Bulk-generates users, a two-level folder tree per user, files and documents."""
+    conn.execute(text("""
+        INSERT INTO users (id, email, password_hash, password_salt, name, is_active, created_at, updated_at)
+        SELECT gen_random_uuid(), 'user' || g || '@example.com', 'x', 'x', 'User ' || g,
+               g % 10 <> 0, now(), now()
+        FROM generate_series(1, :users) AS g
+    """), {"users": users})
+
+    # Half of the folders are roots, the other half hang off a root of the same owner.
+    conn.execute(text("""
+        INSERT INTO folders (id, name, parent_id, owner_id, created_at, updated_at,
+                             size, file_count, folder_count, access_type)
+        SELECT gen_random_uuid(), 'Folder ' || g, NULL, u.id, now(), now(), 0, 0, 0, 'private'
+        FROM users u, generate_series(1, :n) AS g
+    """), {"n": max(folders_per_user // 2, 1)})
+    conn.execute(text("""
+        INSERT INTO folders (id, name, parent_id, owner_id, created_at, updated_at,
+                             size, file_count, folder_count, access_type)
+        SELECT gen_random_uuid(), f.name || ' / sub', f.id, f.owner_id, now(), now(), 0, 0, 0, 'private'
+        FROM folders f
+        WHERE f.parent_id IS NULL
+    """))
+
+    conn.execute(text("""
+        INSERT INTO documents (id, folder_id, owner_id, filename, storage_path, file_type,
+                               created_at, updated_at, file_size, version)
+        SELECT gen_random_uuid(), f.id, f.owner_id, 'letter' || g || '.pdf',
+               'uploads/' || f.id || '/letter' || g || '.pdf', 'pdf', now(), now(), 1024, '1.0'
+        FROM folders f, generate_series(1, :n) AS g
+    """), {"n": documents_per_folder})
+    conn.execute(text("""
+        INSERT INTO files (id, name, path, folder_id, owner_id)
+        SELECT gen_random_uuid(), d.filename, d.storage_path, d.folder_id, d.owner_id
+        FROM documents d
+    """))
+    conn.execute(text("ANALYZE"))
+
+
+def hot_queries(conn):
+    """Returns (name, statement) pairs mirroring the ORM queries in the services."""
+    user_email, user_id = conn.execute(
+        text("SELECT email, id FROM users WHERE is_active ORDER BY random() LIMIT 1")
+    ).one()
+    folder_id, parent_id = conn.execute(
+        text("SELECT id, parent_id FROM folders WHERE parent_id IS NOT NULL ORDER BY random() LIMIT 1")
+    ).one()
+
+    return [
+        ("documents by folder", select(Document).where(Document.folder_id == folder_id)),
+        ("documents by owner", select(Document).where(Document.owner_id == user_id)),
+        ("files count by folder", select(func.count()).select_from(Files).where(Files.folder_id == folder_id)),
+        ("folders by owner", select(Folder).where(Folder.owner_id == user_id).offset(0).limit(10)),
+        ("folders by parent", select(Folder).where(Folder.parent_id == parent_id)),
+        ("active user by email", select(User).where(User.email == user_email, User.is_active == True)),
+    ]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = {
+        key: str(value) if isinstance(value, uuid.UUID) else value
+        for key, value in compiled.params.items()
+    }
+    row = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    return row[0]["Plan"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--folders", type=int, default=50, help="folders per user")
+    parser.add_argument("--documents", type=int, default=20, help="documents per folder")
+    args = parser.parse_args()
+
+    schema = f"query_plans_{uuid.uuid4().hex[:8]}"
+    failures = []
+
+    with engine.connect() as conn:
+        # Only the scratch schema is visible, so create_all never sees the real tables.
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}"))
+        try:
+            Base.metadata.create_all(bind=conn)
+            seed(conn, args.users, args.folders, args.documents)
+
+            for name, statement in hot_queries(conn):
+                plan = explain(conn, statement)
+                scans = [
+                    f"{node['Node Type']} using {node.get('Index Name')}"
+                    for node in plan_nodes(plan)
+                    if node["Node Type"] in INDEX_NODES
+                ]
+                if scans:
+                    print(f"ok    {name}: {', '.join(scans)}")
+                else:
+                    seq = [node["Node Type"] for node in plan_nodes(plan)]
+                    print(f"FAIL  {name}: {' -> '.join(seq)}")
+                    failures.append(name)
+        finally:
+            # Everything ran in one transaction; rolling back drops the schema.
+            conn.rollback()
+
+    if failures:
+        print(f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} not using an index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
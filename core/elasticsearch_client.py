@@ -1,20 +1,116 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
 from settings import settings
 
+# Mapping for the chunk documents written by DocumentService.index_chunks.
+INDEX_MAPPINGS = {
+    "properties": {
+        "document_id": {"type": "keyword"},
+        "chunk_index": {"type": "integer"},
+        "page": {"type": "integer"},
+        "content": {"type": "text"},
+        "metadata": {"type": "object"},
+        "embedding": {"type": "dense_vector", "dims": 1536},
+    }
+}
+
+_KEYWORD_TEXT = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+
+# Mapping of the per-document index kept in sync with Postgres by services.outbox.
+DOCUMENTS_INDEX_MAPPINGS = {
+    "properties": {
+        "document_id": {"type": "keyword"},
+        "folder_id": {"type": "keyword"},
+        "owner_id": {"type": "keyword"},
+        "filename": _KEYWORD_TEXT,
+        "file_type": {"type": "keyword"},
+        "summary": {"type": "text"},
+        "sender": _KEYWORD_TEXT,
+        "receiver": _KEYWORD_TEXT,
+        "project_name": _KEYWORD_TEXT,
+        "document_date": {"type": "date"},
+        "version": {"type": "keyword"},
+        "is_latest": {"type": "boolean"},
+        "created_at": {"type": "date"},
+        "updated_at": {"type": "date"},
+    }
+}
+
+
 class ElasticsearchClient:
     def __init__(self):
-        self.client = Elasticsearch(
-            hosts=[{"host": settings.elasticsearch_host, "port": settings.elasticsearch_port, "scheme": "http"}]
-        )
+        self._client = None
         self.index = settings.elasticsearch_index
+        self.documents_index = settings.elasticsearch_documents_index or f"{self.index}-documents"
 
-    def index_document(self, document_id: str, content: str, metadata: dict):
-        """Indexes a document with text content and metadata."""
-        body = {
-            "content": content,
-            "metadata": metadata,
-        }
-        self.client.index(index=self.index, id=document_id, body=body)
+    @property
+    def client(self) -> Elasticsearch:
+        """The underlying client, created on first use (or at warm-up)."""
+        if self._client is None:
+            self._client = Elasticsearch(
+                hosts=[{"host": settings.elasticsearch_host, "port": settings.elasticsearch_port, "scheme": "http"}]
+            )
+        return self._client
+
+    def ping(self):
+        """Verifies the cluster is reachable; raises if it is not."""
+        if not self.client.ping():
+            raise ConnectionError(f"Elasticsearch at {settings.elasticsearch_host}:{settings.elasticsearch_port} is not reachable")
+
+    def ensure_index(self):
+        """Creates the chunk and document indexes with their mappings if they do not exist yet."""
+        for index, mappings in ((self.index, INDEX_MAPPINGS), (self.documents_index, DOCUMENTS_INDEX_MAPPINGS)):
+            if not self.client.indices.exists(index=index):
+                self.client.indices.create(index=index, mappings=mappings)
+
+    def bulk_index(self, actions, chunk_size: int = 200, index: str = None):
+        """Indexes a stream of bulk actions, sending them as they are produced.
+
+        Returns (indexed, errors); failures are collected rather than raised so
+        one bad chunk does not abort the rest of the document. Actions go to the
+        chunk index unless another ``index`` is given.
+        """
+        indexed, errors = 0, []
+        for ok, item in helpers.streaming_bulk(
+            self.client, actions, index=index or self.index, chunk_size=chunk_size, raise_on_error=False
+        ):
+            if ok:
+                indexed += 1
+            else:
+                errors.append(item)
+        return indexed, errors
+
+    def delete_by_documents(self, document_ids: list) -> int:
+        """Deletes all chunks indexed for the documents; returns how many were deleted."""
+        response = self.client.delete_by_query(
+            index=self.index, query={"terms": {"document_id": document_ids}}, conflicts="proceed",
+        )
+        return response.get("deleted", 0)
+
+    def delete_stale_chunks(self, chunk_counts: dict, owner_id: str) -> int:
+        """Deletes chunks past the new end of re-indexed documents, given {document_id: number of chunks}.
+
+        Only chunks with ``owner_id`` in their metadata are deleted.
+        """
+        response = self.client.delete_by_query(
+            index=self.index,
+            query={"bool": {
+                "filter": [{"bool": {"should": [
+                    # metadata is mapped dynamically, so owner_id is a text field with a keyword subfield.
+                    {"term": {"metadata.owner_id.keyword": owner_id}},
+                    {"term": {"metadata.owner_id": owner_id}},
+                ], "minimum_should_match": 1}}],
+                "should": [
+                    {"bool": {"filter": [
+                        {"term": {"document_id": document_id}},
+                        {"range": {"chunk_index": {"gte": count}}},
+                    ]}}
+                    for document_id, count in chunk_counts.items()
+                ],
+                "minimum_should_match": 1,
+            }},
+            conflicts="proceed",
+        )
+        return response.get("deleted", 0)
 
     def search_documents(self, query: str):
         """Performs a full-text search on documents."""
@@ -0,0 +1,206 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+from settings import settings
+
+try:
+    from fastapi.routing import request_response
+except ImportError:
+    from starlette.routing import request_response
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer, SpeedscopeRenderer
+except ImportError:  # Optional; profiling stays off without it
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+REQUEST_ID_HEADER = b"x-request-id"
+
+# The profile being recorded for the current request, if any. Starlette copies
+# the context into the threadpool, so sync endpoints see it too.
+current_profile: contextvars.ContextVar = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, request_id: str, method: str, path: str, trigger: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.duration = None
+        self.status = None
+        self.session = None  # Event loop (middleware and async code)
+        self.thread_sessions = []  # Sync endpoints run in the threadpool
+        self._lock = threading.Lock()
+
+    def add_thread_session(self, session):
+        with self._lock:
+            self.thread_sessions.append(session)
+
+    def parts(self) -> List[tuple]:
+        parts = [("request", self.session)] if self.session else []
+        return parts + [(f"threadpool-{i}", session) for i, session in enumerate(self.thread_sessions)]
+
+    def summary(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 4) if self.duration is not None else None,
+            "parts": [name for name, _ in self.parts()],
+        }
+
+
+class ProfileStore:
+    """The most recent profiles, in memory, keyed by request id."""
+
+    def __init__(self, max_profiles: int):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.request_id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(request_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles.values())]
+
+
+profile_store = ProfileStore(settings.profiling_max_profiles)
+
+
+def render_profile(profile: RequestProfile, part: str, output: str) -> Optional[str]:
+    """Renders one part of a profile as "text", "html" or "speedscope" JSON; None if there is no such part."""
+    session = dict(profile.parts()).get(part)
+    if session is None:
+        return None
+    if output == "html":
+        return HTMLRenderer().render(session)
+    if output == "speedscope":
+        return SpeedscopeRenderer().render(session)
+    return ConsoleRenderer(unicode=True, color=False).render(session)
+
+
+def _trigger(headers: dict) -> Optional[str]:
+    token = settings.profiling_admin_token
+    if token and headers.get(PROFILE_HEADER, b"").decode() == token:
+        return "header"
+    if settings.profiling_sample_rate and random.random() < settings.profiling_sample_rate:
+        return "sampled"
+    if settings.profiling_slow_seconds is not None:
+        return "threshold"
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles selected requests with pyinstrument and keeps the result by request id.
+
+    A request is profiled when it carries ``X-Profile: <admin token>``, when it
+    is picked by ``profiling_sample_rate``, or (if ``profiling_slow_seconds``
+    is set) always, keeping only the profiles of requests slower than that.
+    Every response gets an ``X-Request-ID`` header to look the profile up by.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(REQUEST_ID_HEADER, b"").decode() or uuid.uuid4().hex
+        status = {}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+            await send(message)
+
+        trigger = _trigger(headers)
+        if trigger is None:
+            return await self.app(scope, receive, send_with_request_id)
+
+        profile = RequestProfile(request_id, scope["method"], scope["path"], trigger)
+        token = current_profile.set(profile)
+        profiler = Profiler(interval=settings.profiling_interval, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            profile.session = profiler.stop()
+            profile.duration = time.perf_counter() - start
+            profile.status = status.get("code")
+            current_profile.reset(token)
+            if trigger != "threshold" or profile.duration >= settings.profiling_slow_seconds:
+                profile_store.add(profile)
+                logger.info("Profiled %s %s (%s) in %.3fs: request id %s", profile.method, profile.path, trigger, profile.duration, request_id)
+
+
+def profile_in_thread(call):
+    """Wraps a sync endpoint so its time in the threadpool is profiled when its request is."""
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        profiler = Profiler(interval=settings.profiling_interval, async_mode="disabled")
+        profiler.start()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.add_thread_session(profiler.stop())
+
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def install_profiling(app: FastAPI) -> bool:
+    """Adds the middleware and wraps sync endpoints; call after all routers are included."""
+    if not settings.profiling_enabled:
+        return False
+    if Profiler is None:
+        logger.warning("PROFILING_ENABLED is set but pyinstrument is not installed; profiling stays off")
+        return False
+
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        call = route.dependant.call
+        if call is None or asyncio.iscoroutinefunction(call) or getattr(call, "__profiled__", False):
+            continue
+        route.dependant.call = profile_in_thread(call)
+        route.app = request_response(route.get_route_handler())
+
+    app.add_middleware(ProfilingMiddleware)
+    logger.info("Request profiling enabled")
+    return True
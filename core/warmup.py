@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from core.elasticsearch_client import es_client
+from database import engine
+from services.access_tracker import access_tracker
+from services.document_service import ping_openai
+from services.outbox import outbox_dispatcher
+from settings import settings
+from utils.extractors import start_sandbox_server
+from utils.folders import get_nlp, ping_gemini
+
+logger = logging.getLogger(__name__)
+
+
+def prefill_db_pool():
+    """Opens the pool's base connections up front instead of on the first requests."""
+    with ThreadPoolExecutor(max_workers=settings.db_pool_size) as pool:
+        connections = list(pool.map(lambda _: engine.connect(), range(settings.db_pool_size)))
+    try:
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_elasticsearch():
+    es_client.ping()
+    es_client.ensure_index()
+
+
+def warm_nlp():
+    get_nlp()("Warm up the pipeline.")
+
+
+CHECKS = {
+    "database": prefill_db_pool,
+    "elasticsearch": warm_elasticsearch,
+    "nlp": warm_nlp,
+    "extractors": start_sandbox_server,
+    "openai": ping_openai,
+    "gemini": ping_gemini,
+}
+# The LLM APIs are external; a worker can serve listings and uploads without them.
+REQUIRED_CHECKS = {"database", "elasticsearch", "nlp"}
+
+
+class WarmupState:
+    """Outcome of the start-up checks, reported by the readiness endpoint."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.checks = {}
+
+    def record(self, name: str, ok: bool, seconds: float, error: str = None):
+        self.checks[name] = {"ok": ok, "seconds": round(seconds, 3), "error": error}
+
+    @property
+    def ready(self) -> bool:
+        return all(self.checks.get(name, {}).get("ok") for name in REQUIRED_CHECKS)
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming",
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "checks": self.checks,
+        }
+
+
+warmup_state = WarmupState()
+
+
+def _run_check(name: str):
+    start = time.perf_counter()
+    try:
+        CHECKS[name]()
+    except Exception as e:
+        return name, False, time.perf_counter() - start, str(e)
+    return name, True, time.perf_counter() - start, None
+
+
+async def run_warmup(state: WarmupState):
+    """Runs every check in parallel, then retries the failed required ones until they pass."""
+    pending = list(CHECKS)
+    while pending:
+        results = await asyncio.gather(*(asyncio.to_thread(_run_check, name) for name in pending))
+        for name, ok, seconds, error in results:
+            state.record(name, ok, seconds, error)
+            if ok:
+                logger.info("Warm-up check %s passed in %.2fs", name, seconds)
+            else:
+                logger.warning("Warm-up check %s failed after %.2fs: %s", name, seconds, error)
+        pending = [name for name, ok, _, _ in results if not ok and name in REQUIRED_CHECKS]
+        if pending:
+            await asyncio.sleep(settings.warmup_retry_seconds)
+    logger.info("Worker ready after %.2fs", time.time() - state.started_at)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warms connections and models in the background; /health/ready reports when it is done.
+
+    Also runs the batched writer of document access times, flushing it at
+    shutdown, and the outbox dispatcher that keeps the search indexes in sync.
+    """
+    task = asyncio.create_task(run_warmup(warmup_state))
+    access_writer = asyncio.create_task(access_tracker.run(settings.access_flush_seconds))
+    dispatcher = None
+    if settings.outbox_dispatch_enabled:
+        dispatcher = asyncio.create_task(outbox_dispatcher.run(settings.outbox_poll_seconds))
+    yield
+    task.cancel()
+    access_writer.cancel()
+    if dispatcher is not None:
+        dispatcher.cancel()
+    await asyncio.gather(access_writer, *([dispatcher] if dispatcher else []), return_exceptions=True)
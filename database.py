@@ -15,7 +15,13 @@ DATABASE_URL = "{db_driver}://{db_user}:{db_password}@{db_instance}:{db_port}/{d
 
 
 def get_engine():
-    return create_engine(DATABASE_URL, client_encoding="utf8")
+    return create_engine(
+        DATABASE_URL,
+        client_encoding="utf8",
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_pre_ping=True,
+    )
 
 
 engine = get_engine()
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import api
-from api import folders, document_routes
+from api import folders, document_routes, metrics, chat, health, admin
+from core.warmup import lifespan
+from core.profiling import install_profiling
 from database import Base, engine
 
 
@@ -13,7 +15,7 @@ logger = logging.getLogger(__name__)
 
 # Base.metadata.create_all(engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -37,3 +39,10 @@ async def home(request: Request):
 app.include_router(api.router)
 app.include_router(folders.router) 
 app.include_router(document_routes.router)
+app.include_router(metrics.router)
+app.include_router(chat.router)
+app.include_router(health.router)
+app.include_router(admin.router)
+
+# Must run after every router is included.
+install_profiling(app)
@@ -0,0 +1,49 @@
+from pydantic import BaseModel
+from uuid import UUID
+from typing import List, Optional
+from datetime import datetime
+
+
+class ChatSessionCreate(BaseModel):
+    title: Optional[str] = None
+    folder_id: Optional[UUID] = None
+
+
+class ChatSessionResponse(BaseModel):
+    id: UUID
+    title: Optional[str] = None
+    folder_id: Optional[UUID] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ChatMessageCreate(BaseModel):
+    content: str
+
+
+class ChatMessageResponse(BaseModel):
+    id: UUID
+    sender: str
+    content: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ChatSource(BaseModel):
+    document_id: UUID
+    filename: str
+    folder: str
+    page: Optional[int] = None
+    score: float
+
+
+class ChatReply(BaseModel):
+    session_id: UUID
+    message: ChatMessageResponse
+    source: str  # "database", "cache" or "corpus"
+    sources: List[ChatSource] = []
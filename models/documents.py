@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+
+
+class IndexDocumentRequest(BaseModel):
+    """One line of the NDJSON body of POST /api/documents/index."""
+    document_id: str = Field(min_length=1)
+    content: str
+    metadata: dict = Field(default_factory=dict)
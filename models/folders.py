@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from uuid import UUID
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class FolderBase(BaseModel):
@@ -24,3 +24,6 @@ class FolderResponse(FolderBase):
 
     class Config:
         orm_mode = True
+
+class FolderTreeNode(FolderResponse):
+    children: List["FolderTreeNode"] = []
@@ -0,0 +1,65 @@
+"""Extracts structured metadata for documents uploaded before it was computed at ingest.
+
+File listings cached by a running server only see the invalidations with the
+shared (redis) listing cache backend; otherwise they catch up within its TTL.
+
+    python -m scripts.backfill_metadata --batch-size 50
+"""
+import argparse
+
+from database import Session
+from tables import Document
+from utils.listing_cache import listing_cache
+from services.document_texts import iter_document_pages
+from services.outbox import UPDATED, record_events
+from utils.folders import SUMMARY_INPUT_CHARS, iter_chunks
+from utils.metadata import document_metadata_columns, extract_document_metadata
+
+
+def read_head(db, document: Document) -> str:
+    head, length = [], 0
+    for chunk in iter_chunks(iter_document_pages(db, document.id, document.storage_path)):
+        head.append(chunk["text"])
+        length += len(chunk["text"])
+        if length >= SUMMARY_INPUT_CHARS:
+            break
+    return "\n".join(head)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    db = Session()
+    done, failed = 0, set()
+    try:
+        while True:
+            query = db.query(Document).filter(Document.extracted_metadata.is_(None))
+            if failed:
+                query = query.filter(Document.id.notin_(failed))
+            documents = query.limit(args.batch_size).all()
+            if not documents:
+                break
+
+            for document in documents:
+                try:
+                    text = read_head(db, document)
+                except Exception as e:
+                    print(f"Error processing file {document.storage_path}: {e}")
+                    failed.add(document.id)
+                    continue
+                for column, value in document_metadata_columns(extract_document_metadata(text)).items():
+                    setattr(document, column, value)
+                done += 1
+            record_events(db, UPDATED, [document.id for document in documents if document.id not in failed])
+            db.commit()
+            for owner_id in {document.owner_id for document in documents}:
+                listing_cache.invalidate(owner_id)
+            print(f"{done} documents backfilled")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Scores paraphrase and near-miss question pairs to pick the semantic answer cache thresholds.
+
+Pairs that would hit by normalisation alone, or that the entity check keeps
+apart, are reported but left out of the score ranges. A threshold is safe
+when it is above every near-miss score and catches the paraphrases above it:
+
+    python -m scripts.calibrate_query_cache [--hashed-only]
+"""
+import argparse
+
+from utils.query_cache import _cosine, _normalised, hashed_embedding, normalise_query, query_entities
+
+# Same question, different words: these should share an answer.
+PARAPHRASES = [
+    ("summary of NHDC letters", "summarise the NHDC correspondence"),
+    ("What are the main issues raised by NHDC?", "What main issues did NHDC raise?"),
+    ("Summarise the correspondence about project Alpha", "Give me a summary of the letters about project Alpha"),
+    ("What did the council say about drainage?", "What did the council say regarding drainage?"),
+    ("Explain the dispute over the final account", "Explain the final account dispute"),
+    ("what are the key risks in the letters", "what are the key risks in the documents"),
+    ("Summarise the letters from Acme Ltd", "summary of letters from Acme Ltd"),
+    ("What concerns were raised about the roof?", "What concerns have been raised about the roof?"),
+]
+# Similar words, different question: these must never share an answer.
+NEAR_MISSES = [
+    ("summarise the letters about project alpha", "summarise the letters about project beta"),
+    ("What did the letters in 2023 say about delays?", "What did the letters in 2024 say about delays?"),
+    ("What did NHDC say about drainage?", "What did NHDC say about parking?"),
+    ("Summarise the letters from Acme", "Summarise the letters to Acme"),
+    ("What are the risks in the letters", "What are the costs in the letters"),
+    ("Explain the dispute over the final account", "Explain the delay to the final account"),
+    ("Why was the roof inspection failed", "Why was the drainage inspection failed"),
+    ("summary of letters from north herts", "summary of letters from south herts"),
+]
+
+
+def scores(pairs, embed):
+    for a, b in pairs:
+        na, nb = normalise_query(a), normalise_query(b)
+        if na == nb:
+            yield a, b, "normalised"
+        elif query_entities(a) != query_entities(b):
+            yield a, b, "entities differ"
+        else:
+            yield a, b, round(_cosine(embed(na), embed(nb)), 3)
+
+
+def report(name, embed):
+    print(f"{name} embedding")
+    ranges = {}
+    for label, pairs in (("paraphrase", PARAPHRASES), ("near miss", NEAR_MISSES)):
+        for a, b, score in scores(pairs, embed):
+            print(f"  {label:<10} {score!s:>16}  {a!r} / {b!r}")
+            if isinstance(score, float):
+                ranges.setdefault(label, []).append(score)
+    highest_miss = max(ranges.get("near miss", [0.0]))
+    caught = [s for s in ranges.get("paraphrase", []) if s > highest_miss]
+    print(f"  highest near miss {highest_miss}; {len(caught)} of {len(ranges.get('paraphrase', []))} "
+          f"scored paraphrases above it\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashed-only", action="store_true", help="skip the embeddings API")
+    args = parser.parse_args()
+
+    report("hashed", hashed_embedding)
+    if not args.hashed_only:
+        from services.document_service import DocumentService
+        service = DocumentService()
+        report("remote", lambda text: _normalised(service.generate_embedding(text)))
+
+
+if __name__ == "__main__":
+    main()
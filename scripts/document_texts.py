@@ -0,0 +1,159 @@
+"""Maintains the compressed extracted text of documents (the document_texts table).
+
+Train a zstd dictionary on a sample of the corpus, then store (or recompress
+with the newest dictionary) the text of every document:
+
+    python -m scripts.document_texts train --samples 2000 --size 112640
+    python -m scripts.document_texts store --batch-size 50 [--recompress]
+
+``train`` prints the compressed size of held-out documents with zlib, plain
+zstd and zstd with the new dictionary, to check it is worth keeping.
+"""
+import argparse
+import random
+import zlib
+
+from sqlalchemy.dialects.postgresql import insert
+
+from database import Session
+from services.document_texts import (
+    PageRecorder, current_dictionary, extractor_signature, iter_stored_pages,
+)
+from tables import CompressionDictionary, Document, DocumentText
+from utils.extractors import registered_extractors
+from utils.folders import PAGE_BREAK, iter_extracted_pages
+from utils.text_codec import ZSTD, TextCompressor, train_dictionary
+
+
+def read_text(db, document: Document) -> str:
+    row = db.query(DocumentText).filter(DocumentText.document_id == document.id).first()
+    pages = iter_stored_pages(db, row) if row is not None else iter_extracted_pages(document.storage_path)
+    return PAGE_BREAK.join(text for _, text in pages)
+
+
+def compressed_size(text: bytes, dictionary=None) -> int:
+    compressor = TextCompressor(dictionary)
+    compressor.write(text.decode("utf-8"))
+    return len(compressor.finish())
+
+
+def train(db, args):
+    ids = [row.id for row in db.query(Document.id).all()]
+    sample = random.Random(0).sample(ids, min(len(ids), args.samples + args.holdout))
+    held_out, training = sample[:args.holdout], sample[args.holdout:]
+
+    def texts(document_ids):
+        for document in db.query(Document).filter(Document.id.in_(document_ids)):
+            try:
+                text = read_text(db, document)
+            except Exception as e:
+                print(f"Error reading {document.storage_path}: {e}")
+                continue
+            if text.strip():
+                yield text.encode("utf-8")
+
+    # Boilerplate sits at the start and end of letters; the middle adds little to a dictionary.
+    samples = []
+    for text in texts(training):
+        half = args.sample_bytes // 2
+        samples.append(text if len(text) <= args.sample_bytes else text[:half] + text[-half:])
+    if len(samples) < 10:
+        raise SystemExit(f"Only {len(samples)} documents with text; need at least 10 to train a dictionary")
+
+    data = train_dictionary(samples, args.size)
+    dictionary = CompressionDictionary(codec=ZSTD, data=data, sample_count=len(samples))
+    db.add(dictionary)
+    db.commit()
+    print(f"dictionary {dictionary.id}: {len(data)} bytes from {len(samples)} documents")
+
+    held_out_texts = list(texts(held_out))
+    if held_out_texts:
+        raw = sum(len(text) for text in held_out_texts)
+        sizes = {
+            "zlib": sum(len(zlib.compress(text, 9)) for text in held_out_texts),
+            "zstd": sum(compressed_size(text) for text in held_out_texts),
+            "zstd+dictionary": sum(compressed_size(text, (dictionary.id, data)) for text in held_out_texts),
+        }
+        print(f"{len(held_out_texts)} held-out documents, {raw} bytes:")
+        for name, size in sizes.items():
+            print(f"  {name:<16} {size:>10} bytes  ratio {raw / size:5.2f}")
+
+
+def store(db, args):
+    dictionary = current_dictionary(db)
+    current = [extractor_signature(e) for e in registered_extractors()]
+    done, failed = 0, set()
+    while True:
+        query = db.query(Document).outerjoin(DocumentText, DocumentText.document_id == Document.id)
+        stale = DocumentText.document_id.is_(None) | DocumentText.extractor.notin_(current)
+        if args.recompress:
+            stale = stale | (DocumentText.codec != ZSTD)
+        if args.recompress and dictionary:
+            stale = stale | DocumentText.dictionary_id.is_distinct_from(dictionary[0])
+        query = query.filter(stale)
+        if failed:
+            query = query.filter(Document.id.notin_(failed))
+        documents = query.order_by(Document.id).limit(args.batch_size).all()
+        if not documents:
+            break
+
+        rows = []
+        for document in documents:
+            recorder = PageRecorder(dictionary)
+            try:
+                # Recompressing an up-to-date text reads it back from the table, not the file.
+                existing = db.query(DocumentText).filter(DocumentText.document_id == document.id).first()
+                if existing is not None and existing.extractor in current:
+                    pages, extractor = iter_stored_pages(db, existing), existing.extractor
+                else:
+                    pages, extractor = iter_extracted_pages(document.storage_path), None
+                for _ in recorder.record(pages):
+                    pass
+                row = recorder.row(document.id, document.storage_path, extractor)
+            except Exception as e:
+                print(f"Error processing file {document.storage_path}: {e}")
+                failed.add(document.id)
+                continue
+            if row is None:
+                failed.add(document.id)
+                continue
+            rows.append(row)
+
+        if rows:
+            statement = insert(DocumentText).values(rows)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[DocumentText.document_id],
+                set_={column: statement.excluded[column] for column in ("extractor", "codec", "dictionary_id", "raw_size", "content")},
+            ))
+        db.commit()
+        done += len(rows)
+        print(f"{done} documents stored, {len(failed)} without text")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train and store a new zstd dictionary")
+    train_parser.add_argument("--samples", type=int, default=2000, help="documents to train on")
+    train_parser.add_argument("--holdout", type=int, default=100, help="documents to measure the ratio on")
+    train_parser.add_argument("--sample-bytes", type=int, default=16 * 1024, help="bytes of each document used")
+    train_parser.add_argument("--size", type=int, default=112640, help="dictionary size in bytes")
+
+    store_parser = commands.add_parser("store", help="store the text of documents that have none or a stale one")
+    store_parser.add_argument("--batch-size", type=int, default=50)
+    store_parser.add_argument("--recompress", action="store_true", help="also rewrite zlib texts and texts not using the newest dictionary")
+    args = parser.parse_args()
+
+    db = Session()
+    try:
+        if args.command == "train":
+            train(db, args)
+        else:
+            store(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
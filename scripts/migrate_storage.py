@@ -0,0 +1,76 @@
+"""Copies documents stored on local disk to the configured S3-compatible bucket.
+
+Run with STORAGE_BACKEND=s3 and the STORAGE_S3_* settings of the target:
+
+    python -m scripts.migrate_storage --batch-size 50 [--delete-local]
+
+Each copied document's storage_path (and its files row) is pointed at the
+object, and its checksum filled in if missing. Local files are kept unless
+--delete-local is given, so workers still reading the old path keep working.
+"""
+import argparse
+import os
+
+from database import Session
+from settings import settings
+from tables import Document, Files
+from utils.listing_cache import listing_cache
+from utils.storage import get_storage, local_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--delete-local", action="store_true", help="remove each local file once copied")
+    args = parser.parse_args()
+
+    if settings.storage_backend != "s3":
+        parser.error("set STORAGE_BACKEND=s3 (and the STORAGE_S3_* settings) to migrate to a bucket")
+    storage = get_storage()
+
+    db = Session()
+    done, failed = 0, set()
+    try:
+        while True:
+            query = db.query(Document).filter(~Document.storage_path.startswith("s3://"))
+            if failed:
+                query = query.filter(Document.id.notin_(failed))
+            documents = query.limit(args.batch_size).all()
+            if not documents:
+                break
+
+            moved = []
+            for document in documents:
+                old_path = document.storage_path
+                try:
+                    with local_storage.open(old_path) as source:
+                        # Keyed like save_upload, so versions of one file name stay separate objects.
+                        key = f"{document.folder_id}/{document.id}/{os.path.basename(old_path)}"
+                        stored = storage.put(source, key)
+                except Exception as e:
+                    print(f"Error copying file {old_path}: {e}")
+                    failed.add(document.id)
+                    continue
+                document.storage_path = stored.location
+                document.checksum = document.checksum or stored.checksum
+                db.query(Files).filter(Files.path == old_path).update({Files.path: stored.location}, synchronize_session=False)
+                moved.append(old_path)
+                done += 1
+            db.commit()
+            for owner_id in {document.owner_id for document in documents}:
+                listing_cache.invalidate(owner_id)
+            if args.delete_local:
+                # Versions uploaded before per-document keys can share a local file.
+                still_used = {
+                    row.storage_path
+                    for row in db.query(Document.storage_path).filter(Document.storage_path.in_(moved))
+                }
+                for old_path in set(moved) - still_used:
+                    local_storage.delete(old_path)
+            print(f"{done} documents copied, {len(failed)} failed")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
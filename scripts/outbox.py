@@ -0,0 +1,62 @@
+"""Maintains the outbox that keeps the Elasticsearch document index in sync with Postgres.
+
+Queue every existing document once, e.g. after creating the index or to
+repair drift, then let the server's dispatchers (or this script) apply it:
+
+    python -m scripts.outbox enqueue --batch-size 1000
+    python -m scripts.outbox dispatch
+    python -m scripts.outbox status
+"""
+import argparse
+
+from database import Session
+from services.outbox import UPDATED, outbox_dispatcher, record_events
+from tables import Document
+
+
+def enqueue(db, args):
+    done, last_id = 0, None
+    while True:
+        query = db.query(Document.id).order_by(Document.id)
+        if last_id is not None:
+            query = query.filter(Document.id > last_id)
+        ids = [row.id for row in query.limit(args.batch_size)]
+        if not ids:
+            break
+        record_events(db, UPDATED, ids)
+        db.commit()
+        done += len(ids)
+        last_id = ids[-1]
+        print(f"{done} documents queued")
+
+
+def dispatch(db, args):
+    """Applies the backlog from this process, until only events waiting for a retry are left."""
+    while outbox_dispatcher.dispatch_once():
+        print(outbox_dispatcher.stats(db))
+        db.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="queue an update event for every document")
+    enqueue_parser.add_argument("--batch-size", type=int, default=1000)
+    commands.add_parser("dispatch", help="apply the pending events now")
+    commands.add_parser("status", help="print the backlog and lag")
+    args = parser.parse_args()
+
+    db = Session()
+    try:
+        if args.command == "enqueue":
+            enqueue(db, args)
+        elif args.command == "dispatch":
+            dispatch(db, args)
+        else:
+            print(outbox_dispatcher.stats(db))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import bindparam
+
+from database import Session
+from tables import Document
+
+logger = logging.getLogger(__name__)
+
+_documents = Document.__table__
+
+# One statement executed for the whole batch. updated_at is set to itself so its
+# onupdate default does not fire: reading a document does not change it.
+_UPDATE_LAST_ACCESSED = (
+    _documents.update()
+    .where(_documents.c.id == bindparam("document_id"))
+    .where((_documents.c.last_accessed_at.is_(None)) | (_documents.c.last_accessed_at < bindparam("accessed_at")))
+    .values(last_accessed_at=bindparam("accessed_at"), updated_at=_documents.c.updated_at)
+)
+
+
+class AccessTracker:
+    """Collects document reads in memory and writes their last_accessed_at in batches.
+
+    Downloads only call ``record``; ``flush`` (run periodically and at shutdown)
+    writes the latest access time per document with one executemany UPDATE, so
+    a document read a thousand times between flushes costs one row update.
+    """
+
+    def __init__(self):
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.flushed = 0
+
+    def record(self, document_id: UUID):
+        with self._lock:
+            self._pending[document_id] = datetime.utcnow()
+            self.recorded += 1
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        db = Session()
+        try:
+            db.execute(
+                _UPDATE_LAST_ACCESSED,
+                [{"document_id": document_id, "accessed_at": accessed_at} for document_id, accessed_at in pending.items()],
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put them back unless a newer access was recorded meanwhile; retried on the next flush.
+            with self._lock:
+                for document_id, accessed_at in pending.items():
+                    self._pending.setdefault(document_id, accessed_at)
+            raise
+        finally:
+            db.close()
+        self.flushed += len(pending)
+        return len(pending)
+
+    async def run(self, interval: float):
+        """Flushes every ``interval`` seconds until cancelled, then once more."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logger.warning("Could not write document access times: %s", e)
+        finally:
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.warning("Could not write document access times at shutdown: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "recorded": self.recorded, "flushed": self.flushed}
+
+
+access_tracker = AccessTracker()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, List, Optional
+from uuid import UUID
+
+from pydantic import ValidationError
+
+from database import Session
+from models.documents import IndexDocumentRequest
+from services.document_service import DocumentService
+from settings import settings
+from tables import Document
+from utils.folders import iter_chunks, split_pages
+
+logger = logging.getLogger(__name__)
+
+
+class LineTooLong(Exception):
+    def __init__(self, line: int):
+        super().__init__(line)
+        self.line = line
+
+
+async def iter_lines(body: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple]:
+    """Yields (line_number, line) of an NDJSON byte stream as it arrives, skipping blank lines.
+
+    Only the bytes that arrived since the last chunk are searched for line
+    ends, so a long line sent in many small chunks is not rescanned each time.
+    """
+    buffer, line_number = bytearray(), 0
+    async for data in body:
+        scanned = len(buffer)
+        buffer += data
+        start = 0
+        while (end := buffer.find(b"\n", scanned)) >= 0:
+            line_number += 1
+            line = bytes(buffer[start:end])
+            if line.strip():
+                yield line_number, line
+            start = scanned = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(line_number + 1)
+    if buffer.strip():
+        yield line_number + 1, bytes(buffer)
+
+
+class BulkIndexer:
+    """Indexes an NDJSON stream of documents, yielding one NDJSON result line per document.
+
+    A reader task parses and chunks the body into a bounded queue. When
+    embedding falls behind, the queue fills up and the reader stops reading,
+    so the client is slowed down by flow control instead of the body piling
+    up in memory. Documents are taken off the queue until about
+    ``batch_size`` chunks are gathered, embedded with one request and written
+    with one bulk request in a worker thread, keeping the event loop free.
+    Results come out in the order of the input lines.
+
+    Chunks are indexed under ``bulk:{owner_id}:{document_id}:{index}`` with
+    ``owner_id`` in their metadata (overriding any sent in the body), so one
+    caller's ids never overwrite another's or an uploaded document's chunks.
+    Ids of uploaded documents are rejected.
+    """
+
+    def __init__(self, service: DocumentService, owner_id: str, batch_size: int = None, queue_size: int = None,
+                 max_line_bytes: int = None):
+        self.service = service
+        self.owner_id = owner_id
+        self.batch_size = batch_size or settings.bulk_index_batch_chunks
+        self.queue_size = queue_size or settings.bulk_index_queue_documents
+        self.max_line_bytes = max_line_bytes or settings.bulk_index_max_line_bytes
+
+    def _parse(self, line_number: int, line: bytes) -> dict:
+        try:
+            request = IndexDocumentRequest.model_validate_json(line)
+        except ValidationError as e:
+            return {"line": line_number, "status": "error",
+                    "error": e.errors(include_url=False, include_context=False, include_input=False)}
+        chunks = list(iter_chunks(split_pages([request.content])))
+        for chunk in chunks:
+            chunk["es_id"] = f"bulk:{self.owner_id}:{request.document_id}:{chunk['index']}"
+        return {
+            "line": line_number,
+            "document_id": request.document_id,
+            "metadata": {**request.metadata, "owner_id": self.owner_id},
+            "chunks": chunks,
+        }
+
+    @staticmethod
+    def _uploaded_ids(document_ids) -> set:
+        """The ids among ``document_ids`` that belong to uploaded documents (of any owner)."""
+        ids = set()
+        for document_id in document_ids:
+            try:
+                ids.add(UUID(document_id))
+            except ValueError:
+                pass
+        if not ids:
+            return set()
+        db = Session()
+        try:
+            return {str(row.id) for row in db.query(Document.id).filter(Document.id.in_(ids))}
+        finally:
+            db.close()
+
+    async def _read(self, body: AsyncIterator[bytes], queue: asyncio.Queue):
+        try:
+            async for line_number, line in iter_lines(body, self.max_line_bytes):
+                await queue.put(await asyncio.to_thread(self._parse, line_number, line))
+        except LineTooLong as e:
+            await queue.put({
+                "line": e.line, "status": "error",
+                "error": f"Line longer than {self.max_line_bytes} bytes; the rest of the body was not read.",
+            })
+        except Exception as e:
+            # Typically the client went away; end the stream with what was read.
+            logger.warning("Stopped reading bulk index body: %s", e)
+        await queue.put(None)
+
+    def _index_batch(self, batch: List[dict]) -> List[dict]:
+        documents = [item for item in batch if item.get("chunks")]
+        failed = {}
+        # Uploaded documents' chunks belong to their upload (and its document_chunks rows).
+        try:
+            uploaded = self._uploaded_ids(item["document_id"] for item in documents)
+        except Exception as e:
+            uploaded = {item["document_id"] for item in documents}
+            failed = {document_id: str(e) for document_id in uploaded}
+        for document_id in uploaded:
+            failed.setdefault(document_id, "document_id belongs to an uploaded document.")
+        documents = [item for item in documents if item["document_id"] not in uploaded]
+        texts = [chunk["text"] for item in documents for chunk in item["chunks"]]
+        try:
+            embeddings = []
+            for start in range(0, len(texts), self.batch_size):
+                embeddings.extend(self.service.generate_embeddings(texts[start:start + self.batch_size]))
+            embeddings = iter(embeddings)
+            actions = [
+                self.service.chunk_action(item["document_id"], chunk, item["metadata"], next(embeddings))
+                for item in documents for chunk in item["chunks"]
+            ]
+            owners = {chunk["es_id"]: item["document_id"] for item in documents for chunk in item["chunks"]}
+            _, errors = self.service.es_client.bulk_index(actions) if actions else (0, [])
+            for error in errors:
+                (_, result), = error.items()
+                failed.setdefault(owners[result["_id"]], str(result.get("error") or result.get("status")))
+        except Exception as e:
+            failed.update({item["document_id"]: str(e) for item in documents})
+
+        # A document indexed again with fewer chunks keeps none of its old tail.
+        indexed = {item["document_id"]: len(item["chunks"]) for item in documents if item["document_id"] not in failed}
+        if indexed:
+            try:
+                self.service.es_client.delete_stale_chunks(indexed, self.owner_id)
+            except Exception as e:
+                logger.warning("Could not delete stale chunks of %d documents: %s", len(indexed), e)
+
+        results = []
+        for item in batch:
+            if "chunks" not in item:
+                results.append(item)
+            elif not item["chunks"]:
+                results.append({"line": item["line"], "document_id": item["document_id"], "status": "skipped",
+                                "error": "No text to index."})
+            elif item["document_id"] in failed:
+                results.append({"line": item["line"], "document_id": item["document_id"], "status": "error",
+                                "error": failed[item["document_id"]]})
+            else:
+                results.append({"line": item["line"], "document_id": item["document_id"], "status": "indexed",
+                                "chunks": len(item["chunks"])})
+        return results
+
+    async def stream(self, body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        reader = asyncio.create_task(self._read(body, queue))
+        try:
+            item: Optional[dict] = {}
+            while item is not None:
+                batch, chunks = [], 0
+                item = await queue.get()
+                while item is not None:
+                    batch.append(item)
+                    chunks += len(item.get("chunks", ()))
+                    if chunks >= self.batch_size or queue.empty():
+                        break
+                    item = queue.get_nowait()
+                if batch:
+                    for result in await asyncio.to_thread(self._index_batch, batch):
+                        yield json.dumps(result) + "\n"
+        finally:
+            reader.cancel()
@@ -0,0 +1,262 @@
+import heapq
+import math
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+
+from settings import settings
+from services.document_texts import iter_document_pages
+from services.folders import corpus_version, scoped_documents_query
+from services.query_router import answer_from_database
+from tables import ChatMessage, ChatSession, Document
+from utils.folders import call_gemini, extract_keywords, iter_chunk_keywords, iter_chunks
+
+# Bump when the layout of ChatSession.context_cache changes, so old caches are rebuilt.
+CONTEXT_CACHE_VERSION = 1
+
+
+def score_chunk(query_keywords: set, chunk_keywords) -> float:
+    """Keyword overlap between a question and a chunk, normalised so long chunks do not win on size."""
+    if not chunk_keywords:
+        return 0.0
+    return len(query_keywords.intersection(chunk_keywords)) / math.sqrt(len(chunk_keywords))
+
+
+class ChatService:
+    """Conversations over a user's documents.
+
+    The first question of a session scans the documents in scope and caches
+    the best-scoring chunks (their keywords and scores, not their text) on the
+    session. Follow-up questions re-rank that candidate set; the corpus is only
+    scanned again when the documents in scope change or nothing cached matches.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_session(self, owner_id: UUID, title: Optional[str] = None, folder_id: Optional[UUID] = None) -> ChatSession:
+        if folder_id:
+            # Raises 404 for folders the caller does not own.
+            scoped_documents_query(self.db, owner_id, folder_id)
+        session = ChatSession(user_id=owner_id, title=title, folder_id=folder_id)
+        self.db.add(session)
+        self.db.commit()
+        self.db.refresh(session)
+        return session
+
+    def list_sessions(self, owner_id: UUID) -> List[ChatSession]:
+        return (
+            self.db.query(ChatSession)
+            .filter(ChatSession.user_id == owner_id)
+            .order_by(ChatSession.updated_at.desc())
+            .all()
+        )
+
+    def get_session(self, session_id: UUID, owner_id: UUID) -> ChatSession:
+        session = (
+            self.db.query(ChatSession)
+            .filter(ChatSession.id == session_id, ChatSession.user_id == owner_id)
+            .first()
+        )
+        if not session:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+        return session
+
+    def delete_session(self, session_id: UUID, owner_id: UUID):
+        self.db.delete(self.get_session(session_id, owner_id))
+        self.db.commit()
+
+    def get_messages(self, session_id: UUID, owner_id: UUID) -> List[ChatMessage]:
+        session = self.get_session(session_id, owner_id)
+        return (
+            self.db.query(ChatMessage)
+            .filter(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at)
+            .all()
+        )
+
+    def post_message(self, session_id: UUID, owner_id: UUID, content: str) -> dict:
+        """Stores a question, answers it in the context of the conversation and stores the answer."""
+        session = self.get_session(session_id, owner_id)
+        documents_query = scoped_documents_query(self.db, owner_id, session.folder_id)
+        history = self._prompt_history(session)
+
+        self.db.add(ChatMessage(session_id=session.id, sender="user", content=content, created_at=datetime.utcnow()))
+
+        routed = answer_from_database(content, documents_query)
+        if routed is not None:
+            answer, source, sources = routed["answer"], "database", []
+        else:
+            answer, source, sources = self._answer_from_documents(session, documents_query, content, history)
+
+        reply = ChatMessage(session_id=session.id, sender="assistant", content=answer, created_at=datetime.utcnow())
+        self.db.add(reply)
+        if not session.title:
+            session.title = content[:80]
+        session.updated_at = datetime.utcnow()
+        self.db.flush()
+        self._compact_history(session)
+        self.db.commit()
+        self.db.refresh(reply)
+        return {"session_id": session.id, "message": reply, "source": source, "sources": sources}
+
+    def _build_candidates(self, documents_query, query_keywords: set, version: str) -> dict:
+        """Scans every document in scope and keeps the best-scoring chunks for the session."""
+        heap, documents, tie = [], {}, 0
+        for document, folder_name in documents_query.order_by(Document.created_at).all():
+            # Registered first: chunks read before a failure stay on the heap and need their document.
+            documents[str(document.id)] = {
+                "filename": document.filename,
+                "folder": folder_name,
+                "path": document.storage_path,
+            }
+            positions = []
+
+            def texts():
+                for chunk in iter_chunks(iter_document_pages(self.db, document.id, document.storage_path)):
+                    positions.append((chunk["index"], chunk["page"]))
+                    yield chunk["text"]
+
+            try:
+                for i, keywords in enumerate(iter_chunk_keywords(texts())):
+                    score = score_chunk(query_keywords, keywords)
+                    index, page = positions[i]
+                    entry = (score, tie, {"d": str(document.id), "i": index, "p": page, "k": sorted(keywords), "s": score})
+                    tie += 1
+                    if len(heap) < settings.chat_candidate_chunks:
+                        heapq.heappush(heap, entry)
+                    else:
+                        heapq.heappushpop(heap, entry)
+            except Exception as e:
+                print(f"Error processing file {document.storage_path}: {e}")
+
+        chunks = [chunk for _, _, chunk in heap]
+        used = {chunk["d"] for chunk in chunks}
+        return {
+            "version": CONTEXT_CACHE_VERSION,
+            "corpus_version": version,
+            "documents": {doc_id: info for doc_id, info in documents.items() if doc_id in used},
+            "chunks": chunks,
+        }
+
+    def _rerank(self, context: dict, query_keywords: set) -> bool:
+        """Re-scores the cached chunks for a follow-up; False if none of them matches the question."""
+        matched = False
+        for chunk in context["chunks"]:
+            score = score_chunk(query_keywords, chunk["k"])
+            matched = matched or score > 0
+            chunk["s"] = score + settings.chat_score_decay * chunk["s"]
+        return matched
+
+    def _load_chunk_texts(self, context: dict, chunks: List[dict]) -> List[str]:
+        """Re-reads the text of the selected chunks from the stored document text."""
+        wanted = defaultdict(set)
+        for chunk in chunks:
+            wanted[chunk["d"]].add(chunk["i"])
+
+        texts = {}
+        for doc_id, indexes in wanted.items():
+            remaining = set(indexes)
+            path = context["documents"][doc_id]["path"]
+            try:
+                for chunk in iter_chunks(iter_document_pages(self.db, UUID(doc_id), path)):
+                    if chunk["index"] in remaining:
+                        texts[(doc_id, chunk["index"])] = chunk["text"]
+                        remaining.discard(chunk["index"])
+                        if not remaining:
+                            break
+            except Exception as e:
+                # The chunks read before the failure keep their text; the rest are left empty.
+                print(f"Error processing file {path}: {e}")
+        return [texts.get((chunk["d"], chunk["i"]), "") for chunk in chunks]
+
+    def _answer_from_documents(self, session: ChatSession, documents_query, content: str, history: str):
+        query_keywords = extract_keywords(content)
+        version = corpus_version(documents_query)
+
+        context, source = session.context_cache, "cache"
+        if (
+            not context
+            or context.get("version") != CONTEXT_CACHE_VERSION
+            or context.get("corpus_version") != version
+            or not self._rerank(context, query_keywords)
+        ):
+            context, source = self._build_candidates(documents_query, query_keywords, version), "corpus"
+        session.context_cache = context
+        flag_modified(session, "context_cache")
+
+        top = sorted(context["chunks"], key=lambda chunk: chunk["s"], reverse=True)[:settings.chat_context_chunks]
+        top = [chunk for chunk in top if chunk["s"] > 0]
+        if not top:
+            return f"No relevant documents found for query: {content}", source, []
+
+        excerpts = "\n\n".join(
+            f"[{context['documents'][chunk['d']]['filename']}, page {chunk['p']}]\n{text}"
+            for chunk, text in zip(top, self._load_chunk_texts(context, top))
+        )
+        prompt = f"""
+        You are answering questions about a user's project documents in an ongoing conversation.
+
+        Conversation so far:
+        {history or "(none)"}
+
+        Relevant document excerpts:
+        {excerpts}
+
+        Question: {content}
+
+        Answer using only the excerpts and the conversation, and name the files you rely on.
+        """
+        sources = [
+            {
+                "document_id": chunk["d"],
+                "filename": context["documents"][chunk["d"]]["filename"],
+                "folder": context["documents"][chunk["d"]]["folder"],
+                "page": chunk["p"],
+                "score": round(chunk["s"], 4),
+            }
+            for chunk in top
+        ]
+        return call_gemini(prompt), source, sources
+
+    def _unsummarised_messages(self, session: ChatSession) -> List[ChatMessage]:
+        messages = self.db.query(ChatMessage).filter(ChatMessage.session_id == session.id)
+        if session.summary_through:
+            messages = messages.filter(ChatMessage.created_at > session.summary_through)
+        return messages.order_by(ChatMessage.created_at).all()
+
+    def _prompt_history(self, session: ChatSession) -> str:
+        """The session summary plus the most recent messages, verbatim."""
+        recent = self._unsummarised_messages(session)[-settings.chat_history_messages:]
+        lines = [f"Summary of earlier conversation: {session.summary}"] if session.summary else []
+        lines += [f"{message.sender.capitalize()}: {message.content}" for message in recent]
+        return "\n".join(lines)
+
+    def _compact_history(self, session: ChatSession):
+        """Folds messages older than the recent window into the rolling summary.
+
+        Runs only once twice the window has built up, so it costs one LLM call
+        every few turns and the prompt history stays bounded.
+        """
+        window = settings.chat_history_messages
+        messages = self._unsummarised_messages(session)
+        if len(messages) <= 2 * window:
+            return
+
+        older = messages[:-window]
+        transcript = "\n".join(f"{message.sender.capitalize()}: {message.content}" for message in older)
+        summary = call_gemini(
+            "Update the summary of this conversation about project documents with the new messages. "
+            "Keep the questions asked, the documents, projects, parties and dates discussed, and the "
+            "answers given, in at most 10 sentences.\n\n"
+            f"Current summary: {session.summary or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        if summary.startswith("Error:"):
+            return
+        session.summary = summary
+        session.summary_through = older[-1].created_at
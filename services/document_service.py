@@ -1,9 +1,26 @@
+from functools import lru_cache
+from itertools import islice
 from openai import OpenAI
 from core.elasticsearch_client import es_client
 from fastapi import HTTPException
 from settings import settings
 
-client = OpenAI(api_key=settings.openai_api_key)
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """The OpenAI client, created on first use (or at warm-up)."""
+    return OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+
+
+def ping_openai():
+    """Fetches the configured model, opening a pooled connection and checking the API key."""
+    get_openai_client().models.retrieve(settings.openai_model)
+
+
+def chunk_metadata(filename: str, folder_id, owner_id) -> dict:
+    """The ``metadata`` field of an uploaded document's indexed chunks."""
+    return {"filename": filename, "folder_id": str(folder_id), "owner_id": str(owner_id)}
+
 
 class DocumentService:
     def __init__(self):
@@ -11,16 +28,56 @@ class DocumentService:
 
     def generate_embedding(self, text: str):
         """Generates an OpenAI embedding for a given text."""
-        response = client.embeddings.create(model="text-embedding-ada-002", input=text)
-        return response["data"][0]["embedding"]
+        return self.generate_embeddings([text])[0]
 
-    def index_document(self, document_id: str, content: str, metadata: dict):
-        try:
-            embedding = self.generate_embedding(content)
-            self.es_client.index_document(document_id, content, metadata, embedding)
-            return {"message": "Document indexed successfully"}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Indexing failed: {str(e)}")
+    def generate_embeddings(self, texts: list):
+        """Generates OpenAI embeddings for several texts in one request."""
+        response = get_openai_client().embeddings.create(model="text-embedding-ada-002", input=texts)
+        return [item.embedding for item in response.data]
+
+    @staticmethod
+    def chunk_action(document_id: str, chunk: dict, metadata: dict, embedding: list) -> dict:
+        """The bulk action indexing one embedded chunk of a document."""
+        return {
+            "_id": chunk.get("es_id") or f"{document_id}:{chunk['index']}",
+            "_source": {
+                "document_id": document_id,
+                "chunk_index": chunk["index"],
+                "page": chunk["page"],
+                "content": chunk["text"],
+                "metadata": metadata,
+                "embedding": embedding,
+            },
+        }
+
+    def index_chunks(self, document_id: str, chunks, metadata: dict, batch_size: int = 16):
+        """Embeds and indexes a stream of chunks, a batch at a time, as they are produced.
+
+        Chunks are consumed lazily, so the first ones reach Elasticsearch while
+        later pages of the document are still being extracted. A chunk marked
+        ``reused`` is already indexed with the same text (by the previous
+        version of the document) and is skipped.
+        """
+        chunks = iter(chunks)
+
+        def actions():
+            batch = []
+            for chunk in chunks:
+                if chunk.get("reused"):
+                    continue
+                batch.append(chunk)
+                if len(batch) == batch_size:
+                    yield from self._embedded(document_id, batch, metadata)
+                    batch = []
+            if batch:
+                yield from self._embedded(document_id, batch, metadata)
+
+        return self.es_client.bulk_index(actions())
+
+    def _embedded(self, document_id: str, batch: list, metadata: dict):
+        embeddings = self.generate_embeddings([chunk["text"] for chunk in batch])
+        for chunk, embedding in zip(batch, embeddings):
+            yield self.chunk_action(document_id, chunk, metadata, embedding)
 
     def search_documents(self, query: str):
         try:
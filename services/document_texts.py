@@ -0,0 +1,98 @@
+import threading
+from typing import Iterator, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from tables import CompressionDictionary, DocumentText
+from utils.extractors import get_extractor, registered_extractors
+from utils.folders import PAGE_BREAK, iter_extracted_pages, split_pages
+from utils.storage import local_path
+from utils.text_codec import ZSTD, TextCompressor, iter_decompressed
+
+# Dictionaries are never modified once stored, so they are cached by id for the process lifetime.
+_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+
+
+def extractor_signature(extractor) -> str:
+    """Identifies the extractor setup that produced a text; stored texts from older setups are not used."""
+    return f"{extractor.name}:{extractor.version}:{extractor.options()}"
+
+
+def get_dictionary(db: Session, dictionary_id: int) -> bytes:
+    with _dictionaries_lock:
+        data = _dictionaries.get(dictionary_id)
+    if data is None:
+        data = db.query(CompressionDictionary.data).filter(CompressionDictionary.id == dictionary_id).scalar()
+        with _dictionaries_lock:
+            _dictionaries[dictionary_id] = data
+    return data
+
+
+def current_dictionary(db: Session) -> Optional[tuple]:
+    """(id, bytes) of the newest trained dictionary, or None if there is none."""
+    dictionary_id = (
+        db.query(CompressionDictionary.id)
+        .filter(CompressionDictionary.codec == ZSTD)
+        .order_by(CompressionDictionary.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    return (dictionary_id, get_dictionary(db, dictionary_id)) if dictionary_id else None
+
+
+class PageRecorder:
+    """Compresses pages as they stream past, for storing once the whole document was read."""
+
+    def __init__(self, dictionary: Optional[tuple]):
+        self.compressor = TextCompressor(dictionary)
+        self.pages = 0
+        self.complete = False
+
+    def record(self, pages) -> Iterator[tuple]:
+        for page_number, text in pages:
+            if self.pages:
+                self.compressor.write(PAGE_BREAK)
+            self.compressor.write(text.replace(PAGE_BREAK, ""))
+            self.pages += 1
+            yield page_number, text
+        self.complete = True
+
+    def row(self, document_id: UUID, location: str, extractor: str = None) -> Optional[dict]:
+        """The document_texts row, or None if the pages were not all read.
+
+        ``extractor`` is the signature of the extractor that produced the pages,
+        by default the one the file at ``location`` is extracted with.
+        """
+        if not self.complete or not self.pages:
+            return None
+        if extractor is None:
+            with local_path(location) as file_path:
+                extractor = extractor_signature(get_extractor(file_path))
+        return {
+            "document_id": document_id,
+            "extractor": extractor,
+            "codec": self.compressor.codec,
+            "dictionary_id": self.compressor.dictionary_id,
+            "raw_size": self.compressor.raw_size,
+            "content": self.compressor.finish(),
+        }
+
+
+def iter_stored_pages(db: Session, row: DocumentText) -> Iterator[tuple]:
+    dictionary = get_dictionary(db, row.dictionary_id) if row.dictionary_id else None
+    yield from split_pages(iter_decompressed(row.codec, row.content, dictionary))
+
+
+def iter_document_pages(db: Session, document_id: UUID, location: str) -> Iterator[tuple]:
+    """Yields (page_number, text) of a document, from its stored text when it is current.
+
+    Falls back to extracting the file (through the local extraction cache)
+    when there is no stored text or it came from an older extractor setup.
+    """
+    row = db.query(DocumentText).filter(DocumentText.document_id == document_id).first()
+    if row is not None and row.extractor in {extractor_signature(e) for e in registered_extractors()}:
+        yield from iter_stored_pages(db, row)
+        return
+    yield from iter_extracted_pages(location)
@@ -0,0 +1,151 @@
+import hashlib
+from collections import Counter
+from typing import Iterator, List, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session
+
+from tables import Document, DocumentChunk
+
+# Upper bound on the version chain walked when listing a document's history.
+MAX_VERSION_DEPTH = 1000
+
+UPLOAD_CONFLICT = "Another upload of the same file name finished first; upload it again to add a new version."
+
+
+def next_version(version) -> str:
+    """The version after ``version`` ("1.0" -> "2.0"); unparseable versions count as 1."""
+    try:
+        major = int(float(version))
+    except (TypeError, ValueError):
+        major = 1
+    return f"{major + 1}.0"
+
+
+def latest_versions(db: Session, folder_id: UUID, filenames, lock: bool = False) -> dict:
+    """The current document for each of ``filenames`` already in the folder, by file name.
+
+    With ``lock`` the rows stay locked until the transaction ends; they are
+    locked in file name order, so batches cannot deadlock.
+    """
+    filenames = list(filenames)
+    if not filenames:
+        return {}
+    query = (
+        db.query(Document)
+        .filter(Document.folder_id == folder_id, Document.filename.in_(filenames), Document.is_latest.is_(True))
+        .order_by(Document.filename)
+    )
+    if lock:
+        query = query.with_for_update()
+    return {document.filename: document for document in query}
+
+
+def lock_latest_versions(db: Session, folder_id: UUID, planned: dict):
+    """Locks the latest versions an upload planned against (``planned``, by file name) right before it writes.
+
+    Uploads plan without locks, since extraction, indexing and summaries take
+    long; if another upload of one of the names committed in between, this
+    one is refused with 409 instead of superseding a version that is no longer
+    the latest. (Two first uploads of a name are caught by the unique index.)
+    """
+    current = latest_versions(db, folder_id, planned, lock=True)
+    for filename, document in planned.items():
+        locked = current.get(filename)
+        if (document.id if document else None) != (locked.id if locked else None):
+            raise HTTPException(status_code=409, detail=UPLOAD_CONFLICT)
+
+
+def previous_chunks(db: Session, document_ids) -> dict:
+    """Chunk rows of the given documents, by document id."""
+    chunks = {document_id: [] for document_id in document_ids}
+    if chunks:
+        for chunk in db.query(DocumentChunk).filter(DocumentChunk.document_id.in_(list(chunks))):
+            chunks[chunk.document_id].append(chunk)
+    return chunks
+
+
+class ChunkPlan:
+    """Matches the chunks of a new upload against the previous version's, by content hash.
+
+    Chunks whose text the previous version already had (the same hash, and
+    the same occurrence among chunks with that hash) are marked ``reused``
+    and keep its Elasticsearch entry, so they are not embedded again. Only
+    new chunks are indexed, under new ids, while the upload is processed.
+    Pointing reused entries at the new version and deleting the entries it
+    dropped wait for the upload to commit (see ``services.outbox``), so a
+    failed upload leaves the previous version's entries as they were.
+    Inserting a page shifts chunk indexes but not hashes, so only the chunks
+    around the edit are new.
+    """
+
+    def __init__(self, document_id: UUID, previous: Optional[Document] = None, chunks: List[DocumentChunk] = ()):
+        self.document_id = document_id
+        self.previous_id = previous.id if previous is not None else None
+        self._previous = {(chunk.content_hash, chunk.occurrence): chunk.es_id for chunk in chunks}
+        self._seen = Counter()
+        self._rows = []
+        # Ids of new chunks that did reach the index; None until indexing finished.
+        self._failed_ids = None
+
+    def annotate(self, chunks) -> Iterator[dict]:
+        for chunk in chunks:
+            content_hash = hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+            occurrence = self._seen[content_hash]
+            self._seen[content_hash] += 1
+            es_id = self._previous.get((content_hash, occurrence))
+            chunk["reused"] = es_id is not None
+            chunk["es_id"] = es_id or f"{self.document_id}:{chunk['index']}"
+            self._rows.append({
+                "document_id": self.document_id,
+                "chunk_index": chunk["index"],
+                "page": chunk["page"],
+                "content_hash": content_hash,
+                "occurrence": occurrence,
+                "es_id": chunk["es_id"],
+                "reused": chunk["reused"],
+            })
+            yield chunk
+
+    def mark_indexed(self, errors):
+        """Records the outcome of indexing the new chunks (the bulk errors)."""
+        self._failed_ids = {result.get("_id") for error in errors for result in error.values()}
+
+    @property
+    def rows(self) -> List[dict]:
+        """document_chunks rows for the chunks that are in the index.
+
+        Reused chunks always are; new ones only if they were indexed, so a
+        chunk that failed is embedded again by the next upload.
+        """
+        return [
+            {column: value for column, value in row.items() if column != "reused"}
+            for row in self._rows
+            if row["reused"] or (self._failed_ids is not None and row["es_id"] not in self._failed_ids)
+        ]
+
+    def stats(self) -> dict:
+        reused = sum(row["reused"] for row in self._rows)
+        return {"chunks": len(self._rows), "reused": reused, "embedded": len(self._rows) - reused}
+
+
+def get_document_versions(db: Session, document_id: UUID, owner_id: UUID) -> List[Document]:
+    """A document and the versions before it, newest first, in one query."""
+    chain = (
+        select(Document.id, Document.previous_version_id, literal(0).label("depth"))
+        .where(Document.id == document_id, Document.owner_id == owner_id)
+        .cte("document_versions", recursive=True)
+    )
+    chain = chain.union_all(
+        select(Document.id, Document.previous_version_id, (chain.c.depth + 1).label("depth"))
+        .join(chain, Document.id == chain.c.previous_version_id)
+        .where(chain.c.depth < MAX_VERSION_DEPTH)
+    )
+    versions = db.execute(
+        select(Document).join(chain, Document.id == chain.c.id).order_by(chain.c.depth)
+    ).scalars().all()
+    if not versions:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return versions
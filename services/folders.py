@@ -1,4 +1,12 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy import select, literal, literal_column, insert, func, cast, null, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from concurrent.futures import ThreadPoolExecutor
+import time
+import zipfile
+from contextlib import contextmanager
+from settings import settings
 from fastapi import HTTPException, status, UploadFile, File
 from uuid import UUID
 from typing import List, Optional
@@ -6,6 +14,41 @@ from models.auth import UserRegistation
 from collections import defaultdict
 from tables import *
 from utils.folders import *
+from services.document_service import DocumentService, chunk_metadata
+from utils.summaries import SummaryScheduler, summarize_document
+from utils.metadata import extract_document_metadata, document_metadata_columns
+from services.query_router import answer_from_database
+from utils.cache import cache_key, file_sha256
+from utils.query_cache import SemanticQueryCache
+from utils.listing_cache import listing_cache
+from utils.storage import LimitedReader, SizeLimitExceeded, StoredFile, get_storage, local_path, storage_for
+from services.document_texts import PageRecorder, current_dictionary, iter_document_pages
+from services.document_versions import (
+    UPLOAD_CONFLICT,
+    ChunkPlan,
+    get_document_versions,
+    latest_versions,
+    lock_latest_versions,
+    next_version,
+    previous_chunks,
+)
+from services.outbox import CREATED, DELETED, UPDATED, record_events
+
+
+# Upper bound on tree depth walked by the recursive queries; also stops a
+# pre-existing parent cycle in the data from recursing forever.
+MAX_FOLDER_DEPTH = 64
+
+# Characters of each matching document included in the metadata prompt.
+PROMPT_TEXT_LIMIT = 10000
+
+document_service = DocumentService()
+query_cache = SemanticQueryCache(
+    embed=document_service.generate_embedding,
+    max_entries=settings.query_cache_max_entries,
+    threshold=settings.query_cache_similarity,
+    fallback_threshold=settings.query_cache_fallback_similarity,
+)
 
 
 class FoldersService:
@@ -24,6 +67,7 @@ class FoldersService:
         self.db.add(folder)
         self.db.commit()
         self.db.refresh(folder)
+        listing_cache.invalidate(owner_id)
         return folder
 
     def update_folder(self, folder_id: UUID, name: Optional[str], parent_id: Optional[UUID], tags: Optional[str]):
@@ -34,18 +78,106 @@ class FoldersService:
         
         if name:
             folder.name = name
-        if parent_id:
-            folder.parent_id = parent_id
+        if parent_id and parent_id != folder.parent_id:
+            self._reparent(folder, parent_id)
         if tags:
             folder.tags = tags
 
         self.db.commit()
         self.db.refresh(folder)
+        listing_cache.invalidate(folder.owner_id)
         return folder
 
-    def get_folder(self, folder_id: UUID):
-        """Retrieve a folder by its ID from the database."""
-        folder = self.db.query(Folder).filter(Folder.id == folder_id).first()
+    def _reparent(self, folder: Folder, parent_id: UUID):
+        """Moves a folder under a new parent, refusing moves that would create a cycle."""
+        if parent_id in self.get_subtree_ids(folder.id, folder.owner_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A folder cannot be moved into itself or one of its subfolders.",
+            )
+
+        new_parent = (
+            self.db.query(Folder)
+            .filter(Folder.id == parent_id, Folder.owner_id == folder.owner_id)
+            .first()
+        )
+        if not new_parent:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent folder not found")
+
+        if folder.parent:
+            folder.parent.folder_count = max((folder.parent.folder_count or 0) - 1, 0)
+        new_parent.folder_count = (new_parent.folder_count or 0) + 1
+        folder.parent_id = parent_id
+
+    def _subtree_cte(self, folder_id: UUID, owner_id: UUID):
+        """Recursive CTE yielding (id, parent_id, depth) for a folder and all its descendants."""
+        tree = (
+            select(Folder.id, Folder.parent_id, literal(0).label("depth"))
+            .where(Folder.id == folder_id, Folder.owner_id == owner_id)
+            .cte("folder_subtree", recursive=True)
+        )
+        return tree.union_all(
+            select(Folder.id, Folder.parent_id, (tree.c.depth + 1).label("depth"))
+            .join(tree, Folder.parent_id == tree.c.id)
+            .where(Folder.owner_id == owner_id, tree.c.depth < MAX_FOLDER_DEPTH)
+        )
+
+    def get_subtree_ids(self, folder_id: UUID, owner_id: UUID) -> List[UUID]:
+        """Returns the ids of a folder and all of its descendants in one query."""
+        tree = self._subtree_cte(folder_id, owner_id)
+        return list(dict.fromkeys(self.db.execute(select(tree.c.id)).scalars()))
+
+    def get_subtree(self, folder_id: UUID, owner_id: UUID) -> dict:
+        """Loads a folder's whole subtree in one round-trip and nests it."""
+        tree = self._subtree_cte(folder_id, owner_id)
+        rows = self.db.execute(
+            select(Folder).join(tree, Folder.id == tree.c.id).order_by(tree.c.depth, Folder.name)
+        ).scalars().all()
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found")
+
+        nodes = {
+            folder.id: {
+                "id": folder.id,
+                "name": folder.name,
+                "parent_id": folder.parent_id,
+                "tags": folder.tags,
+                "created_at": folder.created_at,
+                "updated_at": folder.updated_at,
+                "children": [],
+            }
+            for folder in rows
+        }
+        for folder in rows:
+            if folder.id != folder_id and folder.parent_id in nodes:
+                nodes[folder.parent_id]["children"].append(nodes[folder.id])
+        return nodes[folder_id]
+
+    def get_ancestors(self, folder_id: UUID, owner_id: UUID) -> List[Folder]:
+        """Returns the breadcrumb of a folder, root first, in one query."""
+        chain = (
+            select(Folder.id, Folder.parent_id, literal(0).label("depth"))
+            .where(Folder.id == folder_id, Folder.owner_id == owner_id)
+            .cte("folder_ancestors", recursive=True)
+        )
+        chain = chain.union_all(
+            select(Folder.id, Folder.parent_id, (chain.c.depth + 1).label("depth"))
+            .join(chain, Folder.id == chain.c.parent_id)
+            .where(chain.c.depth < MAX_FOLDER_DEPTH)
+        )
+        rows = self.db.execute(
+            select(Folder).join(chain, Folder.id == chain.c.id).order_by(chain.c.depth.desc())
+        ).scalars().all()
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found")
+        return rows
+
+    def get_folder(self, folder_id: UUID, owner_id: UUID = None):
+        """Retrieve a folder by its ID from the database, optionally only if owned by ``owner_id``."""
+        query = self.db.query(Folder).filter(Folder.id == folder_id)
+        if owner_id:
+            query = query.filter(Folder.owner_id == owner_id)
+        folder = query.first()
         if not folder:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found")
         return folder
@@ -56,81 +188,428 @@ class FoldersService:
         return query.offset(skip).limit(limit).all()
 
 
-def upload_file_to_folder(folder_id: UUID, file: UploadFile, db: Session, current_user):
-    """Uploads a file to a specific subfolder by UUID and generates a summary, updating file count."""
-    
-    BASE_UPLOAD_DIR = "uploads"
+def save_upload(source, folder_id: UUID, document_id: UUID, filename: str,
+                max_bytes: int = settings.max_upload_file_bytes) -> StoredFile:
+    """Streams an uploaded file (or archive member) to storage without reading it into memory.
+
+    Every document gets its own key, so a new version never overwrites the
+    file of the one before. The returned location is what documents keep as
+    storage_path; the SHA-256 of the contents is hashed on the way through.
+    Copying stops with SizeLimitExceeded, leaving nothing stored, once more
+    than ``max_bytes`` were read.
+    """
+    return get_storage().put(LimitedReader(source, max_bytes), f"{folder_id}/{document_id}/{os.path.basename(filename)}")
+
+
+def index_and_read_head(file_path: str, filename: str, document_id: UUID, folder_id: UUID, owner_id: UUID,
+                        recorder: PageRecorder = None, plan: ChunkPlan = None) -> str:
+    """Streams a stored file's pages -> chunks -> Elasticsearch.
+
+    Only the head of the document is kept in memory and returned, for the
+    summary; a ``recorder`` also gets every page, compressed, for storing.
+    With a ``plan`` only the chunks the previous version did not have are
+    embedded; the rest of the index update waits for the upload to commit.
+    Extraction failures are logged and yield whatever text was read so far.
+    """
+    head = []
+    pages = iter_extracted_pages(file_path)
+    if recorder is not None:
+        pages = recorder.record(pages)
+
+    def chunks_with_head():
+        head_length = 0
+        for chunk in iter_chunks(pages):
+            if head_length < SUMMARY_INPUT_CHARS:
+                head.append(chunk["text"])
+                head_length += len(chunk["text"])
+            yield chunk
+
+    chunks = chunks_with_head()
+    if plan is not None:
+        chunks = plan.annotate(chunks)
+    try:
+        try:
+            _, errors = document_service.index_chunks(
+                str(document_id), chunks, chunk_metadata(filename, folder_id, owner_id),
+            )
+            if plan is not None:
+                plan.mark_indexed(errors)
+        except ExtractionError:
+            raise
+        except Exception as e:
+            # Indexing is best-effort; drain the stream so the summary still sees the text.
+            print(f"Error indexing file {file_path}: {e}")
+            for _ in chunks:
+                pass
+    except ExtractionError as e:
+        print(f"Error processing file {file_path}: {e}")
+    return "\n".join(head)
+
+
+def get_upload_folder(folder_id: UUID, db: Session, current_user) -> Folder:
+    """Loads the target folder of an upload and checks the caller owns it."""
     folder = db.query(Folder).filter(Folder.id == folder_id).first()
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found.")
 
     if folder.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Permission denied.")
+    return folder
+
+
+def supersede_versions(db: Session, folder_id: UUID, filenames):
+    """Marks the current documents with these file names in the folder as no longer the latest."""
+    db.query(Document).filter(
+        Document.folder_id == folder_id, Document.filename.in_(list(filenames)), Document.is_latest.is_(True),
+    ).update({Document.is_latest: False, Document.updated_at: Document.updated_at}, synchronize_session=False)
+
+
+@contextmanager
+def upload_transaction(db: Session, document_ids: List[UUID], locations: List[str]):
+    """Commits the upload's writes made in the block, undoing what it wrote outside the transaction on failure.
+
+    New chunks were indexed under the new documents' ids and files were
+    stored; the previous versions' index entries were not touched yet. A
+    concurrent upload of the same file name that became the latest version
+    first shows up as a unique violation and is reported as a conflict, like
+    the one lock_latest_versions raises.
+    """
+    try:
+        yield
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        try:
+            document_service.es_client.delete_by_documents([str(document_id) for document_id in document_ids])
+        except Exception as cleanup_error:
+            print(f"Error removing indexed chunks of a failed upload: {cleanup_error}")
+        for location in locations:
+            try:
+                storage_for(location).delete(location)
+            except Exception as cleanup_error:
+                print(f"Error deleting stored file {location}: {cleanup_error}")
+        if isinstance(e, IntegrityError):
+            raise HTTPException(status_code=409, detail=UPLOAD_CONFLICT) from e
+        raise
 
-    # Ensure the folder exists
-    folder_path = os.path.join(BASE_UPLOAD_DIR, str(folder_id))
-    os.makedirs(folder_path, exist_ok=True)
 
-    # Save file to folder
-    file_path = os.path.join(folder_path, file.filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
+def upload_file_to_folder(folder_id: UUID, file: UploadFile, db: Session, current_user):
+    """Uploads a file to a specific subfolder by UUID and generates a summary, updating file count.
 
-    # print("File saved to:", file_path)
+    Uploading a file name that is already in the folder adds a new version of
+    that document; identical contents are not stored again.
+    """
+    
+    folder = get_upload_folder(folder_id, db, current_user)
+
+    # Save file to storage
+    document_id = uuid.uuid4()
+    try:
+        stored = save_upload(file.file, folder_id, document_id, file.filename)
+    except SizeLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    file_path = stored.location
+
+    previous = latest_versions(db, folder_id, [file.filename]).get(file.filename)
+    if previous is not None and previous.checksum == stored.checksum:
+        storage_for(file_path).delete(file_path)
+        return {
+            "message": "File unchanged",
+            "file_path": previous.storage_path,
+            "file_count": folder.file_count,
+            "document_id": previous.id,
+            "version": previous.version,
+        }
 
-    # Extract text from PDF or other file formats
-    extracted_text = ""
-    if file.filename.endswith(".pdf"):
-        extracted_text = extract_text_from_pdf(file_path)
-    elif file.filename.endswith(".doc"):
-        extracted_text = extract_text_from_doc(file_path)
-    else:
-        encoding = detect_encoding(file_path)
-        with open(file_path, "r", encoding=encoding, errors="replace") as f:
-            extracted_text = f.read()
-            
-    # print("Extracted Text:", extracted_text)
+    plan = ChunkPlan(document_id, previous, previous_chunks(db, [previous.id])[previous.id] if previous else ())
+    recorder = PageRecorder(current_dictionary(db))
+    extracted_text = index_and_read_head(file_path, file.filename, document_id, folder_id, current_user.id, recorder, plan)
 
     # Generate Summary & Description
-    summary = summarize_text(extracted_text) if extracted_text else "No summary available."
+    summary = summarize_document(extracted_text, file_path) if extracted_text else "No summary available."
     description = f"Document '{file.filename}' uploaded on {datetime.utcnow()}."
-
-    # Add file metadata to DB
-    new_file = Files(
-        name=file.filename,
-        path=file_path,
-        folder_id=folder_id,
-        owner_id=current_user.id
-    )
-    db.add(new_file)
-
-    new_document = Document(
-        filename=file.filename,
-        storage_path=file_path,
-        file_type=file.filename.split('.')[-1],
-        folder_id=folder_id,
-        owner_id=current_user.id,
-        description=description,
-        summary=summary,
-        file_size=os.path.getsize(file_path),
-        version=1.0
-    )
-    
-    db.add(new_document)
+    metadata = document_metadata_columns(extract_document_metadata(extracted_text)) if extracted_text else {}
+
+    with upload_transaction(db, [document_id], [file_path]):
+        lock_latest_versions(db, folder_id, {file.filename: previous})
+        # Add file metadata to DB; a new version takes over the file entry of the previous one.
+        if previous is None:
+            new_file = Files(
+                name=file.filename,
+                path=file_path,
+                folder_id=folder_id,
+                owner_id=current_user.id
+            )
+            db.add(new_file)
+        else:
+            db.query(Files).filter(Files.folder_id == folder_id, Files.path == previous.storage_path).update(
+                {Files.path: file_path}, synchronize_session=False,
+            )
+            supersede_versions(db, folder_id, [file.filename])
+
+        new_document = Document(
+            id=document_id,
+            filename=file.filename,
+            storage_path=file_path,
+            file_type=file.filename.split('.')[-1],
+            folder_id=folder_id,
+            owner_id=current_user.id,
+            description=description,
+            summary=summary,
+            file_size=stored.size,
+            checksum=stored.checksum,
+            version=next_version(previous.version) if previous else "1.0",
+            previous_version_id=previous.id if previous else None,
+            **metadata
+        )
     
-    # Update folder's file count
-    folder.file_count = db.query(Files).filter(Files.folder_id == folder_id).count()
-    db.commit()
+        db.add(new_document)
+        db.flush()
+        text_row = recorder.row(document_id, file_path)
+        if text_row:
+            db.execute(insert(DocumentText), [text_row])
+        if plan.rows:
+            db.execute(insert(DocumentChunk), plan.rows)
+        record_events(db, CREATED, [document_id])
+        if previous is not None:
+            record_events(db, UPDATED, [previous.id])
+
+        # Update folder's file count
+        folder.file_count = db.query(Files).filter(Files.folder_id == folder_id).count()
     db.refresh(folder)
     db.refresh(new_document)
+    listing_cache.invalidate(current_user.id)
 
     return {
         "message": "File uploaded successfully",
         "file_path": file_path,
-        "file_count": folder.file_count
+        "file_count": folder.file_count,
+        "document_id": document_id,
+        "version": new_document.version,
+        "chunks": plan.stats(),
     }
-    
-    
+
+
+def _save_batch(files: List[UploadFile], folder_id: UUID, statuses: List[dict]) -> List[dict]:
+    """Saves every part of a batch upload to storage, expanding zip archives.
+
+    Returns the saved entries; parts that could not be saved get a failed status.
+    Files over the per-file size limit, or over what is left of the batch's,
+    are skipped: by their declared size up front (a zip member's header) and
+    by the bytes actually copied, so a zip bomb is cut off while expanding.
+    """
+    saved, names = [], set()
+    batch_bytes = 0
+
+    def add(source, filename, declared_size=None):
+        nonlocal batch_bytes
+        filename = os.path.basename(filename)
+        if len(saved) >= settings.max_batch_files:
+            statuses.append({"filename": filename, "status": "skipped", "error": "Batch file limit reached."})
+            return
+        if filename in names:
+            statuses.append({"filename": filename, "status": "skipped", "error": "Duplicate file name in batch."})
+            return
+        batch_left = settings.max_batch_upload_bytes - batch_bytes
+        max_bytes = min(settings.max_upload_file_bytes, batch_left)
+        too_large = {
+            "filename": filename, "status": "skipped",
+            "error": "Batch size limit reached." if batch_left < settings.max_upload_file_bytes
+            else f"File is larger than {settings.max_upload_file_bytes} bytes.",
+        }
+        if declared_size is not None and declared_size > max_bytes:
+            statuses.append(too_large)
+            return
+        document_id = uuid.uuid4()
+        try:
+            stored = save_upload(source, folder_id, document_id, filename, max_bytes)
+        except SizeLimitExceeded:
+            statuses.append(too_large)
+            return
+        batch_bytes += stored.size
+        entry = {
+            "filename": filename, "document_id": document_id, "file_path": stored.location,
+            "stored": stored, "status": "uploaded",
+        }
+        names.add(filename)
+        saved.append(entry)
+        statuses.append(entry)
+
+    for file in files:
+        try:
+            if file.filename.lower().endswith(".zip"):
+                with zipfile.ZipFile(file.file) as archive:
+                    for member in archive.infolist():
+                        # Only the base name is kept, so members cannot escape the folder.
+                        name = os.path.basename(member.filename)
+                        if member.is_dir() or not name or name.startswith("."):
+                            continue
+                        with archive.open(member) as source:
+                            add(source, name, member.file_size)
+            else:
+                add(file.file, file.filename, file.size)
+        except (OSError, zipfile.BadZipFile) as e:
+            statuses.append({"filename": file.filename, "status": "failed", "error": str(e)})
+    return saved
+
+
+def upload_files_to_folder(folder_id: UUID, files: List[UploadFile], db: Session, current_user):
+    """Uploads many files (or zip archives of files) to a folder in one request.
+
+    Parts are streamed to storage, then extracted, indexed and summarised by a
+    bounded worker pool. All rows are written with one bulk insert per table
+    and one folder aggregate update, in a single transaction. File names
+    already in the folder become new versions, re-indexing only the chunks
+    that changed; identical files are reported unchanged. Files whose text
+    or metadata could not be extracted are still stored, with the status
+    "uploaded_with_errors" and the error.
+    """
+    folder = get_upload_folder(folder_id, db, current_user)
+
+    statuses = []
+    saved = _save_batch(files, folder_id, statuses)
+
+    previous = latest_versions(db, folder_id, [entry["filename"] for entry in saved])
+    for entry in list(saved):
+        document = previous.get(entry["filename"])
+        if document is not None and document.checksum == entry["stored"].checksum:
+            storage_for(entry["file_path"]).delete(entry["file_path"])
+            entry.update(status="unchanged", document_id=document.id, version=document.version)
+            entry.pop("stored")
+            entry.pop("file_path")
+            saved.remove(entry)
+    chunks = previous_chunks(db, [previous[entry["filename"]].id for entry in saved if entry["filename"] in previous])
+    plans = {
+        entry["document_id"]: ChunkPlan(
+            entry["document_id"],
+            previous.get(entry["filename"]),
+            chunks.get(previous[entry["filename"]].id, ()) if entry["filename"] in previous else (),
+        )
+        for entry in saved
+    }
+
+    dictionary = current_dictionary(db)
+    text_rows = []
+
+    def process(entry):
+        document_id = entry["document_id"]
+        extracted_text, metadata = "", {}
+        recorder = PageRecorder(dictionary)
+        try:
+            extracted_text = index_and_read_head(
+                entry["file_path"], entry["filename"], document_id, folder_id, current_user.id, recorder,
+                plans[document_id],
+            )
+            if extracted_text:
+                metadata = document_metadata_columns(extract_document_metadata(extracted_text))
+            text_row = recorder.row(document_id, entry["file_path"])
+            if text_row:
+                text_rows.append(text_row)
+        except Exception as e:
+            # One bad file must not fail the whole batch; it is stored without a summary.
+            entry.update(status="uploaded_with_errors", error=str(e))
+        return document_id, extracted_text, metadata
+
+    with ThreadPoolExecutor(max_workers=settings.upload_workers) as pool:
+        extracted = list(pool.map(process, saved))
+
+    # Short letters are packed several per Gemini call.
+    scheduler = SummaryScheduler()
+    for entry, (document_id, extracted_text, _) in zip(saved, extracted):
+        if extracted_text:
+            scheduler.add(document_id, extracted_text, entry["file_path"])
+    try:
+        summaries = scheduler.run()
+    except Exception as e:
+        print(f"Error summarising batch for folder {folder_id}: {e}")
+        summaries = {}
+    results = [
+        (document_id, summaries.get(document_id, "No summary available."), metadata)
+        for document_id, _, metadata in extracted
+    ]
+
+    now = datetime.utcnow()
+    file_rows, moved_files, document_rows, chunk_rows, total_size = [], [], [], [], 0
+    for entry, (document_id, summary, metadata) in zip(saved, results):
+        stored = entry.pop("stored")
+        older = previous.get(entry["filename"])
+        total_size += stored.size - ((older.file_size or 0) if older else 0)
+        if older is None:
+            file_rows.append({
+                "name": entry["filename"],
+                "path": entry["file_path"],
+                "folder_id": folder_id,
+                "owner_id": current_user.id,
+            })
+        else:
+            moved_files.append((older.storage_path, entry["file_path"]))
+        entry["version"] = next_version(older.version) if older else "1.0"
+        document_rows.append({
+            "id": document_id,
+            "filename": entry["filename"],
+            "storage_path": entry["file_path"],
+            "file_type": entry["filename"].split('.')[-1],
+            "folder_id": folder_id,
+            "owner_id": current_user.id,
+            "description": f"Document '{entry['filename']}' uploaded on {now}.",
+            "summary": summary,
+            "file_size": stored.size,
+            "checksum": stored.checksum,
+            "version": entry["version"],
+            "previous_version_id": older.id if older else None,
+            "is_latest": True,
+            "document_date": None,
+            "sender": None,
+            "receiver": None,
+            "project_name": None,
+            # SQL NULL ("not extracted yet"); a plain None would be stored as JSON null.
+            "extracted_metadata": null(),
+            **metadata,
+        })
+        chunk_rows.extend(plans[document_id].rows)
+        entry["chunks"] = plans[document_id].stats()
+        entry.pop("file_path")
+
+    if saved:
+        locations = [row["storage_path"] for row in document_rows]
+        with upload_transaction(db, [row["id"] for row in document_rows], locations):
+            lock_latest_versions(db, folder_id, {entry["filename"]: previous.get(entry["filename"]) for entry in saved})
+            # A new version takes over the file entry of the previous one.
+            for old_path, new_path in moved_files:
+                db.query(Files).filter(Files.folder_id == folder_id, Files.path == old_path).update(
+                    {Files.path: new_path}, synchronize_session=False,
+                )
+            versioned = [entry["filename"] for entry in saved if entry["filename"] in previous]
+            if versioned:
+                supersede_versions(db, folder_id, versioned)
+            if file_rows:
+                db.execute(insert(Files), file_rows)
+            db.execute(insert(Document), document_rows)
+            if text_rows:
+                db.execute(insert(DocumentText), text_rows)
+            if chunk_rows:
+                db.execute(insert(DocumentChunk), chunk_rows)
+            record_events(db, CREATED, [row["id"] for row in document_rows])
+            record_events(db, UPDATED, [previous[name].id for name in versioned])
+            db.query(Folder).filter(Folder.id == folder_id).update(
+                {
+                    Folder.file_count: func.coalesce(Folder.file_count, 0) + len(file_rows),
+                    Folder.size: func.coalesce(Folder.size, 0) + total_size,
+                },
+                synchronize_session=False,
+            )
+        db.refresh(folder)
+        listing_cache.invalidate(current_user.id)
+
+    with_errors = sum(entry["status"] == "uploaded_with_errors" for entry in saved)
+    return {
+        "message": f"{len(saved)} of {len(statuses)} files uploaded"
+        + (f", {with_errors} of them with extraction errors" if with_errors else ""),
+        "file_count": folder.file_count,
+        "files": statuses,
+    }
+
+
 def get_files_in_folder_service(folder_id: UUID, db: Session, current_user):
     """Fetches a list of files inside a folder given the folder_id."""
 
@@ -144,7 +623,12 @@ def get_files_in_folder_service(folder_id: UUID, db: Session, current_user):
         raise HTTPException(status_code=403, detail="Permission denied.")
 
     # Fetch all files inside the folder
-    files = db.query(Document).filter(Document.folder_id == folder_id).all()
+    files = (
+        db.query(Document)
+        .options(undefer(Document.summary))
+        .filter(Document.folder_id == folder_id, Document.is_latest.is_(True))
+        .all()
+    )
 
     if not files:
         raise HTTPException(status_code=404, detail="No files found in the folder.")
@@ -156,87 +640,122 @@ def get_files_in_folder_service(folder_id: UUID, db: Session, current_user):
             "file_type": file.file_type,
             "size": file.file_size,
             "uploaded_at": file.created_at,
-            "summary": file.summary
+            "summary": file.summary,
+            "document_date": file.document_date,
+            "sender": file.sender,
+            "receiver": file.receiver,
+            "project_name": file.project_name,
         }
         for file in files
     ]
 
 
+def get_document_for_download(document_id: UUID, db: Session, current_user) -> Document:
+    """Loads a document the caller owns and whose file is on disk, filling in a missing checksum."""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
 
-def get_project_metadata(query: str, db: Session):
-    """Dynamically searches for documents related to the query across all folders."""
-
-    # Extract query keywords
-    query_keywords = extract_keywords(query)
-
-    # Fetch all folders
-    folders = db.query(Folder).all()
-
-    if not folders:
-        raise HTTPException(status_code=404, detail="No folders found")
-
-    # Initialize result containers
-    total_documents = 0
-    folder_document_count = defaultdict(int)
-    project_documents = defaultdict(list)
-    extracted_text = ""
-    matched_folder_name = False
-    query_lower = query.lower()  # Convert query to lowercase
-
-    for folder in folders:
-        folder_name_lower = folder.name.lower()  # Convert folder name to lowercase
+    if document.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Permission denied.")
 
-        # Match if query contains folder name directly OR any keyword matches
-        if folder_name_lower in query_lower or any(keyword.lower() in folder_name_lower for keyword in query_keywords):
-            matched_folder_name = True
+    if not storage_for(document.storage_path).exists(document.storage_path):
+        raise HTTPException(status_code=404, detail="Stored file not found.")
+
+    # Documents uploaded before checksums were recorded get one on first download.
+    # updated_at is kept as is: the contents did not change, so cached answers stay valid.
+    if not document.checksum:
+        with local_path(document.storage_path) as file_path:
+            checksum = file_sha256(file_path)
+        db.query(Document).filter(Document.id == document.id).update(
+            {Document.checksum: checksum, Document.updated_at: Document.updated_at},
+            synchronize_session=False,
+        )
+        db.commit()
+        db.refresh(document)
+    return document
 
 
-        documents = db.query(Document).filter(Document.folder_id == folder.id).all()
 
-        if not documents:
-            continue
+def delete_document(document_id: UUID, db: Session, current_user) -> List[UUID]:
+    """Deletes a document together with its earlier versions and their stored files.
 
-        for document in documents:
-            text = ""
+    The search indexes drop it through the outbox once the deletion commits.
+    Returns the ids of the deleted versions.
+    """
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
 
-            # Handle different file types
-            file_path = document.storage_path
-            file_ext = os.path.splitext(file_path)[1].lower()
+    if document.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Permission denied.")
 
-            try:
-                if file_ext == ".pdf":
-                    text = extract_text_from_pdf(file_path)
-                elif file_ext == ".doc":
-                    text = extract_text_from_doc(file_path)
-                else:
-                    encoding = detect_encoding(file_path)
-                    with open(file_path, "r", encoding=encoding, errors="replace") as f:
-                        text = f.read()
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
-                continue  # Skip the file if there's an error
-
-            if not text.strip():
-                continue
-
-            # Extract keywords and check relevance
-            doc_keywords = extract_keywords(text)
-            if query_keywords & doc_keywords or matched_folder_name:
-                project_documents[folder.name].append((document.filename, text[:500]))  # Store preview of text
-                folder_document_count[folder.name] += 1
-                total_documents += 1
-                extracted_text += text + "\n"
-    # print("query_keyword :", query_keywords)
-    # print("doc_keyword :", doc_keywords)
-    print("Matched_folder_name : ",matched_folder_name)
-    print(f"Query Keywords: {query_keywords}")
-    print(f"Document Keywords: {doc_keywords}")
+    if not document.is_latest:
+        raise HTTPException(status_code=409, detail="Only the latest version of a document can be deleted.")
 
-    # print("Extracted_text : ", extracted_text)
-    print("Total Document : ", total_documents)
-    if total_documents == 0:
-        return {"message": f"No relevant documents found for query: {query}"}
+    versions = get_document_versions(db, document.id, current_user.id)
+    version_ids = [version.id for version in versions]
+    locations = [version.storage_path for version in versions]
 
+    db.query(Files).filter(Files.folder_id == document.folder_id, Files.path == document.storage_path).delete(
+        synchronize_session=False,
+    )
+    # One statement, so versions pointing at each other are removed together.
+    db.query(Document).filter(Document.id.in_(version_ids)).delete(synchronize_session=False)
+    db.query(Folder).filter(Folder.id == document.folder_id).update(
+        {
+            Folder.file_count: func.greatest(func.coalesce(Folder.file_count, 0) - 1, 0),
+            Folder.size: func.greatest(func.coalesce(Folder.size, 0) - (document.file_size or 0), 0),
+        },
+        synchronize_session=False,
+    )
+    record_events(db, DELETED, version_ids)
+    db.commit()
+    listing_cache.invalidate(current_user.id)
+
+    for location in locations:
+        try:
+            storage_for(location).delete(location)
+        except Exception as e:
+            print(f"Error deleting stored file {location}: {e}")
+    return version_ids
+
+
+def scoped_documents_query(db: Session, owner_id: UUID, folder_id: Optional[UUID] = None):
+    """(Document, folder name) rows of the caller's documents, optionally inside one folder subtree."""
+    documents_query = (
+        db.query(Document, Folder.name)
+        .join(Folder, Document.folder_id == Folder.id)
+        .filter(Document.owner_id == owner_id, Document.is_latest.is_(True))
+    )
+    if folder_id:
+        folder_ids = FoldersService(db).get_subtree_ids(folder_id, owner_id)
+        if not folder_ids:
+            raise HTTPException(status_code=404, detail="Folder not found")
+        documents_query = documents_query.filter(Document.folder_id.in_(folder_ids))
+    return documents_query
+
+
+def corpus_version(documents_query) -> str:
+    """Fingerprint of the documents behind a scoped query; changes when any of them is added,
+    removed, moved or updated, or their folders change."""
+    count, latest_document, latest_folder, ids_hash = documents_query.with_entities(
+        func.count(Document.id),
+        func.max(Document.updated_at),
+        func.max(Folder.updated_at),
+        func.md5(func.string_agg(cast(Document.id, Text), aggregate_order_by(literal_column("','"), Document.id))),
+    ).one()
+    return cache_key(count, latest_document, latest_folder, ids_hash)
+
+
+def build_metadata_prompt(
+    query: str,
+    matched_folder_name: bool,
+    extracted_text: str,
+    total_documents: int,
+    folder_names: List[str],
+) -> str:
+    """Assembles the Gemini prompt for get_project_metadata from the relevant documents' text."""
     # Determine response format **ONLY IF FOLDER NAME MATCHES QUERY**
     if matched_folder_name:
         prompt = f"""
@@ -251,7 +770,7 @@ def get_project_metadata(query: str, db: Session):
         - Dates of the letters (if applicable)
 
         Document Content:
-        {extracted_text[:10000]}  # Limiting to first 10000 chars for efficiency
+        {extracted_text[:PROMPT_TEXT_LIMIT]}  # Limiting to first 10000 chars for efficiency
 
         Provide the response in this structured format:
 
@@ -278,10 +797,115 @@ def get_project_metadata(query: str, db: Session):
         Provide the response in this structured format:
 
         Total Letters: {total_documents}
-        Folder Name: {folder.name}
+        Folder Name: {", ".join(folder_names)}
         Letters:
         - [Letter 1 Summary, Date, Sender, Receiver]
         - [Letter 2 Summary, Date, Sender, Receiver]
         """
 
-    return call_gemini(prompt)
+    return prompt
+
+
+def get_project_metadata(
+    query: str,
+    db: Session,
+    owner_id: UUID,
+    folder_id: Optional[UUID] = None,
+    file_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    tags: Optional[str] = None,
+):
+    """Searches the caller's documents related to the query, optionally scoped to a folder subtree.
+
+    Count and list questions are answered from the document metadata columns;
+    only open-ended questions go through retrieval and Gemini.
+    """
+
+    documents_query = scoped_documents_query(db, owner_id, folder_id)
+    if file_type:
+        documents_query = documents_query.filter(Document.file_type == file_type.lower().lstrip("."))
+    if date_from:
+        documents_query = documents_query.filter(Document.created_at >= date_from)
+    if date_to:
+        documents_query = documents_query.filter(Document.created_at <= date_to)
+    if tags:
+        for tag in (t.strip() for t in tags.split(",")):
+            if tag:
+                documents_query = documents_query.filter(Document.tags.ilike(f"%{tag}%"))
+
+    routed = answer_from_database(query, documents_query)
+    if routed is not None:
+        return routed
+
+    started = time.perf_counter()
+    scope = cache_key(owner_id, folder_id, file_type, date_from, date_to, tags)
+    cached, probe = query_cache.lookup(scope, corpus_version(documents_query), query)
+    if cached is not None:
+        return cached
+
+    # Extract query keywords
+    query_keywords = extract_keywords(query)
+
+    documents = documents_query.order_by(Folder.name, Document.created_at).all()
+
+    if not documents:
+        return {"message": f"No relevant documents found for query: {query}"}
+
+    # Initialize result containers
+    total_documents = 0
+    folder_document_count = defaultdict(int)
+    project_documents = defaultdict(list)
+    extracted_text = ""
+    matched_folders = set()
+    query_lower = query.lower()  # Convert query to lowercase
+
+    for folder_name in {name for _, name in documents}:
+        folder_name_lower = folder_name.lower()  # Convert folder name to lowercase
+
+        # Match if query contains folder name directly OR any keyword matches
+        if folder_name_lower in query_lower or any(keyword.lower() in folder_name_lower for keyword in query_keywords):
+            matched_folders.add(folder_name)
+    matched_folder_name = bool(matched_folders)
+
+    for document, folder_name in documents:
+        file_path = document.storage_path
+        doc_text = []
+
+        def chunk_texts():
+            # Keyword extraction sees every chunk; only the head is kept for the prompt.
+            doc_length = 0
+            for chunk in iter_chunks(iter_document_pages(db, document.id, file_path)):
+                if doc_length < PROMPT_TEXT_LIMIT:
+                    doc_text.append(chunk["text"])
+                    doc_length += len(chunk["text"])
+                yield chunk["text"]
+
+        try:
+            doc_keywords = extract_keywords_stream(chunk_texts())
+        except Exception as e:
+            print(f"Error processing file {file_path}: {e}")
+            continue  # Skip the file if there's an error
+
+        text = "\n".join(doc_text)
+        if not text.strip():
+            continue
+
+        # Check relevance
+        if query_keywords & doc_keywords or matched_folder_name:
+            project_documents[folder_name].append((document.filename, text[:500]))  # Store preview of text
+            folder_document_count[folder_name] += 1
+            total_documents += 1
+            extracted_text += text + "\n"
+
+    print("Matched_folder_name : ",matched_folder_name)
+    print(f"Query Keywords: {query_keywords}")
+
+    print("Total Document : ", total_documents)
+    if total_documents == 0:
+        return {"message": f"No relevant documents found for query: {query}"}
+
+    prompt = build_metadata_prompt(query, matched_folder_name, extracted_text, total_documents, list(project_documents))
+    answer = call_gemini(prompt)
+    query_cache.store(probe, answer, time.perf_counter() - started)
+    return answer
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session as DbSession, undefer
+
+from core.elasticsearch_client import es_client
+from database import Session
+from services.document_service import chunk_metadata
+from services.document_versions import previous_chunks
+from settings import settings
+from tables import Document, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+def record_events(db: DbSession, event_type: str, document_ids):
+    """Adds outbox events for changed documents to the caller's transaction.
+
+    They are applied to the search indexes only if (and once) it commits.
+    """
+    rows = [{"aggregate_id": document_id, "event_type": event_type} for document_id in document_ids]
+    if rows:
+        db.execute(insert(OutboxEvent), rows)
+
+
+def document_source(document: Document) -> dict:
+    return {
+        "document_id": str(document.id),
+        "folder_id": str(document.folder_id),
+        "owner_id": str(document.owner_id),
+        "filename": document.filename,
+        "file_type": document.file_type,
+        "summary": document.summary,
+        "sender": document.sender,
+        "receiver": document.receiver,
+        "project_name": document.project_name,
+        "document_date": document.document_date.isoformat() if document.document_date else None,
+        "version": document.version,
+        "is_latest": document.is_latest,
+        "created_at": document.created_at.isoformat() if document.created_at else None,
+        "updated_at": document.updated_at.isoformat() if document.updated_at else None,
+    }
+
+
+def chunk_changes(db: DbSession, documents: list) -> tuple:
+    """The chunk index changes that committed new versions make to their previous version's entries.
+
+    Entries a version reused are pointed at it (only while it is the latest;
+    a newer version points them at itself) and the previous version's other
+    entries are deleted. Returns (bulk actions by document id, {previous
+    version without chunk rows: document id}; those are deleted by query).
+    """
+    versions = [document for document in documents if document.previous_version_id]
+    if not versions:
+        return {}, {}
+    rows = previous_chunks(db, [v.id for v in versions] + [v.previous_version_id for v in versions])
+    actions, legacy = {}, {}
+    for version in versions:
+        own, earlier = rows[version.id], rows[version.previous_version_id]
+        if not earlier:
+            # Indexed before chunks were recorded, so nothing of it was reused.
+            legacy[version.previous_version_id] = version.id
+            continue
+        kept = {row.es_id for row in own}
+        changes = []
+        if version.is_latest:
+            metadata = chunk_metadata(version.filename, version.folder_id, version.owner_id)
+            changes += [
+                {
+                    "_op_type": "update",
+                    "_id": row.es_id,
+                    "doc": {"document_id": str(version.id), "chunk_index": row.chunk_index, "page": row.page,
+                            "metadata": metadata},
+                }
+                for row in own
+                if row.es_id != f"{version.id}:{row.chunk_index}"
+            ]
+        changes += [{"_op_type": "delete", "_id": row.es_id} for row in earlier if row.es_id not in kept]
+        actions[version.id] = changes
+    return actions, legacy
+
+
+class OutboxDispatcher:
+    """Applies outbox events to Elasticsearch in bulk, at least once.
+
+    Events only carry the document id: each batch indexes the documents as
+    they are in Postgres when it runs (or deletes them, and their chunks, if
+    they are gone), so several events for one document cost one write and a
+    retry just writes the same state again. The id of the newest event is
+    used as an external version, so a slower dispatcher holding older events
+    cannot overwrite what a faster one wrote. Workers share the backlog by
+    locking their batch with SKIP LOCKED; failed events stay in the table and
+    are retried with exponential backoff.
+
+    A "created" event of a new version also applies its chunk delta: the
+    previous version's entries it reused are pointed at it and the rest are
+    deleted, only now that the upload has committed.
+    """
+
+    def __init__(self, batch_size: int, max_retry_seconds: float):
+        self.batch_size = batch_size
+        self.max_retry_seconds = max_retry_seconds
+        self._lock = threading.Lock()
+        self._index_ready = False
+        self.dispatched = 0
+        self.failed = 0
+        self.last_dispatch_at = None
+        self.last_lag_seconds = None
+
+    def _apply(self, versions: dict, documents: dict, chunk_actions: dict, legacy: dict) -> dict:
+        """Writes the current state of the documents; returns the errors by document id."""
+        if not self._index_ready:
+            es_client.ensure_index()
+            self._index_ready = True
+
+        failed = {}
+        owners = {action["_id"]: document_id for document_id, actions in chunk_actions.items() for action in actions}
+        if owners:
+            _, errors = es_client.bulk_index(action for actions in chunk_actions.values() for action in actions)
+            for item in errors:
+                (_, result), = item.items()
+                # 404: the entry is already gone (deleted, or by a retry of this batch).
+                if result.get("status") != 404:
+                    failed[owners[result["_id"]]] = str(result.get("error") or result.get("status"))
+
+        actions = []
+        for document_id, version in versions.items():
+            action = {"_id": str(document_id), "version": version, "version_type": "external_gte"}
+            document = documents.get(document_id)
+            if document is None:
+                actions.append({**action, "_op_type": "delete"})
+            else:
+                actions.append({**action, "_source": document_source(document)})
+        _, errors = es_client.bulk_index(actions, index=es_client.documents_index)
+        for item in errors:
+            (_, result), = item.items()
+            # 404: already deleted. 409: a newer event for the document was already applied.
+            if result.get("status") not in (404, 409):
+                failed[UUID(result["_id"])] = str(result.get("error") or result.get("status"))
+
+        removed = {
+            str(document_id): document_id for document_id in versions
+            if document_id not in documents and document_id not in failed
+        }
+        # Previous versions without chunk rows are removed on behalf of the new version's event.
+        removed.update({str(previous_id): document_id for previous_id, document_id in legacy.items()})
+        if removed:
+            try:
+                es_client.delete_by_documents(list(removed))
+            except Exception as e:
+                failed.update({document_id: str(e) for document_id in removed.values()})
+        return failed
+
+    def dispatch_once(self) -> int:
+        """Applies one batch of due events; returns how many events it took."""
+        db = Session()
+        try:
+            now = datetime.utcnow()
+            events = db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.available_at <= now)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not events:
+                db.rollback()
+                return 0
+
+            versions = {}
+            for event in events:
+                versions[event.aggregate_id] = max(versions.get(event.aggregate_id, 0), event.id)
+            documents = {
+                document.id: document
+                for document in db.query(Document).options(undefer(Document.summary))
+                .filter(Document.id.in_(list(versions)))
+            }
+            created = {
+                event.aggregate_id: documents[event.aggregate_id] for event in events
+                if event.event_type == CREATED and event.aggregate_id in documents
+            }
+            try:
+                chunk_actions, legacy = chunk_changes(db, list(created.values()))
+                failed = self._apply(versions, documents, chunk_actions, legacy)
+            except Exception as e:
+                # The cluster is unreachable or rejected the whole request.
+                failed = {document_id: str(e) for document_id in versions}
+
+            done = [event for event in events if event.aggregate_id not in failed]
+            if done:
+                db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in done])))
+            for event in events:
+                if event.aggregate_id in failed:
+                    event.attempts += 1
+                    event.last_error = failed[event.aggregate_id][:2000]
+                    event.available_at = now + timedelta(seconds=min(2 ** event.attempts, self.max_retry_seconds))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self.dispatched += len(done)
+            self.failed += len(events) - len(done)
+            self.last_dispatch_at = now
+            if done:
+                self.last_lag_seconds = (now - min(event.created_at for event in done)).total_seconds()
+        if failed:
+            logger.warning("%d documents could not be applied to the search indexes, retrying later", len(failed))
+        return len(events)
+
+    async def run(self, interval: float):
+        """Dispatches until cancelled: back to back while there is a backlog, else every ``interval`` seconds."""
+        while True:
+            try:
+                taken = await asyncio.to_thread(self.dispatch_once)
+            except Exception as e:
+                logger.warning("Could not dispatch outbox events: %s", e)
+                taken = 0
+            if taken < self.batch_size:
+                await asyncio.sleep(interval)
+
+    def stats(self, db: DbSession) -> dict:
+        """Backlog and lag of the outbox; lag_seconds is the age of the oldest pending event."""
+        pending, retrying, oldest = db.query(
+            func.count(OutboxEvent.id),
+            func.count(OutboxEvent.id).filter(OutboxEvent.attempts > 0),
+            func.min(OutboxEvent.created_at),
+        ).one()
+        with self._lock:
+            return {
+                "pending": pending,
+                "retrying": retrying,
+                "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+                "dispatched": self.dispatched,
+                "failed": self.failed,
+                "last_dispatch_at": self.last_dispatch_at,
+                "last_lag_seconds": self.last_lag_seconds,
+            }
+
+
+outbox_dispatcher = OutboxDispatcher(settings.outbox_batch_size, settings.outbox_max_retry_seconds)
@@ -0,0 +1,184 @@
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Query
+
+from tables import Document, Folder
+
+
+# Cap on the rows a list answer returns; larger lists go to the LLM path's summary anyway.
+MAX_LISTED_DOCUMENTS = 200
+
+COUNT_PATTERN = re.compile(r"\b(how many|number of|count)\b", re.IGNORECASE)
+LIST_PATTERN = re.compile(r"\b(list|show|dates? of|what dates?|senders?|receivers?|recipients?)\b", re.IGNORECASE)
+# Only questions about the letters themselves are answered from their metadata.
+TARGET_PATTERN = re.compile(
+    r"\b(letters?|documents?|files?|correspondence|senders?|receivers?|recipients?)\b", re.IGNORECASE,
+)
+# Questions that need the documents' content, not just their metadata.
+OPEN_PATTERN = re.compile(
+    r"\b(summar\w*|explain|why|describe|detail\w*|content|say|says|said|mention\w*|discuss\w*|analy\w*|reason)\b",
+    re.IGNORECASE,
+)
+DATES_PATTERN = re.compile(r"\b(dates?|when)\b", re.IGNORECASE)
+# Party and project names are taken as a run of capitalised words ("North Herts District Council").
+NAME = r"((?:[A-Z][\w&.'-]*)(?:\s+(?:of|and|&|(?!(?:19|20)\d{2}\b)[A-Z0-9][\w&.'-]*))*)"
+SENDER_PATTERN = re.compile(rf"\b(?:from|by)\s+(?![Pp]roject\b){NAME}")
+RECEIVER_PATTERN = re.compile(rf"\b(?:to)\s+(?![Pp]roject\b){NAME}")
+PROJECT_PATTERN = re.compile(rf"\b[Pp]roject\s+{NAME}")
+YEAR_PATTERN = re.compile(r"\b(?:in|during|of)\s+((?:19|20)\d{2})\b")
+# Names and numbers left in a question once the filters are taken out of it.
+TERM_PATTERN = re.compile(r"\b(?:[A-Z][\w&.'-]*|\d[\w/.-]*)")
+
+
+@dataclass
+class QueryIntent:
+    kind: str  # "count", "list" or "open"
+    wants_dates: bool = False
+    sender: Optional[str] = None
+    receiver: Optional[str] = None
+    project: Optional[str] = None
+    year: Optional[int] = None
+    # Capitalised words and numbers no filter accounts for (the first word aside).
+    unparsed: Tuple[str, ...] = ()
+
+
+def classify_query(query: str) -> QueryIntent:
+    """Cheap rule-based intent classifier for metadata questions.
+
+    Anything that is not clearly a count or list of letters is "open".
+    """
+    if OPEN_PATTERN.search(query) or not TARGET_PATTERN.search(query):
+        kind = "open"
+    elif COUNT_PATTERN.search(query):
+        kind = "count"
+    elif LIST_PATTERN.search(query):
+        kind = "list"
+    else:
+        kind = "open"
+
+    spans = []
+
+    def capture(pattern):
+        match = pattern.search(query)
+        if not match:
+            return None
+        spans.append(match.span())
+        return re.sub(r"\s+(?:of|and|&)$", "", match.group(1).strip(" .?,"))
+
+    sender = capture(SENDER_PATTERN)
+    receiver = capture(RECEIVER_PATTERN)
+    project = capture(PROJECT_PATTERN)
+    year = capture(YEAR_PATTERN)
+    residual = list(query)
+    for start, end in spans:
+        residual[start:end] = " " * (end - start)
+    terms = TERM_PATTERN.findall("".join(residual))
+    if terms and query.lstrip().startswith(terms[0]):
+        terms = terms[1:]
+    return QueryIntent(
+        kind=kind,
+        wants_dates=bool(DATES_PATTERN.search(query)),
+        sender=sender,
+        receiver=receiver,
+        project=project,
+        year=int(year) if year else None,
+        unparsed=tuple(term for term in terms if term != "I"),
+    )
+
+
+def answer_from_database(query: str, documents_query: Query) -> Optional[dict]:
+    """Answers count/list questions with indexed SQL over the document metadata.
+
+    ``documents_query`` is the caller's scoped (Document, Folder.name) query.
+    Returns None when the question needs the LLM path: open-ended intents,
+    names or dates that did not parse into a filter (answering without them
+    would count the wrong letters), or metadata filters over documents whose
+    metadata has not been extracted yet.
+    """
+    intent = classify_query(query)
+    if intent.kind == "open":
+        return None
+
+    scoped = documents_query
+    query_lower = query.lower()
+    folder_names = [name for (name,) in documents_query.with_entities(Folder.name).distinct()]
+    matched_folders = [name for name in folder_names if name.lower() in query_lower]
+    if matched_folders:
+        scoped = scoped.filter(Folder.name.in_(matched_folders))
+    folder_words = {word for name in matched_folders for word in name.lower().split()}
+    if any(term.lower() not in folder_words for term in intent.unparsed):
+        return None
+
+    needs_metadata = intent.wants_dates or intent.year
+    if intent.project and not matched_folders:
+        scoped = scoped.filter(or_(
+            Document.project_name.ilike(f"%{intent.project}%"),
+            Folder.name.ilike(f"%{intent.project}%"),
+        ))
+        needs_metadata = True
+    if intent.sender:
+        scoped = scoped.filter(Document.sender.ilike(f"%{intent.sender}%"))
+        needs_metadata = True
+    if intent.receiver:
+        scoped = scoped.filter(Document.receiver.ilike(f"%{intent.receiver}%"))
+        needs_metadata = True
+    if intent.year:
+        scoped = scoped.filter(func.extract("year", Document.document_date) == intent.year)
+
+    if needs_metadata:
+        # Filtering on metadata that was never extracted would silently undercount.
+        missing = documents_query.filter(Document.extracted_metadata.is_(None)).with_entities(Document.id).first()
+        if missing:
+            return None
+
+    per_folder = (
+        scoped.with_entities(
+            Folder.name,
+            func.count(Document.id),
+            func.min(Document.document_date),
+            func.max(Document.document_date),
+        )
+        .group_by(Folder.name)
+        .order_by(Folder.name)
+        .all()
+    )
+    total = sum(count for _, count, _, _ in per_folder)
+
+    result = {
+        "source": "database",
+        "intent": intent.kind,
+        "total_letters": total,
+        "folders": [
+            {"folder": name, "letters": count, "first_date": first, "last_date": last}
+            for name, count, first, last in per_folder
+        ],
+    }
+    lines = [f"Total Letters: {total}"]
+    lines += [f"{name}: {count}" for name, count, _, _ in per_folder]
+
+    if intent.kind == "list" or intent.wants_dates:
+        letters = (
+            scoped.with_entities(
+                Document.filename, Document.document_date, Document.sender, Document.receiver, Folder.name,
+            )
+            .order_by(Document.document_date.asc().nullslast(), Document.filename)
+            .limit(MAX_LISTED_DOCUMENTS)
+            .all()
+        )
+        result["letters"] = [
+            {"filename": filename, "date": date, "sender": sender, "receiver": receiver, "folder": folder}
+            for filename, date, sender, receiver, folder in letters
+        ]
+        lines.append("Letters:")
+        lines += [
+            f"- {filename} ({date.isoformat() if date else 'undated'})"
+            + (f", from {sender}" if sender else "")
+            + (f", to {receiver}" if receiver else "")
+            for filename, date, sender, receiver, _ in letters
+        ]
+
+    result["answer"] = "\n".join(lines)
+    return result
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,6 +12,8 @@ class Settings(BaseSettings):
     db_instance: str
     db_port: int
     db_database: str    
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
 
     secret_key: str
     access_token_expire_minutes: int
@@ -17,13 +21,121 @@ class Settings(BaseSettings):
     elasticsearch_host: str
     elasticsearch_port: int
     elasticsearch_index: str
+    # Per-document index kept in sync through the outbox; "<elasticsearch_index>-documents" by default.
+    elasticsearch_documents_index: Optional[str] = None
 
     openai_api_key: str
     openai_model: str
+    # Override to point the clients at a proxy or at the benchmark fakes.
+    openai_base_url: Optional[str] = None
     GEMINI_API_KEY: str
+    gemini_api_url: str = "https://generativelanguage.googleapis.com/v1beta/models"
 
     environment: str
 
+    # Where uploads are stored: "local" (a directory, the default) or "s3" (any
+    # S3-compatible API, e.g. MinIO; needs boto3). Existing documents stay
+    # readable from wherever they were stored.
+    storage_backend: str = "local"
+    storage_local_root: str = "uploads"
+    storage_s3_bucket: Optional[str] = None
+    storage_s3_prefix: str = ""
+    storage_s3_endpoint_url: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    storage_s3_region: Optional[str] = None
+    storage_s3_access_key: Optional[str] = None  # Default boto3 credential chain if unset
+    storage_s3_secret_key: Optional[str] = None
+    # Local copies of remote files for extraction and downloads.
+    storage_cache_dir: str = ".cache/files"
+    storage_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+
+    # Stored extracted text is zstd-compressed (older rows may be zlib, which is still read).
+    text_compression_level: int = 9
+
+    extraction_cache_dir: str = ".cache/extraction"
+    extraction_cache_max_bytes: int = 512 * 1024 * 1024
+    ocr_language: str = "eng"
+    # "fast" reads the raw PDF text layer with pypdfium2 and only falls back to
+    # pdfplumber layout analysis for tabular/multi-column pages; "layout" always
+    # uses pdfplumber.
+    pdf_extraction_mode: str = "fast"
+    antiword_path: str = "antiword"
+
+    upload_workers: int = 4
+    max_batch_files: int = 500
+    # Bytes actually written are counted, so a zip member cannot exceed these by lying about its size.
+    max_upload_file_bytes: int = 512 * 1024 * 1024
+    max_batch_upload_bytes: int = 2 * 1024 * 1024 * 1024
+
+    # Short documents are summarised several per Gemini call, up to this prompt size.
+    summary_batch_token_budget: int = 6000
+    summary_batch_max_document_chars: int = 3000
+    # Long documents are summarised map-reduce style over sections of about this size.
+    summary_section_chars: int = 8000
+    summary_reduce_fan_in: int = 8
+    summary_workers: int = 4
+    # Cap on Gemini summary calls in flight across all uploads and documents.
+    summary_max_concurrent_calls: int = 8
+    summary_cache_dir: str = ".cache/summaries"
+    summary_cache_max_bytes: int = 128 * 1024 * 1024
+
+    # Answers to open-ended metadata questions are reused for paraphrases of the
+    # same question over unchanged documents. Pick the thresholds with
+    # python -m scripts.calibrate_query_cache; questions about different names
+    # or numbers never match, whatever their similarity.
+    query_cache_max_entries: int = 1000
+    query_cache_similarity: float = 0.93
+    # Threshold for the local hashed embedding used when the embeddings API is down.
+    query_cache_fallback_similarity: float = 0.8
+
+    chunk_size: int = 1000
+    chunk_overlap: int = 100
+
+    # Chat sessions keep the best-scoring chunks of their first retrieval and
+    # re-rank those for follow-up questions.
+    chat_candidate_chunks: int = 300
+    chat_context_chunks: int = 8
+    # Follow-ups inherit this share of the previous turn's chunk scores.
+    chat_score_decay: float = 0.5
+    # Messages kept verbatim in the prompt; older ones are folded into the session summary.
+    chat_history_messages: int = 6
+
+    # Seconds between retries of failed warm-up checks; the worker is not ready until they pass.
+    warmup_retry_seconds: float = 5.0
+
+    # Seconds between batched writes of documents' last_accessed_at.
+    access_flush_seconds: float = 30.0
+
+    # Transactional outbox: seconds between polls for document changes to apply to
+    # the search indexes, events per bulk request, and the cap on retry backoff.
+    # Every worker runs a dispatcher unless disabled; they share the backlog.
+    outbox_dispatch_enabled: bool = True
+    outbox_poll_seconds: float = 1.0
+    outbox_batch_size: int = 200
+    outbox_max_retry_seconds: float = 300.0
+
+    # Streaming bulk indexing (POST /api/documents/index): chunks per embedding
+    # request, documents parsed ahead of the embedder (the backpressure bound),
+    # and the longest accepted NDJSON line.
+    bulk_index_batch_chunks: int = 64
+    bulk_index_queue_documents: int = 32
+    bulk_index_max_line_bytes: int = 16 * 1024 * 1024
+
+    # Folder and file listings. "memory" is per worker process, so with several
+    # workers another worker's writes only show up after the TTL; use "redis" there.
+    listing_cache_backend: str = "memory"
+    listing_cache_redis_url: str = "redis://localhost:6379/0"
+    listing_cache_ttl_seconds: int = 60
+    listing_cache_max_entries: int = 10000
+
+    # Request profiling with pyinstrument (optional dependency); off by default.
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0  # Share of requests profiled at random
+    profiling_slow_seconds: Optional[float] = None  # Profile every request, keep those slower than this
+    profiling_interval: float = 0.001
+    profiling_max_profiles: int = 50
+    # Sent as X-Profile to profile a request and as X-Admin-Token to read profiles.
+    profiling_admin_token: Optional[str] = None
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -22,8 +22,13 @@ from sqlalchemy import (
     Boolean,
     Text,
     UUID,
+    Index,
+    Date,
+    LargeBinary,
+    BigInteger,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -50,6 +55,15 @@ class User(Base):
     documents = relationship("Document", back_populates="owner")
     chat_sessions = relationship("ChatSession", back_populates="user")
 
+    __table_args__ = (
+        # Login and token lookups filter on email + is_active.
+        Index(
+            "ix_users_email_active",
+            "email",
+            postgresql_where=(is_active == True),
+        ),
+    )
+
 
 class Folder(Base):
     __tablename__ = "folders"
@@ -60,7 +74,7 @@ class Folder(Base):
         UUID(as_uuid=True), ForeignKey("folders.id"), nullable=True
     )
     owner_id = Column(
-        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True
     )  # Folder Owner
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(
@@ -92,6 +106,15 @@ class Folder(Base):
         "Files", back_populates="folder", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Root folders are never looked up by parent, so keep them out of the index.
+        Index(
+            "ix_folders_parent_id",
+            "parent_id",
+            postgresql_where=(parent_id != None),
+        ),
+    )
+
 
 class Files(Base):
     __tablename__ = "files"
@@ -99,7 +122,7 @@ class Files(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True, unique=True)
     name = Column(String, nullable=False, doc="Name of the uploaded file.")
     path = Column(String, nullable=False, doc="File storage path on the server.")
-    folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id"), nullable=False, doc="Reference to the folder containing this file.")
+    folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id"), nullable=False, index=True, doc="Reference to the folder containing this file.")
     owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, doc="User who uploaded the file.")
 
     folder = relationship("Folder", back_populates="files", doc="Relationship linking the file to its folder.")
@@ -109,10 +132,10 @@ class Document(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     folder_id = Column(
-        UUID(as_uuid=True), ForeignKey("folders.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("folders.id"), nullable=False, index=True
     )
     owner_id = Column(
-        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True
     )
     filename = Column(String, nullable=False)
     storage_path = Column(String, nullable=False)  # File path (local/S3)
@@ -122,18 +145,109 @@ class Document(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
-    # Metadata
-    description = Column(Text, nullable=True)
-    summary = Column(Text, nullable=True)
+    # Metadata. Text columns are deferred so listing queries do not load them;
+    # undefer them in the queries that need them.
+    description = deferred(Column(Text, nullable=True), group="text")
+    summary = deferred(Column(Text, nullable=True), group="text")
     file_size = Column(Integer, nullable=True)  # File size in bytes
     checksum = Column(String, nullable=True)  # MD5/SHA256 hash for integrity
     version = Column(String, nullable=True, default="1.0")
+    # Re-uploading a file name to the same folder adds a version; only the latest is listed and searched.
+    previous_version_id = Column(
+        UUID(as_uuid=True), ForeignKey("documents.id"), nullable=True
+    )
+    is_latest = Column(Boolean, nullable=False, default=True, server_default="true")
     last_accessed_at = Column(DateTime, nullable=True)
     tags = Column(Text, nullable=True)  # JSON or comma-separated tags
 
+    # Structured metadata extracted once at ingest
+    document_date = Column(Date, nullable=True)  # Date of the letter
+    sender = Column(String, nullable=True)
+    receiver = Column(String, nullable=True)
+    project_name = Column(String, nullable=True)
+    extracted_metadata = deferred(Column(JSONB, nullable=True))  # Dates, parties, client, manager...
+
     # Relationships
     folder = relationship("Folder", back_populates="documents")
     owner = relationship("User", back_populates="documents")
+    document_text = relationship("DocumentText", uselist=False, passive_deletes=True)
+    chunks = relationship(
+        "DocumentChunk", order_by="DocumentChunk.chunk_index", passive_deletes=True
+    )
+
+    __table_args__ = (
+        # Finds the current version of a file name when it is uploaded again;
+        # unique, so concurrent uploads cannot both become the latest version.
+        Index(
+            "ix_documents_folder_filename_latest",
+            "folder_id",
+            "filename",
+            unique=True,
+            postgresql_where=(is_latest == True),
+        ),
+    )
+
+
+class DocumentChunk(Base):
+    """One indexed chunk of a document version, by content hash, for delta re-indexing."""
+
+    __tablename__ = "document_chunks"
+
+    document_id = Column(
+        UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True
+    )
+    chunk_index = Column(Integer, primary_key=True)
+    page = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=False)  # SHA-256 of the chunk text
+    occurrence = Column(Integer, nullable=False, default=0)  # Among chunks with the same hash
+    es_id = Column(String, nullable=False)  # Elasticsearch _id, kept across versions while unchanged
+
+
+class CompressionDictionary(Base):
+    __tablename__ = "compression_dictionaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    codec = Column(String, nullable=False, default="zstd")
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=True)  # Documents it was trained on
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DocumentText(Base):
+    """Full extracted text of a document, compressed, kept out of the documents table."""
+
+    __tablename__ = "document_texts"
+
+    document_id = Column(
+        UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True
+    )
+    extractor = Column(String, nullable=False)  # name:version:options that produced the text
+    codec = Column(String, nullable=False)  # "zstd" or "zlib"
+    dictionary_id = Column(
+        Integer, ForeignKey("compression_dictionaries.id"), nullable=True
+    )
+    raw_size = Column(Integer, nullable=False)  # UTF-8 bytes before compression
+    content = Column(LargeBinary, nullable=False)  # Pages separated by form feeds
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OutboxEvent(Base):
+    """A change to a document not yet applied to the search indexes.
+
+    Written in the same transaction as the change and deleted once the
+    dispatcher has applied it, so the table only holds the backlog.
+    """
+
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False)  # Document id
+    event_type = Column(String, nullable=False)  # "created", "updated" or "deleted"
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Failed events are retried with backoff from this time on.
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
 
 
 class ChatSession(Base):
@@ -141,9 +255,22 @@ class ChatSession(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(
-        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True
     )
+    folder_id = Column(
+        UUID(as_uuid=True), ForeignKey("folders.id"), nullable=True
+    )  # Folder subtree the conversation is scoped to
+    title = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    # Rolling summary of the messages older than the recent window
+    summary = Column(Text, nullable=True)
+    summary_through = Column(DateTime, nullable=True)  # created_at of the last summarised message
+    # Retrieved candidate chunks and their scores, reused by follow-up questions
+    context_cache = Column(JSONB, nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="chat_sessions")
@@ -157,7 +284,7 @@ class ChatMessage(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_id = Column(
-        UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False, index=True
     )
     sender = Column(String, nullable=False)  # "user" or "assistant"
     content = Column(Text, nullable=False)
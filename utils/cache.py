@@ -0,0 +1,169 @@
+import codecs
+import hashlib
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+def cache_key(*parts) -> str:
+    """Builds a stable cache key from the given parts."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def file_sha256(file_path, chunk_size: int = 1024 * 1024) -> str:
+    """Hashes a file's bytes without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches ``etag`` (weak comparison, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+
+class DiskCache:
+    """Size-bounded cache of zlib-compressed text entries on local disk.
+
+    Entries are evicted least-recently-used first (by file mtime, which is
+    bumped on every hit) once the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.z"
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return [p for p in self.directory.glob("*/*.z") if p.is_file()]
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self._entries())
+        return self._size
+
+    def get(self, key: str) -> Optional[str]:
+        chunks = self.get_stream(key)
+        return None if chunks is None else "".join(chunks)
+
+    def get_stream(self, key: str, chunk_size: int = 64 * 1024) -> Optional[Iterator[str]]:
+        """Returns an iterator decompressing the entry incrementally, or None on a miss."""
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return self._read(f, chunk_size)
+
+    def _read(self, f, chunk_size: int) -> Iterator[str]:
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with f:
+            for raw in iter(lambda: f.read(chunk_size), b""):
+                yield decoder.decode(decompressor.decompress(raw))
+            yield decoder.decode(decompressor.flush(), final=True)
+
+    def set(self, key: str, value: str):
+        with self.writer(key) as entry:
+            entry.write(value)
+
+    @contextmanager
+    def writer(self, key: str):
+        """Streams an entry to disk as it is produced.
+
+        The entry is only published if the block exits cleanly and
+        ``discard()`` was not called, so readers never see a partial entry.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+        entry = _EntryWriter(open(tmp_path, "wb"))
+        try:
+            yield entry
+            entry.close()
+        except BaseException:
+            entry.discarded = True
+            raise
+        finally:
+            entry.file.close()
+            if entry.discarded:
+                tmp_path.unlink(missing_ok=True)
+        if entry.discarded:
+            return
+
+        size = tmp_path.stat().st_size
+        with self._lock:
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._size = self._current_size() - previous + size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drops the least recently used entries until the cache is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        for path in entries:
+            if self._size <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries()),
+                "size_bytes": self._current_size(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class _EntryWriter:
+    def __init__(self, file):
+        self.file = file
+        self.discarded = False
+        self._compressor = zlib.compressobj(6)
+
+    def write(self, text: str):
+        self.file.write(self._compressor.compress(text.encode("utf-8")))
+
+    def discard(self):
+        """Drops the entry instead of publishing it."""
+        self.discarded = True
+
+    def close(self):
+        self.file.write(self._compressor.flush())
@@ -0,0 +1,427 @@
+"""Registry of text extractors, selected by sniffing the file's content.
+
+Every extractor runs in a child process with a hard timeout and an
+address-space limit, so a pathological file can only take down its own
+sandbox, never the API worker. Children are forked from a fork server rather
+than from the (multi-threaded) worker itself.
+"""
+import email
+import email.policy
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Tuple
+from xml.etree import ElementTree
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class ExtractionError(Exception):
+    """Raised when an extractor fails, times out or runs out of memory."""
+
+
+@dataclass
+class Extractor:
+    name: str
+    version: str
+    mime_types: Tuple[str, ...]
+    func: Callable[[str], str]
+    timeout: float = 60
+    memory_limit_mb: int = 1024
+    # Extra cache-key component, e.g. the OCR setup. Evaluated lazily.
+    options: Callable[[], str] = field(default=lambda: "")
+    # Streaming extractors yield (page_number, text) instead of returning a string.
+    streaming: bool = False
+
+    def extract(self, file_path) -> str:
+        """Runs the extractor in-process and returns the whole text."""
+        if self.streaming:
+            return "\n".join(text for _, text in self.func(file_path)).strip()
+        return self.func(file_path)
+
+
+_registry: Dict[str, Extractor] = {}
+
+
+def register_extractor(name: str, version: str, mime_types: Tuple[str, ...], timeout: float = 60,
+                       memory_limit_mb: int = 1024, options: Callable[[], str] = lambda: "",
+                       streaming: bool = False):
+    """Decorator registering an extractor for the given MIME types.
+
+    The function takes a path and returns the text, or with ``streaming=True``
+    yields ``(page_number, text)`` pairs.
+    """
+    def decorator(func):
+        extractor = Extractor(name, version, tuple(mime_types), func, timeout, memory_limit_mb, options, streaming)
+        for mime_type in mime_types:
+            _registry[mime_type] = extractor
+        return func
+    return decorator
+
+
+def registered_extractors() -> List[Extractor]:
+    return list({id(e): e for e in _registry.values()}.values())
+
+
+# --- MIME sniffing --------------------------------------------------------
+
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+ZIP_MIME_TYPES = {
+    "word/document.xml": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xl/workbook.xml": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+EXTENSION_MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".odt": "application/vnd.oasis.opendocument.text",
+    ".rtf": "application/rtf",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".eml": "message/rfc822",
+}
+
+
+def sniff_mime_type(file_path) -> str:
+    """Guesses a file's MIME type from its leading bytes, falling back to the extension."""
+    with open(file_path, "rb") as f:
+        head = f.read(2048)
+
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(OLE_MAGIC):
+        return "application/msword"
+    if head.startswith(b"{\\rtf"):
+        return "application/rtf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+                if "mimetype" in names:
+                    return archive.read("mimetype").decode("ascii", "replace").strip()
+                for member, mime_type in ZIP_MIME_TYPES.items():
+                    if member in names:
+                        return mime_type
+        except zipfile.BadZipFile:
+            pass
+        return "application/zip"
+
+    lowered = head.lstrip().lower()
+    if lowered.startswith((b"<!doctype html", b"<html")) or b"<body" in lowered:
+        return "text/html"
+    if re.match(rb"(?:(?:received|return-path|from|to|subject|date|message-id|mime-version):[^\n]*\r?\n)+", lowered):
+        return "message/rfc822"
+
+    ext = os.path.splitext(str(file_path))[1].lower()
+    return EXTENSION_MIME_TYPES.get(ext, "text/plain")
+
+
+def get_extractor(file_path) -> Extractor:
+    """Picks the registered extractor for a file, defaulting to the plain-text one."""
+    mime_type = sniff_mime_type(file_path)
+    extractor = _registry.get(mime_type) or _registry.get("text/plain")
+    if extractor is None:
+        raise ExtractionError(f"No extractor registered for {mime_type}")
+    return extractor
+
+
+# --- Sandbox --------------------------------------------------------------
+
+# Imported once in the fork server, so every sandbox starts with the extractors loaded.
+SANDBOX_PRELOAD = ["utils.extractors", "utils.folders"]
+
+_sandbox_context = None
+_sandbox_context_lock = threading.Lock()
+
+
+def sandbox_context():
+    """The multiprocessing context sandboxes are started with.
+
+    Forking the API worker directly would copy locks that its other threads
+    (uvicorn's thread pool, upload workers) hold at that moment, and a child
+    blocking on one only ends at its timeout. The fork server is a
+    single-threaded process started once, so its children inherit no such
+    locks. Where it is unavailable, children are spawned.
+    """
+    global _sandbox_context
+    with _sandbox_context_lock:
+        if _sandbox_context is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                _sandbox_context = multiprocessing.get_context("forkserver")
+                _sandbox_context.set_forkserver_preload(SANDBOX_PRELOAD)
+            else:
+                _sandbox_context = multiprocessing.get_context("spawn")
+        return _sandbox_context
+
+
+def start_sandbox_server():
+    """Starts the fork server (and its imports) now rather than on the first extraction."""
+    if sandbox_context().get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+def _address_space_bytes() -> int:
+    """Current virtual memory size of this process, 0 if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _sandbox_main(conn, func, file_path, memory_limit_mb, streaming):
+    try:
+        if resource is not None and memory_limit_mb:
+            # The child inherits the fork server's mappings (the preloaded
+            # libraries), so the budget is on top of what is already mapped.
+            limit = _address_space_bytes() + memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if streaming:
+            # send() blocks once the pipe is full, so a slow consumer throttles the child.
+            for page_number, text in func(file_path):
+                conn.send(("page", page_number, text))
+        else:
+            conn.send(("page", 1, func(file_path)))
+        conn.send(("done", None, None))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}", None))
+    finally:
+        conn.close()
+
+
+def stream_extractor(extractor: Extractor, file_path) -> Iterator[Tuple[int, str]]:
+    """Runs an extractor in a child process and yields its pages as they arrive.
+
+    The timeout counts only the time spent waiting for the child, not the time
+    the caller spends on each page. Closing the generator kills the child.
+    """
+    ctx = sandbox_context()
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(
+        target=_sandbox_main,
+        args=(sender, extractor.func, str(file_path), extractor.memory_limit_mb, extractor.streaming),
+        daemon=True,
+    )
+    process.start()
+    sender.close()
+
+    remaining = extractor.timeout
+    try:
+        while True:
+            started = time.monotonic()
+            if remaining <= 0 or not receiver.poll(remaining):
+                raise ExtractionError(f"{extractor.name} timed out after {extractor.timeout}s on {file_path}")
+            kind, payload, text = receiver.recv()
+            remaining -= time.monotonic() - started
+
+            if kind == "page":
+                yield payload, text
+            elif kind == "done":
+                return
+            else:
+                raise ExtractionError(f"{extractor.name} failed on {file_path}: {payload}")
+    except EOFError:
+        raise ExtractionError(f"{extractor.name} crashed on {file_path} (exit code {process.exitcode})")
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+def run_extractor(extractor: Extractor, file_path) -> str:
+    """Runs an extractor in a child process, killing it once its timeout expires."""
+    return "\n".join(text for _, text in stream_extractor(extractor, file_path)).strip()
+
+
+# --- Pure-Python extractors -----------------------------------------------
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+S_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+ODF_TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+@register_extractor(
+    "docx", "1",
+    ("application/vnd.openxmlformats-officedocument.wordprocessingml.document",),
+    timeout=30, memory_limit_mb=512,
+)
+def extract_text_from_docx(docx_path):
+    """Extracts paragraph text from a DOCX file by reading word/document.xml directly."""
+    with zipfile.ZipFile(docx_path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    paragraphs = []
+    for paragraph in root.iter(f"{W_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{W_NS}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{W_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{W_NS}br", f"{W_NS}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs).strip()
+
+
+@register_extractor(
+    "xlsx", "1",
+    ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",),
+    timeout=60, memory_limit_mb=1024,
+)
+def extract_text_from_xlsx(xlsx_path):
+    """Extracts cell values from every sheet of an XLSX file, one row per line."""
+    with zipfile.ZipFile(xlsx_path) as archive:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+            for item in root.iter(f"{S_NS}si"):
+                shared_strings.append("".join(t.text or "" for t in item.iter(f"{S_NS}t")))
+
+        sheets = sorted(
+            name for name in archive.namelist()
+            if name.startswith("xl/worksheets/sheet") and name.endswith(".xml")
+        )
+        lines = []
+        for sheet in sheets:
+            with archive.open(sheet) as f:
+                for _, row in ElementTree.iterparse(f):
+                    if row.tag != f"{S_NS}row":
+                        continue
+                    values = []
+                    for cell in row.iter(f"{S_NS}c"):
+                        value = cell.find(f"{S_NS}v")
+                        if cell.get("t") == "s" and value is not None:
+                            values.append(shared_strings[int(value.text)])
+                        elif cell.get("t") == "inlineStr":
+                            values.append("".join(t.text or "" for t in cell.iter(f"{S_NS}t")))
+                        elif value is not None and value.text:
+                            values.append(value.text)
+                    if values:
+                        lines.append("\t".join(values))
+                    row.clear()
+    return "\n".join(lines).strip()
+
+
+@register_extractor("odt", "1", ("application/vnd.oasis.opendocument.text",), timeout=30, memory_limit_mb=512)
+def extract_text_from_odt(odt_path):
+    """Extracts paragraph and heading text from an ODT file's content.xml."""
+    with zipfile.ZipFile(odt_path) as archive:
+        root = ElementTree.fromstring(archive.read("content.xml"))
+
+    paragraphs = []
+    for node in root.iter():
+        if node.tag in (f"{ODF_TEXT_NS}p", f"{ODF_TEXT_NS}h"):
+            paragraphs.append("".join(node.itertext()))
+    return "\n".join(paragraphs).strip()
+
+
+RTF_DESTINATIONS = re.compile(r"\{(?:\\\*)?\\(?:fonttbl|colortbl|stylesheet|info|pict|header|footer)[^{}]*(?:\{[^{}]*\}[^{}]*)*\}")
+RTF_TOKENS = re.compile(r"\\'([0-9a-fA-F]{2})|\\u(-?\d+)\??|\\(par|line|tab)\b ?|\\[a-zA-Z]+-?\d* ?|\\([{}\\])|[{}]")
+
+
+@register_extractor("rtf", "2", ("application/rtf", "text/rtf"), timeout=30, memory_limit_mb=512)
+def extract_text_from_rtf(rtf_path):
+    """Strips RTF control words and groups, keeping the document text."""
+    with open(rtf_path, "r", encoding="latin-1") as f:
+        raw = RTF_DESTINATIONS.sub("", f.read())
+
+    def replace(match):
+        hex_char, unicode_char, breaking, escaped = match.groups()
+        if hex_char:
+            return bytes([int(hex_char, 16)]).decode("cp1252", "replace")
+        if unicode_char:
+            return chr(int(unicode_char) % 0x10000)
+        if breaking:
+            return "\t" if breaking == "tab" else "\n"
+        if escaped:
+            return escaped
+        return ""
+
+    text = RTF_TOKENS.sub(replace, raw).strip()
+    # \u escapes are UTF-16 code units: join surrogate pairs (emoji etc.) into one
+    # character and replace unpaired ones, which cannot be encoded as UTF-8.
+    return text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+
+
+class _HTMLTextParser(HTMLParser):
+    SKIP = {"script", "style", "head", "noscript"}
+    BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section", "article"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self):
+        lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def html_to_text(html):
+    parser = _HTMLTextParser()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+@register_extractor("html", "1", ("text/html", "application/xhtml+xml"), timeout=30, memory_limit_mb=512)
+def extract_text_from_html(html_path):
+    """Extracts visible text from an HTML file, dropping scripts and styles."""
+    with open(html_path, "rb") as f:
+        raw = f.read()
+    charset = re.search(rb"<meta[^>]+charset=[\"']?([\w-]+)", raw[:4096], re.IGNORECASE)
+    encoding = charset.group(1).decode("ascii") if charset else "utf-8"
+    try:
+        html = raw.decode(encoding, errors="replace")
+    except LookupError:
+        html = raw.decode("utf-8", errors="replace")
+    return html_to_text(html)
+
+
+@register_extractor("eml", "1", ("message/rfc822",), timeout=30, memory_limit_mb=512)
+def extract_text_from_eml(eml_path):
+    """Extracts headers and the text body of an email, preferring text/plain parts."""
+    with open(eml_path, "rb") as f:
+        message = email.message_from_binary_file(f, policy=email.policy.default)
+
+    headers = [
+        f"{name}: {message[name]}"
+        for name in ("From", "To", "Cc", "Date", "Subject")
+        if message[name]
+    ]
+    body = message.get_body(preferencelist=("plain", "html"))
+    text = ""
+    if body is not None:
+        text = body.get_content()
+        if body.get_content_type() == "text/html":
+            text = html_to_text(text)
+    return ("\n".join(headers) + "\n\n" + text).strip()
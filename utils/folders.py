@@ -8,50 +8,287 @@ import requests
 import os, re
 import chardet
 import spacy
+from collections import Counter
+from functools import lru_cache
+from settings import settings
+from utils.cache import DiskCache, cache_key, file_sha256
+from utils.storage import local_path
+from utils.extractors import ExtractionError, get_extractor, register_extractor, stream_extractor
+
+try:
+    import pypdfium2
+except ImportError:  # Optional fast text-layer backend
+    pypdfium2 = None
 
 
-# Load NLP model for keyword extraction
-nlp = spacy.load("en_core_web_sm")
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = "gemini-1.5-flash"
+
+extraction_cache = DiskCache(settings.extraction_cache_dir, settings.extraction_cache_max_bytes)
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=settings.chunk_size, chunk_overlap=settings.chunk_overlap)
+
+# Separates pages inside a cached extraction result.
+PAGE_BREAK = "\f"
+
+# Pooled connections to the Gemini API, reused across calls.
+gemini_session = requests.Session()
+
+
+@lru_cache(maxsize=1)
+def get_nlp():
+    """Loads the spaCy model for keyword and entity extraction on first use (or at warm-up)."""
+    return spacy.load("en_core_web_sm")
 
 
 def extract_keywords(text):
     """Extracts relevant keywords dynamically using NLP."""
-    doc = nlp(text)
+    doc = get_nlp()(text)
     return {token.lemma_.lower() for token in doc if token.pos_ in {"NOUN", "VERB"} and len(token.text) > 2}
 
 
-def extract_text_from_pdf(pdf_path):
-    """Extracts text from a PDF file using pdfplumber, with OCR fallback for scanned pages."""
-    text = ""
+def iter_chunk_keywords(texts):
+    """Yields the keyword set of each text chunk, batching them through spaCy."""
+    for doc in get_nlp().pipe(texts, batch_size=16):
+        yield {token.lemma_.lower() for token in doc if token.pos_ in {"NOUN", "VERB"} and len(token.text) > 2}
+
+
+def extract_keywords_stream(texts):
+    """Extracts keywords from a stream of text chunks, batching them through spaCy."""
+    keywords = set()
+    for chunk_keywords in iter_chunk_keywords(texts):
+        keywords |= chunk_keywords
+    return keywords
+
+
+@lru_cache(maxsize=1)
+def ocr_settings():
+    """Describes the OCR setup; part of the cache key for extractors that use OCR."""
+    try:
+        tesseract_version = str(pytesseract.get_tesseract_version())
+    except Exception:
+        tesseract_version = "unavailable"
+    return f"tesseract={tesseract_version};lang={settings.ocr_language}"
+
+
+def pdf_extraction_mode():
+    """The PDF mode actually in effect; "fast" needs pypdfium2 installed."""
+    if settings.pdf_extraction_mode == "fast" and pypdfium2 is not None:
+        return "fast"
+    return "layout"
+
+
+def pdf_extractor_options():
+    return f"{ocr_settings()};mode={pdf_extraction_mode()}"
+
+
+def ocr_pdf_page(pdf_path, page_number):
+    """Renders a single PDF page and runs Tesseract on it."""
+    image = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)[0]
+    return pytesseract.image_to_string(image, lang=settings.ocr_language)
+
+
+def iter_pdf_pages_layout(pdf_path, routes: Counter = None):
+    """Yields (page_number, text) using pdfplumber's layout analysis, with OCR for scanned pages.
+
+    Each page's layout objects are released as soon as its text has been read,
+    so memory stays flat regardless of the page count.
+    """
     with pdfplumber.open(pdf_path) as pdf:
         for page in pdf.pages:
             page_text = page.extract_text()
-            if page_text:
-                text += page_text
-            else:
-                # Convert scanned page to image and extract text using OCR
-                image = convert_from_path(pdf_path, first_page=page.page_number, last_page=page.page_number)[0]
-                text += pytesseract.image_to_string(image)
+            route = "layout"
+            if not page_text:
+                page_text = ocr_pdf_page(pdf_path, page.page_number)
+                route = "ocr"
+            if routes is not None:
+                routes[route] += 1
+            yield page.page_number, page_text.strip()
+            page.close()
+
+
+def _is_tabular(textpage):
+    """Heuristic for pages whose raw text order is unreliable: tables and multi-column layouts.
+
+    pdfium reports one rectangle per text run; when many lines consist of three or
+    more separate runs side by side, the page is laid out in columns.
+    """
+    lines = Counter()
+    for index in range(textpage.count_rects()):
+        _, _, _, top = textpage.get_rect(index)
+        lines[round(top)] += 1
+    if len(lines) < 5:
+        return False
+    return sum(1 for runs in lines.values() if runs >= 3) / len(lines) > 0.3
+
+
+def iter_pdf_pages_fast(pdf_path, routes: Counter = None):
+    """Yields (page_number, text) from the raw text layer via pypdfium2.
+
+    Falls back to pdfplumber layout analysis only for pages that look tabular,
+    and to OCR only for pages with no text layer at all.
+    """
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    layout_pdf = None
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                page_text = textpage.get_text_range().strip()
+                tabular = bool(page_text) and _is_tabular(textpage)
+            finally:
+                textpage.close()
+                page.close()
+
+            route = "text"
+            if not page_text:
+                page_text = ocr_pdf_page(pdf_path, index + 1)
+                route = "ocr"
+            elif tabular:
+                if layout_pdf is None:
+                    layout_pdf = pdfplumber.open(pdf_path)
+                layout_page = layout_pdf.pages[index]
+                page_text = layout_page.extract_text() or page_text
+                layout_page.close()
+                route = "layout"
 
-    return text.strip()
+            if routes is not None:
+                routes[route] += 1
+            yield index + 1, page_text.strip()
+    finally:
+        if layout_pdf is not None:
+            layout_pdf.close()
+        pdf.close()
 
 
+# Bump an extractor's version whenever its output changes, so only the
+# cache entries it produced are invalidated.
+@register_extractor(
+    "pdf", "3", ("application/pdf",),
+    timeout=300, memory_limit_mb=2048, options=pdf_extractor_options, streaming=True,
+)
+def iter_pdf_pages(pdf_path):
+    """Yields (page_number, text) for each page of a PDF, in the configured extraction mode."""
+    if pdf_extraction_mode() == "fast":
+        return iter_pdf_pages_fast(pdf_path)
+    return iter_pdf_pages_layout(pdf_path)
+
+
+def extract_text_from_pdf(pdf_path):
+    """Extracts text from a PDF file in the PDF_EXTRACTION_MODE in effect (see pdf_extraction_mode).
+
+    "fast" reads the text layer with pypdfium2 (iter_pdf_pages_fast), using
+    pdfplumber layout analysis only for tabular pages; "layout" runs pdfplumber
+    on every page (also the fallback when pypdfium2 is not installed). Either
+    way, pages without a text layer are OCR'd.
+    """
+    return "\n".join(text for _, text in iter_pdf_pages(pdf_path)).strip()
+
+
+@register_extractor("antiword", "1", ("application/msword",), timeout=60, memory_limit_mb=512)
 def extract_text_from_doc(doc_path):
-    """Extracts text from a DOC (old Word 97-2003 format) file using catdoc."""
+    """Extracts text from a DOC (old Word 97-2003 format) file using antiword."""
     try:
-        antiword_path = "/opt/homebrew/bin/antiword"
-        result = subprocess.run([antiword_path, doc_path], capture_output=True, text=True)
+        result = subprocess.run([settings.antiword_path, doc_path], capture_output=True, text=True, timeout=55)
         return result.stdout.strip()
     except Exception as e:
         print(f"Error extracting text from {doc_path}: {e}")
         return ""
 
 
+@register_extractor("chardet", "1", ("text/plain", "text/csv", "text/markdown"), timeout=30, memory_limit_mb=512)
+def read_text_file(file_path):
+    """Reads a plain-text file, guessing its encoding with chardet."""
+    encoding = detect_encoding(file_path)
+    with open(file_path, "r", encoding=encoding, errors="replace") as f:
+        return f.read()
+
+
+def split_pages(chunks):
+    """Turns a stream of cached text chunks back into (page_number, text) pairs.
+
+    Only each new chunk is searched for page breaks; the parts of the current
+    page are joined once it ends, so a long page costs linear time.
+    """
+    page_number, parts = 1, []
+    for chunk in chunks:
+        *ended, rest = chunk.split(PAGE_BREAK)
+        for text in ended:
+            parts.append(text)
+            yield page_number, "".join(parts)
+            page_number += 1
+            parts = []
+        parts.append(rest)
+    yield page_number, "".join(parts)
+
+
+def iter_extracted_pages(location):
+    """Yields (page_number, text) for a stored file, from the cache when the content was seen before.
+
+    ``location`` is a document's storage_path; remote files are read through
+    the local file cache. On a miss the pages are streamed from the sandboxed
+    extractor and written to the cache incrementally, so nothing holds the
+    whole document.
+    """
+    with local_path(location) as file_path:
+        yield from _iter_extracted_pages(file_path)
+
+
+def _iter_extracted_pages(file_path):
+    extractor = get_extractor(file_path)
+    key = cache_key(file_sha256(file_path), extractor.name, extractor.version, extractor.options())
+
+    cached = extraction_cache.get_stream(key)
+    if cached is not None:
+        yield from split_pages(cached)
+        return
+
+    with extraction_cache.writer(key) as entry:
+        has_text, first = False, True
+        for page_number, text in stream_extractor(extractor, file_path):
+            text = text.replace(PAGE_BREAK, "")
+            if not first:
+                entry.write(PAGE_BREAK)
+            first = False
+            entry.write(text)
+            has_text = has_text or bool(text.strip())
+            yield page_number, text
+        # Empty output usually means the extractor failed; retry next time.
+        if not has_text:
+            entry.discard()
+
+
+def extract_text(file_path):
+    """Extracts text from a stored file, reusing the cached result for identical content."""
+    return "\n".join(text for _, text in iter_extracted_pages(file_path)).strip()
+
+
+def iter_chunks(pages):
+    """Splits a stream of (page_number, text) pairs into chunks for indexing.
+
+    Only the current page and the unfinished tail of the previous one are held
+    in memory. Each chunk records the page it ends on.
+    """
+    index, carry, carry_page = 0, "", None
+    for page_number, text in pages:
+        if not text.strip():
+            continue
+        pieces = text_splitter.split_text(f"{carry}\n{text}" if carry else text)
+        for piece in pieces[:-1]:
+            yield {"index": index, "page": page_number, "text": piece}
+            index += 1
+        carry, carry_page = pieces[-1], page_number
+    if carry:
+        yield {"index": index, "page": carry_page, "text": carry}
+
+
+GEMINI_API_URL = settings.gemini_api_url.rstrip("/")
+
+
 def call_gemini(prompt):
     """Calls the Gemini API with the given prompt."""
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+    url = f"{GEMINI_API_URL}/{GEMINI_MODEL}:generateContent"
     
     headers = {
         "Content-Type": "application/json",
@@ -65,7 +302,7 @@ def call_gemini(prompt):
         "contents": [{"parts": [{"text": prompt}]}]
     }
 
-    response = requests.post(url, headers=headers, json=data, params=params)
+    response = gemini_session.post(url, headers=headers, json=data, params=params)
 
     if response.status_code == 200:
         return response.json().get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "No response")
@@ -73,9 +310,19 @@ def call_gemini(prompt):
         return f"Error: {response.status_code} - {response.text}"
     
     
+def ping_gemini():
+    """Fetches the model description, opening a pooled connection and checking the API key."""
+    response = gemini_session.get(f"{GEMINI_API_URL}/{GEMINI_MODEL}", params={"key": GEMINI_API_KEY}, timeout=10)
+    response.raise_for_status()
+
+
+# Characters of a document sent to Gemini for its summary.
+SUMMARY_INPUT_CHARS = 5000
+
+
 def summarize_text(text):
     """Summarizes the text using Gemini before passing it to the main query."""
-    summary_prompt = f"Summarize this document in 3-5 sentences:\n\n{text[:5000]}"  # Truncate long text
+    summary_prompt = f"Summarize this document in 3-5 sentences:\n\n{text[:SUMMARY_INPUT_CHARS]}"  # Truncate long text
     return call_gemini(summary_prompt)
 
 
@@ -87,7 +334,7 @@ def detect_encoding(file_path):
 
 
 def extract_dates(text):
-    """Extracts potential dates from the document text."""
+    """Extracts potential dates from the document text, in the order they appear."""
     date_patterns = [
         r"\b\d{1,2}/\d{1,2}/\d{4}\b",  # MM/DD/YYYY or DD/MM/YYYY
         r"\b\d{4}-\d{2}-\d{2}\b",      # YYYY-MM-DD
@@ -96,6 +343,6 @@ def extract_dates(text):
 
     possible_dates = []
     for pattern in date_patterns:
-        possible_dates.extend(re.findall(pattern, text))
+        possible_dates.extend((match.start(), match.group(0)) for match in re.finditer(pattern, text))
 
-    return possible_dates
+    return [value for _, value in sorted(possible_dates)]
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+from settings import settings
+from utils.cache import etag_matches
+
+try:
+    import redis
+except ImportError:  # Optional shared backend
+    redis = None
+
+
+class MemoryBackend:
+    """Per-process LRU store with expiry. Other workers do not see its invalidations."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Kept apart from the entries so the LRU never evicts a generation.
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+
+class RedisBackend:
+    """Shared store, so every worker sees every invalidation."""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("LISTING_CACHE_BACKEND=redis needs the redis package installed")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.client.set(key, value, ex=ttl)
+
+    def get_counter(self, key: str) -> int:
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key: str):
+        self.client.incr(key)
+
+
+class ListingCache:
+    """Read-through cache of serialised folder and file listings.
+
+    Entries are keyed by (owner, generation, kind, key); writes call
+    ``invalidate(owner_id)``, which bumps the owner's generation so none of
+    their earlier entries are read again (they age out through the TTL/LRU).
+    """
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def _generation(self, owner_id) -> int:
+        return self.backend.get_counter(f"listing:gen:{owner_id}")
+
+    def invalidate(self, owner_id):
+        """Call after a write to the owner's folders or documents has been committed."""
+        self.backend.incr(f"listing:gen:{owner_id}")
+        with self._lock:
+            self.invalidations += 1
+
+    def get_or_render(self, owner_id, kind: str, key: str, render: Callable[[], bytes]) -> tuple:
+        """Returns (etag, body), rendering and storing the body on a miss."""
+        cache_key = f"listing:{owner_id}:{self._generation(owner_id)}:{kind}:{key}"
+        cached = self.backend.get(cache_key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            etag, body = cached.split(b"\n", 1)
+            return etag.decode(), body
+
+        with self._lock:
+            self.misses += 1
+        body = render()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.backend.set(cache_key, etag.encode() + b"\n" + body, self.ttl)
+        return etag, body
+
+    def response(self, request: Request, owner_id, kind: str, key: str, render: Callable[[], bytes]) -> Response:
+        """A JSON response for the listing, or 304 Not Modified if the client's ETag still matches."""
+        etag, body = self.get_or_render(owner_id, kind, key, render)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+            }
+
+
+def make_backend():
+    if settings.listing_cache_backend == "redis":
+        return RedisBackend(settings.listing_cache_redis_url)
+    return MemoryBackend(settings.listing_cache_max_entries)
+
+
+listing_cache = ListingCache(make_backend(), settings.listing_cache_ttl_seconds)
@@ -0,0 +1,115 @@
+import json
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from utils.folders import SUMMARY_INPUT_CHARS, call_gemini, extract_dates, get_nlp
+
+logger = logging.getLogger(__name__)
+
+# Letters in the corpus are mostly British, so ambiguous numeric dates are read day-first.
+DATE_FORMATS = ["%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%d", "%d %B %Y", "%d %b %Y"]
+
+METADATA_FIELDS = ["project_name", "client", "project_manager", "sender", "receiver", "letter_date"]
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Parses a date in any of the formats extract_dates finds; None if it is not a real date."""
+    value = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", value.strip())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def extract_entities(text: str) -> dict:
+    """Named entities relevant to correspondence: organisations, people and places."""
+    labels = {"ORG": "organisations", "PERSON": "people", "GPE": "places"}
+    entities = {name: [] for name in labels.values()}
+    for ent in get_nlp()(text).ents:
+        if ent.label_ in labels:
+            name = " ".join(ent.text.split())
+            if name not in entities[labels[ent.label_]]:
+                entities[labels[ent.label_]].append(name)
+    return entities
+
+
+def extract_llm_fields(text: str) -> dict:
+    """One Gemini call for the fields NER cannot tell apart (sender vs receiver, client, ...)."""
+    prompt = f"""
+    Extract the following fields from this letter or project document. Use null for anything
+    that is not stated.
+
+    - project_name: name of the project
+    - client: name of the client
+    - project_manager: name of the project manager
+    - sender: person or organisation that sent the letter
+    - receiver: person or organisation the letter is addressed to
+    - letter_date: date of the letter, as YYYY-MM-DD
+
+    Respond with only a JSON object with exactly these keys.
+
+    Document:
+    {text}
+    """
+    response = call_gemini(prompt)
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        logger.warning("Could not parse metadata response: %s", response[:200])
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {
+        field: " ".join(str(parsed[field]).split())
+        for field in METADATA_FIELDS
+        if parsed.get(field) not in (None, "", "null")
+    }
+
+
+def extract_document_metadata(text: str) -> dict:
+    """Extracts dates, parties and project fields from the head of a document, once at ingest.
+
+    Regex dates and spaCy entities are always available; the LLM fields are
+    best-effort and simply missing if the call fails.
+    """
+    head = text[:SUMMARY_INPUT_CHARS]
+
+    # Dates in the order they appear in the text.
+    dates: List[date] = []
+    for value in extract_dates(head):
+        parsed = parse_date(value)
+        if parsed and parsed not in dates:
+            dates.append(parsed)
+
+    metadata = {"dates": [d.isoformat() for d in sorted(dates)], **extract_entities(head)}
+    try:
+        metadata.update(extract_llm_fields(head))
+    except Exception as e:
+        logger.warning("Metadata LLM call failed: %s", e)
+
+    letter_date = parse_date(metadata.get("letter_date", "")) if metadata.get("letter_date") else None
+    if letter_date is None and dates:
+        # The first date in a letter is almost always its own date; matches
+        # that are not real dates (e.g. 31/02/2024) are skipped.
+        letter_date = dates[0]
+    metadata["letter_date"] = letter_date.isoformat() if letter_date else None
+    return metadata
+
+
+def document_metadata_columns(metadata: dict) -> dict:
+    """Maps extracted metadata onto the typed Document columns."""
+    letter_date = metadata.get("letter_date")
+    return {
+        "document_date": date.fromisoformat(letter_date) if letter_date else None,
+        "sender": metadata.get("sender"),
+        "receiver": metadata.get("receiver"),
+        "project_name": metadata.get("project_name"),
+        "extracted_metadata": metadata,
+    }
@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASHED_EMBEDDING_DIMS = 512
+
+
+# Words that do not change what is asked; direction words (from, to, by...) are kept.
+STOPWORDS = {
+    "a", "an", "the", "of", "please", "me", "can", "could", "would", "you", "give", "provide",
+    "i", "want", "need", "do", "does", "some", "all", "any", "my", "our", "is", "are", "there",
+}
+# Interchangeable words of the questions asked here, mapped to one form.
+SYNONYMS = {
+    "summarise": "summary", "summarize": "summary", "summarised": "summary", "summarized": "summary",
+    "summarising": "summary", "summarizing": "summary", "summarisation": "summary",
+    "summarization": "summary", "summaries": "summary", "overview": "summary",
+    "correspondence": "letter", "letters": "letter", "documents": "letter", "document": "letter",
+    "docs": "letter", "doc": "letter", "files": "letter", "file": "letter",
+    "show": "list",
+}
+# The word after one of these names what the question is about ("project alpha", "from acme"),
+# with the direction kept for the words naming a sender or a receiver.
+ENTITY_CUES = {
+    "project": "", "for": "", "about": "", "regarding": "", "client": "", "contractor": "",
+    "from": "from:", "by": "from:", "sender": "from:", "to": "to:", "receiver": "to:",
+}
+NUMBER_PATTERN = re.compile(r"\d")
+
+
+def _canonical_word(word: str) -> str:
+    word = SYNONYMS.get(word, word)
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = SYNONYMS.get(word[:-1], word[:-1])
+    return word
+
+
+def normalise_query(query: str) -> str:
+    """Lowercases a question, drops punctuation and filler words and folds synonyms and plurals."""
+    words = re.sub(r"[^\w\s]", " ", query.lower()).split()
+    return " ".join(_canonical_word(word) for word in words if word not in STOPWORDS)
+
+
+def query_entities(query: str) -> frozenset:
+    """Names and numbers a question is about; questions about different ones never share an answer.
+
+    These are numbers and years, capitalised words (other than the first
+    word, unless it is an acronym) and the word after a cue such as
+    "project" or "from" (prefixed with from:/to: for senders and receivers).
+    """
+    words = re.sub(r"[^\w\s]", " ", query).split()
+    entities = set()
+    for i, word in enumerate(words):
+        lower = word.lower()
+        if NUMBER_PATTERN.search(word):
+            entities.add(lower)
+        elif word[0].isupper() and (i > 0 or (word.isupper() and len(word) > 1)) and lower not in STOPWORDS:
+            entities.add(_canonical_word(lower))
+        if lower in ENTITY_CUES:
+            following = next((w.lower() for w in words[i + 1:] if w.lower() not in STOPWORDS), None)
+            if following and following not in ENTITY_CUES:
+                entities.add(ENTITY_CUES[lower] + _canonical_word(following))
+    return frozenset(entities)
+
+
+def hashed_embedding(text: str, dims: int = HASHED_EMBEDDING_DIMS) -> array:
+    """Local fallback embedding from hashed words, word pairs and character trigrams.
+
+    It only catches near-identical phrasings, but needs no network call.
+    """
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    features += [f"#{word[i:i + 3]}" for word in words for i in range(max(len(word) - 2, 1))]
+
+    vector = [0.0] * dims
+    for feature in features:
+        h = int(hashlib.md5(feature.encode("utf-8")).hexdigest()[:8], 16)
+        vector[h % dims] += 1.0 if h & 0x80000000 else -1.0
+    return _normalised(vector)
+
+
+def _normalised(vector) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+def _cosine(a: array, b: array) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class SemanticQueryCache:
+    """In-process LRU cache of answers keyed by question meaning within a scope.
+
+    ``scope`` identifies who is asking over which documents (owner, folder,
+    filters) and ``version`` identifies the state of those documents; an entry
+    whose version no longer matches is dropped on the next lookup in its scope.
+    Within a scope, a question hits if it normalises to a cached question, or
+    if its embedding is at least ``threshold`` cosine-similar to one that is
+    about the same names and numbers (see ``query_entities``): embeddings
+    score "letters in 2023" and "letters in 2024" as near-identical.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], list],
+        max_entries: int,
+        threshold: float,
+        fallback_threshold: float,
+    ):
+        self.embed = embed
+        self.max_entries = max_entries
+        self.thresholds = {"remote": threshold, "hashed": fallback_threshold}
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._scopes = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.embedding_fallbacks = 0
+        self.latency_saved = 0.0
+
+    def _embedding(self, text: str) -> Tuple[str, array]:
+        try:
+            return "remote", _normalised(self.embed(text))
+        except Exception as e:
+            logger.warning("Query embedding failed, using hashed embedding: %s", e)
+            with self._lock:
+                self.embedding_fallbacks += 1
+            return "hashed", hashed_embedding(text)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._scopes.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[key[0]]
+
+    def lookup(self, scope: str, version: str, query: str) -> Tuple[Optional[str], dict]:
+        """Returns (cached answer or None, probe); pass the probe to ``store`` on a miss."""
+        normalised = normalise_query(query)
+        probe = {"scope": scope, "version": version, "query": normalised, "entities": query_entities(query)}
+
+        with self._lock:
+            for key in list(self._scopes.get(scope, ())):
+                if self._entries[key]["version"] != version:
+                    self._drop(key)
+                    self.invalidations += 1
+            entry = self._entries.get((scope, normalised))
+            if entry is not None:
+                return self._hit((scope, normalised), entry, semantic=False), probe
+            candidates = [(key, self._entries[key]) for key in self._scopes.get(scope, ())]
+
+        if not candidates:
+            with self._lock:
+                self.misses += 1
+            return None, probe
+
+        probe["model"], probe["vector"] = self._embedding(normalised)
+        threshold = self.thresholds[probe["model"]]
+        best_key, best_entry, best_score = None, None, threshold
+        for key, entry in candidates:
+            if entry["model"] != probe["model"] or entry["entities"] != probe["entities"]:
+                continue
+            score = _cosine(probe["vector"], entry["vector"])
+            if score >= best_score:
+                best_key, best_entry, best_score = key, entry, score
+
+        with self._lock:
+            if best_entry is not None and best_key in self._entries:
+                return self._hit(best_key, best_entry, semantic=True), probe
+            self.misses += 1
+        return None, probe
+
+    def _hit(self, key, entry: dict, semantic: bool) -> str:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.semantic_hits += semantic
+        self.latency_saved += entry["compute_seconds"]
+        return entry["answer"]
+
+    def store(self, probe: dict, answer: str, compute_seconds: float):
+        """Caches the answer computed after a missed lookup; error answers are not cached."""
+        if not isinstance(answer, str) or answer.startswith("Error:"):
+            return
+        if "vector" not in probe:
+            probe["model"], probe["vector"] = self._embedding(probe["query"])
+
+        key = (probe["scope"], probe["query"])
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "version": probe["version"],
+                "model": probe["model"],
+                "vector": probe["vector"],
+                "entities": probe["entities"],
+                "answer": answer,
+                "compute_seconds": compute_seconds,
+                "stored_at": time.time(),
+            }
+            self._scopes.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "embedding_fallbacks": self.embedding_fallbacks,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
@@ -0,0 +1,342 @@
+"""Where uploaded files live: a local directory or an S3-compatible bucket.
+
+A document's ``storage_path`` is its location. Plain paths (every document
+stored before this module, and new ones with the local backend) are local
+files, as before; ``s3://bucket/key`` locations are objects in a bucket.
+The configured backend only decides where new uploads go, so both kinds can
+coexist while files are being moved with ``scripts.migrate_storage``.
+
+Extraction tools need a real file, so remote objects are read through a
+size-bounded LRU cache on local disk; a file being read is pinned and never
+evicted from under its reader.
+"""
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple
+
+from settings import settings
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # Optional; only needed for the s3 backend
+    boto3 = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class StoredFile(NamedTuple):
+    location: str
+    checksum: str  # SHA-256 of the contents
+    size: int
+
+
+class SizeLimitExceeded(OSError):
+    """Raised by LimitedReader when its source has more bytes than allowed."""
+
+
+class LimitedReader:
+    """Reads from ``source`` until more than ``limit`` bytes come out of it, then raises SizeLimitExceeded.
+
+    Counts what is actually read, not what the source claims its size is
+    (a zip member's header, for instance).
+    """
+
+    def __init__(self, source: BinaryIO, limit: int):
+        self.source = source
+        self.limit = limit
+        self.remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        # One byte more than allowed is enough to tell the source is too large.
+        wanted = self.remaining + 1 if size is None or size < 0 else min(size, self.remaining + 1)
+        data = self.source.read(wanted)
+        if len(data) > self.remaining:
+            raise SizeLimitExceeded(f"File is larger than {self.limit} bytes.")
+        self.remaining -= len(data)
+        return data
+
+
+def _copy_hashing(source: BinaryIO, target: BinaryIO) -> tuple:
+    """Streams ``source`` into ``target``; returns (sha256 hex digest, bytes copied)."""
+    digest, size = hashlib.sha256(), 0
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+        target.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class LocalStorage:
+    """Files under a directory on this machine (or a shared mount); locations are paths."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, source: BinaryIO, key: str) -> StoredFile:
+        location = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        try:
+            with open(location, "wb") as target:
+                checksum, size = _copy_hashing(source, target)
+        except BaseException:
+            self.delete(location)
+            raise
+        return StoredFile(location, checksum, size)
+
+    def open(self, location: str) -> BinaryIO:
+        return open(location, "rb")
+
+    @contextmanager
+    def local_path(self, location: str) -> Iterator[str]:
+        yield location
+
+    def exists(self, location: str) -> bool:
+        return os.path.isfile(location)
+
+    def delete(self, location: str):
+        try:
+            os.remove(location)
+        except FileNotFoundError:
+            pass
+
+
+class FileCache:
+    """Local copies of remote files, evicted least-recently-used first (by mtime).
+
+    Copies keep the file extension, since extractors are picked by it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._fetch_locks = [threading.Lock() for _ in range(64)]
+        self._pins = {}
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, location: str) -> Path:
+        key = hashlib.sha256(location.encode("utf-8")).hexdigest()
+        return self.directory / key[:2] / (key + os.path.splitext(location)[1].lower())
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return [p for p in self.directory.glob("*/*") if p.is_file() and not p.name.endswith(".tmp")]
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self._entries())
+        return self._size
+
+    def _publish(self, tmp_path: Path, path: Path):
+        size = tmp_path.stat().st_size
+        with self._lock:
+            current = self._current_size()
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._size = current - previous + size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    @contextmanager
+    def pinned(self, location: str, fetch, replace: bool = False) -> Iterator[str]:
+        """Yields the local copy of ``location``, calling ``fetch(tmp_path)`` to write it on a miss.
+
+        With ``replace`` the copy is always rewritten (for a new upload to the location).
+        """
+        path = self.path_for(location)
+        # One download per file, however many readers ask for it at once.
+        with self._fetch_locks[hash(path) % len(self._fetch_locks)]:
+            with self._lock:
+                hit = not replace and path.exists()
+                self._pins[path] = self._pins.get(path, 0) + 1
+                if hit:
+                    self.hits += 1
+                    os.utime(path)
+                else:
+                    self.misses += 1
+            if not hit:
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                    try:
+                        fetch(str(tmp_path))
+                    except BaseException:
+                        tmp_path.unlink(missing_ok=True)
+                        raise
+                    self._publish(tmp_path, path)
+                except BaseException:
+                    self._unpin(path)
+                    raise
+        try:
+            yield str(path)
+        finally:
+            self._unpin(path)
+
+    def _unpin(self, path: Path):
+        with self._lock:
+            if self._pins.get(path, 0) <= 1:
+                self._pins.pop(path, None)
+            else:
+                self._pins[path] -= 1
+
+    def get(self, location: str):
+        """The local copy if there is one (touching it), else None."""
+        path = self.path_for(location)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return str(path)
+
+    def discard(self, location: str):
+        path = self.path_for(location)
+        with self._lock:
+            current = self._current_size()
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            self._size = current - size
+
+    def _evict(self):
+        """Drops unpinned copies, least recently used first, until the cache is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        for path in sorted(self._entries(), key=lambda p: p.stat().st_mtime):
+            if self._size <= target:
+                break
+            if path in self._pins:
+                continue
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries()),
+                "size_bytes": self._current_size(),
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pins),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket (AWS S3, or MinIO via ``storage_s3_endpoint_url``).
+
+    Uploads are written to the local cache first (hashing on the way) and sent
+    with a multipart upload from there, so the worker that just received a
+    file extracts it without reading it back.
+    """
+
+    def __init__(self, bucket: str, prefix: str, cache: FileCache, **client_options):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs the boto3 package installed")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs STORAGE_S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.cache = cache
+        self.client = boto3.client("s3", **{k: v for k, v in client_options.items() if v})
+
+    def _split(self, location: str) -> tuple:
+        bucket, _, key = location.removeprefix("s3://").partition("/")
+        return bucket, key
+
+    def put(self, source: BinaryIO, key: str) -> StoredFile:
+        location = f"s3://{self.bucket}/{self.prefix}{key}"
+        copied = {}
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as copy:
+                copied["checksum"], copied["size"] = _copy_hashing(source, copy)
+
+        try:
+            with self.cache.pinned(location, write, replace=True) as path:
+                self.client.upload_file(path, *self._split(location))
+        except Exception:
+            self.cache.discard(location)
+            raise
+        return StoredFile(location, copied["checksum"], copied["size"])
+
+    def open(self, location: str) -> BinaryIO:
+        cached = self.cache.get(location)
+        if cached:
+            return open(cached, "rb")
+        bucket, key = self._split(location)
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    def local_path(self, location: str):
+        bucket, key = self._split(location)
+        return self.cache.pinned(location, lambda tmp_path: self.client.download_file(bucket, key, tmp_path))
+
+    def exists(self, location: str) -> bool:
+        if self.cache.get(location):
+            return True
+        bucket, key = self._split(location)
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def delete(self, location: str):
+        self.cache.discard(location)
+        bucket, key = self._split(location)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+
+file_cache = FileCache(settings.storage_cache_dir, settings.storage_cache_max_bytes)
+local_storage = LocalStorage(settings.storage_local_root)
+_s3_storage = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_storage() -> S3Storage:
+    global _s3_storage
+    with _s3_lock:
+        if _s3_storage is None:
+            _s3_storage = S3Storage(
+                settings.storage_s3_bucket,
+                settings.storage_s3_prefix,
+                file_cache,
+                endpoint_url=settings.storage_s3_endpoint_url,
+                region_name=settings.storage_s3_region,
+                aws_access_key_id=settings.storage_s3_access_key,
+                aws_secret_access_key=settings.storage_s3_secret_key,
+            )
+        return _s3_storage
+
+
+def get_storage():
+    """The backend new uploads are written to."""
+    return get_s3_storage() if settings.storage_backend == "s3" else local_storage
+
+
+def storage_for(location: str):
+    """The backend holding an existing location, whatever the configured backend is now."""
+    return get_s3_storage() if location.startswith("s3://") else local_storage
+
+
+def local_path(location: str):
+    """Context manager yielding a local file path for a stored location."""
+    return storage_for(location).local_path(location)
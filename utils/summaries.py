@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from settings import settings
+from utils.cache import DiskCache, cache_key
+from utils.folders import (
+    GEMINI_MODEL,
+    SUMMARY_INPUT_CHARS,
+    call_gemini,
+    iter_chunks,
+    iter_extracted_pages,
+    summarize_text,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the section/combine prompts change, to invalidate cached summaries.
+SUMMARY_PROMPT_VERSION = "1"
+
+summary_cache = DiskCache(settings.summary_cache_dir, settings.summary_cache_max_bytes)
+
+# Shared by every summary in the process: concurrent uploads and long documents
+# queue for these instead of each opening their own pool of Gemini calls.
+gemini_slots = threading.BoundedSemaphore(settings.summary_max_concurrent_calls)
+section_pool = ThreadPoolExecutor(max_workers=settings.summary_workers, thread_name_prefix="summary")
+
+CallCounter = Optional[Callable[[], None]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini prompts (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def build_batch_prompt(texts: Dict[str, str]) -> str:
+    documents = "\n\n".join(f'<document id="{doc_id}">\n{text}\n</document>' for doc_id, text in texts.items())
+    return (
+        "Summarize each of the following documents in 3-5 sentences. Summarize every document "
+        "independently; do not mix information between them.\n\n"
+        "Respond with only a JSON object mapping each document id to its summary, for example "
+        '{"D1": "...", "D2": "..."}.\n\n'
+        f"{documents}"
+    )
+
+
+def parse_batch_response(response: str, doc_ids: List[str]) -> Dict[str, str]:
+    """Extracts the per-document summaries from a batch response; missing or blank ones are left out."""
+    # Gemini often wraps JSON in a markdown code fence.
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {
+        doc_id: parsed[doc_id].strip()
+        for doc_id in doc_ids
+        if isinstance(parsed.get(doc_id), str) and parsed[doc_id].strip()
+    }
+
+
+def limited_gemini(prompt: str, count_call: CallCounter = None) -> str:
+    """Calls Gemini once a slot under the process-wide cap is free."""
+    if count_call:
+        count_call()
+    with gemini_slots:
+        return call_gemini(prompt)
+
+
+def _cached_gemini(kind: str, content: str, prompt: str, count_call: CallCounter = None) -> str:
+    """Calls Gemini, caching the answer by prompt kind, model and content hash."""
+    key = cache_key(kind, SUMMARY_PROMPT_VERSION, GEMINI_MODEL, hashlib.sha256(content.encode("utf-8")).hexdigest())
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+    response = limited_gemini(prompt, count_call)
+    if not response.startswith("Error:"):
+        summary_cache.set(key, response)
+    return response
+
+
+def summarize_section(text: str, count_call: CallCounter = None) -> str:
+    """Map step: summarises one section of a long document."""
+    return _cached_gemini(
+        "section",
+        text,
+        "Summarize this section of a longer document in 3-5 sentences. Keep names of parties, "
+        f"projects, dates and amounts.\n\n{text}",
+        count_call,
+    )
+
+
+def combine_summaries(summaries: List[str], final: bool, count_call: CallCounter = None) -> str:
+    """Reduce step: merges consecutive section summaries into one."""
+    joined = "\n\n".join(f"- {summary}" for summary in summaries)
+    instruction = (
+        "Combine these summaries of consecutive parts of one document into a single summary of "
+        + ("the whole document in 3-5 sentences." if final else "these parts in 3-5 sentences.")
+    )
+    return _cached_gemini("final" if final else "combine", joined, f"{instruction}\n\n{joined}", count_call)
+
+
+def iter_sections(chunks: Iterable[str], target_chars: int = None) -> Iterator[str]:
+    """Groups chunks into sections with content-defined boundaries.
+
+    A section ends after a chunk whose hash hits a boundary value (once the
+    section is at least half the target) or when it reaches twice the target.
+    Boundaries depend only on nearby content, so editing one part of a
+    document leaves the other sections, and their cached summaries, intact.
+    """
+    target_chars = target_chars or settings.summary_section_chars
+    section, size = [], 0
+    for text in chunks:
+        section.append(text)
+        size += len(text)
+        boundary = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) % 4 == 0
+        if size >= 2 * target_chars or (size >= target_chars // 2 and boundary):
+            yield "\n".join(section)
+            section, size = [], 0
+    if section:
+        yield "\n".join(section)
+
+
+def summarize_long_text(chunks: Iterable[str], fan_in: int = None, count_call: CallCounter = None) -> str:
+    """Map-reduce summary of a whole document, consumed as a stream of chunks.
+
+    Sections are summarised on the shared ``section_pool`` with at most twice
+    its size queued per document, then combined ``fan_in`` at a time until one
+    summary is left. ``count_call`` is called for every map and reduce call
+    that goes to Gemini.
+    """
+    fan_in = max(fan_in or settings.summary_reduce_fan_in, 2)
+    window = settings.summary_workers * 2
+
+    summaries = []
+    in_flight = deque()
+    for section in iter_sections(chunks):
+        if len(in_flight) >= window:
+            summaries.append(in_flight.popleft().result())
+        in_flight.append(section_pool.submit(summarize_section, section, count_call))
+    summaries.extend(future.result() for future in in_flight)
+
+    if not summaries:
+        return "No summary available."
+    if len(summaries) == 1:
+        return summaries[0]
+
+    while len(summaries) > fan_in:
+        groups = [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+        summaries = list(section_pool.map(lambda group: combine_summaries(group, False, count_call), groups))
+    return combine_summaries(summaries, final=True, count_call=count_call)
+
+
+def summarize_file(file_path, count_call: CallCounter = None) -> str:
+    """Summarises a whole stored file; short files get a single call, long ones map-reduce."""
+    chunks = (chunk["text"] for chunk in iter_chunks(iter_extracted_pages(file_path)))
+    return summarize_long_text(chunks, count_call=count_call)
+
+
+def summarize_document(text: str, file_path=None, count_call: CallCounter = None) -> str:
+    """Summarises a document from its head, reading the full file when the head was cut short."""
+    if file_path and len(text) > SUMMARY_INPUT_CHARS:
+        return summarize_file(file_path, count_call)
+    if count_call:
+        count_call()
+    with gemini_slots:
+        return summarize_text(text)
+
+
+class SummaryScheduler:
+    """Collects documents to summarise and packs short ones into shared Gemini calls.
+
+    Short documents are grouped up to a token budget and summarised with one
+    structured prompt per group; long documents get the map-reduce summary, and
+    any document whose summary cannot be parsed out of a group response gets an
+    individual call.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = settings.summary_batch_token_budget,
+        short_document_chars: int = settings.summary_batch_max_document_chars,
+        max_workers: int = settings.upload_workers,
+    ):
+        self.token_budget = token_budget
+        self.short_document_chars = short_document_chars
+        self.max_workers = max_workers
+        self.pending: Dict[Hashable, str] = {}
+        self.file_paths: Dict[Hashable, str] = {}
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def _count_call(self):
+        with self._lock:
+            self.llm_calls += 1
+
+    def add(self, key: Hashable, text: str, file_path=None):
+        """Queues a document; ``file_path`` lets long documents be summarised in full."""
+        self.pending[key] = text
+        if file_path:
+            self.file_paths[key] = file_path
+
+    def _pack(self, keys: List[Hashable]) -> List[List[Hashable]]:
+        batches, current, used = [], [], 0
+        for key in keys:
+            cost = estimate_tokens(self.pending[key]) + 20
+            if current and used + cost > self.token_budget:
+                batches.append(current)
+                current, used = [], 0
+            current.append(key)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _summarize_one(self, key: Hashable) -> Dict[Hashable, str]:
+        """Summarises one document; a failed call leaves it out, so it gets the default summary."""
+        try:
+            return {key: summarize_document(self.pending[key], self.file_paths.get(key), self._count_call)}
+        except Exception as e:
+            logger.warning("Could not summarise document %s: %s", key, e)
+            return {}
+
+    def _summarize_batch(self, keys: List[Hashable]) -> Dict[Hashable, str]:
+        """Summarises one job; never raises, so one failed call cannot lose the other jobs' summaries."""
+        if len(keys) == 1:
+            return self._summarize_one(keys[0])
+
+        ids = {f"D{i + 1}": key for i, key in enumerate(keys)}
+        try:
+            prompt = build_batch_prompt({doc_id: self.pending[key] for doc_id, key in ids.items()})
+            response = limited_gemini(prompt, self._count_call)
+        except Exception as e:
+            # Treated like a response that parses to nothing: every document is retried on its own.
+            logger.warning("Batch summary call for %d documents failed: %s", len(keys), e)
+            response = ""
+        parsed = parse_batch_response(response, list(ids))
+
+        summaries = {ids[doc_id]: summary for doc_id, summary in parsed.items()}
+        missing = [key for key in keys if key not in summaries]
+        if missing:
+            logger.warning("Batch summary response missed %d of %d documents; retrying individually", len(missing), len(keys))
+            for key in missing:
+                summaries.update(self._summarize_one(key))
+        return summaries
+
+    def run(self) -> Dict[Hashable, str]:
+        """Summarises every pending document and returns {key: summary}."""
+        short = [key for key, text in self.pending.items() if len(text) <= self.short_document_chars]
+        long = [key for key, text in self.pending.items() if len(text) > self.short_document_chars]
+        jobs = self._pack(short) + [[key] for key in long]
+
+        summaries = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for result in pool.map(self._summarize_batch, jobs):
+                summaries.update(result)
+
+        logger.info("Summarised %d documents with %d LLM calls", len(self.pending), self.llm_calls)
+        self.pending.clear()
+        self.file_paths.clear()
+        return summaries
@@ -0,0 +1,64 @@
+"""Compression of stored document text.
+
+Letters share most of their boilerplate (letterheads, addresses, sign-offs),
+so zstd with a dictionary trained on our own corpus compresses them far
+better than zlib on its own, especially short ones. New text is always
+written with zstd; zlib is only read, for rows stored before zstandard was
+a required dependency.
+"""
+import codecs
+import zlib
+from typing import Iterator, List, Optional
+
+import zstandard
+
+from settings import settings
+
+ZSTD = "zstd"
+ZLIB = "zlib"
+
+
+class TextCompressor:
+    """Compresses a stream of text into one blob.
+
+    ``dictionary`` is an ``(id, bytes)`` pair of a trained zstd dictionary, or None.
+    """
+
+    def __init__(self, dictionary: Optional[tuple] = None, level: int = None):
+        level = level or settings.text_compression_level
+        self.raw_size = 0
+        self._parts = []
+        self.codec = ZSTD
+        self.dictionary_id = dictionary[0] if dictionary else None
+        dict_data = zstandard.ZstdCompressionDict(dictionary[1]) if dictionary else None
+        self._compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data).compressobj()
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        self.raw_size += len(data)
+        self._parts.append(self._compressor.compress(data))
+
+    def finish(self) -> bytes:
+        self._parts.append(self._compressor.flush())
+        return b"".join(self._parts)
+
+
+def iter_decompressed(codec: str, blob: bytes, dictionary: Optional[bytes] = None, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Decompresses a blob incrementally into text chunks."""
+    if codec == ZSTD:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        decompressor = zstandard.ZstdDecompressor(dict_data=dict_data).decompressobj()
+    elif codec == ZLIB:
+        decompressor = zlib.decompressobj()
+    else:
+        raise ValueError(f"Unknown text codec {codec!r}")
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for start in range(0, len(blob), chunk_size):
+        yield decoder.decode(decompressor.decompress(blob[start:start + chunk_size]))
+    yield decoder.decode(decompressor.flush() if codec == ZLIB else b"", final=True)
+
+
+def train_dictionary(samples: List[bytes], size: int) -> bytes:
+    """Trains a zstd dictionary of about ``size`` bytes on sample texts."""
+    return zstandard.train_dictionary(size, samples).as_bytes()